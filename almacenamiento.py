@@ -0,0 +1,981 @@
+"""
+Módulo de almacenamiento compartido
+Lee y guarda las tablas CSV del sistema (equipos, préstamos, usuarios)
+y mantiene en memoria las tablas ya leídas mientras el archivo no cambie
+
+Cada tabla está formada por:
+- el archivo CSV base (por ejemplo prestamos.csv); las filas nuevas se
+  agregan al final sin reescribir las anteriores
+- un archivo de cambios (por ejemplo prestamos.csv.delta) donde cada
+  modificación de una fila existente se agrega como una línea nueva:
+      clave,campo=valor,campo=valor
+  La clave es el valor de la primera columna de la tabla (equipo_id, prestamo_id).
+Al leer, los cambios se aplican sobre las filas base. compactar_tabla()
+vuelve a escribir el CSV base con los cambios aplicados y borra el archivo de cambios.
+
+Todas las escrituras pasan por una transacción (ver transacciones.py):
+    iniciar_transaccion()
+    ... agregar_fila / actualizar_fila / guardar_tabla ...
+    confirmar_transaccion()   # o cancelar_transaccion()
+Hasta confirmar, los cambios solo existen en memoria (las lecturas de este
+proceso ya los ven). Al confirmar se escriben en el registro con un único
+fsync y recién después se aplican sobre los archivos. Si una escritura se
+hace fuera de una transacción, se confirma sola.
+
+Motores de almacenamiento: por defecto las tablas son archivos CSV. Con la
+variable de entorno TECHLAB_MOTOR=sqlite (o usar_motor("sqlite")) las mismas
+funciones de este módulo guardan los datos en una base SQLite
+(ver almacenamiento_sqlite.py); el resto del sistema no cambia.
+
+Las filas de equipos.csv y prestamos.csv se devuelven como registros
+compactos (ver registros.py) que se leen igual que un diccionario; las de
+las demás tablas son diccionarios comunes.
+
+Varias terminales pueden usar los mismos archivos: las transacciones
+toman un bloqueo entre procesos y las lecturas no esperan (ver
+concurrencia.py). Para no pisar lo que otra terminal cambió después de
+leer una fila, actualizar_fila recibe la versión que se leyó.
+"""
+import gc
+import os
+
+import concurrencia
+import formato_csv
+import registros
+import transacciones
+
+# Encabezados de cada tabla, en el orden en que se escriben en el CSV
+ENCABEZADOS_USUARIOS = ["usuario", "contrasena", "rol"]
+
+ENCABEZADOS_EQUIPOS = [
+    "equipo_id", "nombre_equipo", "categoria", "estado_actual", "fecha_registro", "descripcion"
+]
+
+ENCABEZADOS_PRESTAMOS = [
+    "prestamo_id", "equipo_id", "nombre_equipo", "usuario_prestatario",
+    "tipo_usuario", "fecha_solicitud", "fecha_prestamo", "fecha_devolucion",
+    "dias_autorizados", "dias_reales_usados", "retraso", "estado", "mes", "anio"
+]
+
+# Préstamos PENDIENTES o APROBADOS, uno por equipo (ver prestamos.py)
+ENCABEZADOS_ABIERTOS = ["equipo_id", "prestamo_id", "estado"]
+
+# Último número usado para los IDs de cada tabla
+ENCABEZADOS_SECUENCIAS = ["tabla", "ultimo_id"]
+
+# Cuando el archivo de cambios supera este tamaño se compacta la tabla
+LIMITE_CAMBIOS_BYTES = 256 * 1024
+
+# Veces que se vuelve a leer un archivo que otro proceso cambió mientras se leía
+INTENTOS_LECTURA = 5
+
+# Caché de tablas: nombre_archivo -> {"firma", "filas", "posiciones"}
+# "posiciones" (clave -> índice en filas) se arma solo cuando hace falta
+_cache = {}
+
+# Cambios pendientes agrupados por clave: nombre_archivo -> (firma, dict)
+_cache_cambios = {}
+
+# Contadores para saber cuántas lecturas se resolvieron desde memoria
+_estadisticas = {"aciertos": 0, "fallos": 0}
+
+# Transacción abierta, o None. Es un diccionario con:
+# - "nivel": cuántas veces se llamó a iniciar_transaccion sin confirmar
+# - "fallida": True si alguna parte se canceló (o no se pudo tomar el bloqueo)
+# - "bloqueada": True si tiene tomado el bloqueo entre procesos
+# - "operaciones": escrituras pendientes, en el orden en que se pidieron
+# - "tablas": nombre_archivo -> vista con lo que cambió la transacción
+#   {"reemplazo": filas o None, "agregadas": [filas], "cambios": [(clave, campos)]}
+# - "compactar": nombre_archivo -> encabezados de las tablas con cambios nuevos
+_transaccion = None
+
+# Se vuelve True después de repetir las transacciones del registro
+_recuperado = False
+
+# Módulo del motor SQLite si está activo, o None para usar los CSV
+_motor = None
+
+
+def usar_motor(nombre):
+    """
+    Elige dónde se guardan las tablas: "csv" (archivos CSV) o "sqlite".
+    Devuelve True si el motor es válido.
+    """
+    global _motor
+    if nombre == "csv":
+        _motor = None
+    elif nombre == "sqlite":
+        import almacenamiento_sqlite
+        _motor = almacenamiento_sqlite
+    else:
+        print(f"Error: Motor de almacenamiento desconocido: {nombre}")
+        return False
+    return True
+
+
+def motor_sqlite():
+    """
+    Devuelve el módulo almacenamiento_sqlite si ese motor está activo, o None.
+    """
+    return _motor
+
+
+def existe_tabla(nombre_archivo):
+    """
+    Indica si la tabla ya fue creada (en SQLite las tablas existen siempre).
+    También cuenta como creada si la transacción abierta ya escribió en ella.
+    """
+    if _motor is not None or _vista(nombre_archivo) is not None:
+        return True
+    return os.path.exists(nombre_archivo)
+
+
+def archivo_cambios(nombre_archivo):
+    """
+    Devuelve el nombre del archivo de cambios de una tabla.
+    """
+    return nombre_archivo + ".delta"
+
+
+def asegurar_recuperacion():
+    """
+    La primera vez que se usa el almacenamiento en este proceso, repite
+    las transacciones que hayan quedado en el registro (por ejemplo si el
+    programa se cortó mientras guardaba).
+    """
+    global _recuperado
+    if _recuperado:
+        return
+    # Con el bloqueo tomado: otro proceso puede estar aplicando una transacción
+    if not concurrencia.bloquear():
+        return  # se intenta de nuevo en el próximo uso
+    _recuperado = True
+    try:
+        if transacciones.recuperar():
+            _cache.clear()
+            _cache_cambios.clear()
+    except Exception as e:
+        print(f"Error al recuperar transacciones: {e}")
+    finally:
+        concurrencia.desbloquear()
+
+
+def _firma_archivo(nombre_archivo):
+    """
+    Devuelve una tupla que cambia cada vez que el archivo se modifica:
+    fecha de modificación (en nanosegundos), tamaño e inodo.
+    El inodo cambia cuando el archivo se reemplaza por otro.
+    Si el archivo no existe devuelve None.
+    """
+    try:
+        estado = os.stat(nombre_archivo)
+    except FileNotFoundError:
+        return None
+    return (estado.st_mtime_ns, estado.st_size, estado.st_ino)
+
+
+def _firma_tabla(nombre_archivo):
+    """
+    Firma de la tabla completa: la del CSV base y la del archivo de cambios.
+    """
+    return (_firma_archivo(nombre_archivo), _firma_archivo(archivo_cambios(nombre_archivo)))
+
+
+def fabrica_filas(nombre_archivo, encabezados):
+    """
+    Devuelve la función que arma una fila a partir de sus valores (textos):
+    el registro de la tabla si sus columnas coinciden con las del CSV,
+    o un diccionario encabezado -> valor si no.
+    """
+    clase = registros.REGISTROS.get(nombre_archivo)
+    if clase is not None and tuple(encabezados) == clase.CAMPOS:
+        crear = clase.desde_textos
+    else:
+        def crear(valores):
+            return dict(zip(encabezados, valores))
+
+    def fabricar(valores):
+        if len(valores) < len(encabezados):
+            raise IndexError("la línea tiene menos columnas que los encabezados")
+        return crear(valores)
+
+    return fabricar
+
+
+def crear_fila(nombre_archivo, encabezados, valores):
+    """
+    Arma una fila de la tabla (registro o diccionario) a partir de sus valores.
+    """
+    return fabrica_filas(nombre_archivo, encabezados)(valores)
+
+
+def con_cambios(fila, cambios):
+    """
+    Devuelve una copia de la fila con algunos campos cambiados
+    (la fila original no se modifica, porque puede estar en la caché).
+    """
+    if isinstance(fila, registros.Registro):
+        return fila.con_cambios(cambios)
+    nueva = dict(fila)
+    nueva.update(cambios)
+    return nueva
+
+
+def _leer_sin_bloqueo(leer, firmar):
+    """
+    Lee sin esperar a los procesos que escriben: si la firma cambió
+    mientras se leía (otro proceso estaba escribiendo, y la lectura pudo
+    ver una línea a medias), se vuelve a leer.
+    Devuelve (firma de antes de leer, resultado de leer()).
+    """
+    for intento in range(INTENTOS_LECTURA):
+        firma = firmar()
+        try:
+            resultado = leer()
+        except (IndexError, ValueError):
+            if intento == INTENTOS_LECTURA - 1 or firmar() == firma:
+                raise  # el archivo está mal formado, no a medio escribir
+            continue
+        if firmar() == firma:
+            break
+    return firma, resultado
+
+
+def _parsear_archivo(nombre_archivo):
+    """
+    Lee un CSV completo y devuelve una lista de filas, una por cada
+    línea no vacía. Si se activó la lectura en paralelo (ver
+    carga_paralela.py), los archivos muy grandes se leen en varios
+    procesos, con el mismo resultado.
+    """
+    import carga_paralela  # se importa acá porque carga_paralela usa este módulo
+    if carga_paralela.conviene(nombre_archivo):
+        filas = carga_paralela.parsear_archivo(nombre_archivo)
+        if filas is not None:
+            return filas
+
+    # Las filas no forman ciclos: mientras se crean se pausa el recolector de
+    # basura, que si no recorre una y otra vez los objetos recién creados
+    recolector_activo = gc.isenabled()
+    gc.disable()
+    try:
+        with open(nombre_archivo, "r", encoding="utf-8") as archivo:
+            # La primera línea son los encabezados
+            encabezados = formato_csv.dividir(archivo.readline().strip())
+            fabricar = fabrica_filas(nombre_archivo, encabezados)
+            # Una fila por cada línea no vacía (ver formato_csv.py)
+            return list(formato_csv.filas(archivo, fabricar))
+    finally:
+        if recolector_activo:
+            gc.enable()
+
+
+def parsear_linea(encabezados, linea, nombre_archivo=None):
+    """
+    Convierte una línea del CSV en una fila (registro de la tabla
+    nombre_archivo, o diccionario encabezado -> valor).
+    """
+    return crear_fila(nombre_archivo, encabezados, formato_csv.dividir(linea.strip()))
+
+
+def _leer_cambios(nombre_archivo):
+    """
+    Lee el archivo de cambios de una tabla y devuelve una lista de
+    (clave, diccionario de cambios), en el orden en que se registraron.
+    """
+    cambios = []
+    try:
+        with open(archivo_cambios(nombre_archivo), "r", encoding="utf-8") as archivo:
+            for linea in archivo:
+                linea = linea.strip()
+                if linea:
+                    partes = formato_csv.dividir(linea)
+                    campos = {}
+                    for parte in partes[1:]:
+                        campo, valor = parte.split("=", 1)
+                        campos[campo] = valor
+                    cambios.append((partes[0], campos))
+    except FileNotFoundError:
+        pass  # si no hay archivo de cambios, no hay nada que aplicar
+    return cambios
+
+
+def _vista(nombre_archivo):
+    """
+    Devuelve lo que la transacción abierta cambió en la tabla,
+    o None si no hay transacción o no tocó esa tabla.
+    """
+    if _transaccion is None:
+        return None
+    return _transaccion["tablas"].get(nombre_archivo)
+
+
+def cambios_por_clave(nombre_archivo):
+    """
+    Devuelve un diccionario clave -> cambios pendientes de esa fila
+    (todos los cambios del archivo de cambios, ya combinados, más los
+    de la transacción abierta).
+    Se guarda en memoria mientras el archivo de cambios no cambie.
+    """
+    asegurar_recuperacion()
+    firma = _firma_archivo(archivo_cambios(nombre_archivo))
+    guardado = _cache_cambios.get(nombre_archivo)
+    if guardado is not None and guardado[0] == firma:
+        agrupados = guardado[1]
+    else:
+        firma, cambios = _leer_sin_bloqueo(lambda: _leer_cambios(nombre_archivo),
+                                           lambda: _firma_archivo(archivo_cambios(nombre_archivo)))
+        agrupados = {}
+        for clave, campos in cambios:
+            agrupados.setdefault(clave, {}).update(campos)
+        _cache_cambios[nombre_archivo] = (firma, agrupados)
+
+    vista = _vista(nombre_archivo)
+    if vista is not None and vista["cambios"]:
+        agrupados = {clave: dict(campos) for clave, campos in agrupados.items()}
+        for clave, campos in vista["cambios"]:
+            agrupados.setdefault(clave, {}).update(campos)
+    return agrupados
+
+
+def _posiciones(entrada):
+    """
+    Devuelve el diccionario clave -> índice de la fila en la caché.
+    La clave es el valor de la primera columna.
+    """
+    if entrada["posiciones"] is None:
+        posiciones = {}
+        for i, fila in enumerate(entrada["filas"]):
+            if fila:
+                posiciones[next(iter(fila.values()))] = i
+        entrada["posiciones"] = posiciones
+    return entrada["posiciones"]
+
+
+def _aplicar_cambios(entrada, clave, campos):
+    """
+    Aplica un cambio sobre la fila con esa clave (si existe).
+    La fila se reemplaza por una copia para no modificar las listas
+    que ya se entregaron a otros módulos.
+    """
+    indice = _posiciones(entrada).get(clave)
+    if indice is not None:
+        entrada["filas"][indice] = con_cambios(entrada["filas"][indice], campos)
+
+
+def _cargar_tabla(nombre_archivo):
+    """
+    Devuelve la entrada de caché de la tabla (tal como está en disco),
+    leyendo los archivos solo si cambiaron desde la última lectura.
+    """
+    asegurar_recuperacion()
+    firma = _firma_tabla(nombre_archivo)
+    if firma[0] is None:
+        raise FileNotFoundError(nombre_archivo)
+
+    entrada = _cache.get(nombre_archivo)
+    if entrada is not None and entrada["firma"] == firma:
+        _estadisticas["aciertos"] += 1
+        return entrada
+
+    _estadisticas["fallos"] += 1
+    firma, (filas, cambios) = _leer_sin_bloqueo(
+        lambda: (_parsear_archivo(nombre_archivo), _leer_cambios(nombre_archivo)),
+        lambda: _firma_tabla(nombre_archivo))
+    entrada = {"firma": firma, "filas": filas, "posiciones": None}
+    for clave, campos in cambios:
+        _aplicar_cambios(entrada, clave, campos)
+    _cache[nombre_archivo] = entrada
+    return entrada
+
+
+def _filas_vigentes(nombre_archivo):
+    """
+    Devuelve las filas de la tabla incluyendo lo que cambió la
+    transacción abierta (si la hay).
+    """
+    vista = _vista(nombre_archivo)
+    if vista is None:
+        return _cargar_tabla(nombre_archivo)["filas"]
+
+    if vista["reemplazo"] is not None:
+        filas = list(vista["reemplazo"])
+    elif os.path.exists(nombre_archivo):
+        filas = list(_cargar_tabla(nombre_archivo)["filas"])
+    else:
+        filas = []  # la tabla se crea en esta transacción
+
+    entrada = {"filas": filas + vista["agregadas"], "posiciones": None}
+    for clave, campos in vista["cambios"]:
+        _aplicar_cambios(entrada, clave, campos)
+    return entrada["filas"]
+
+
+def leer_tabla(nombre_archivo):
+    """
+    Devuelve las filas de un CSV como lista de diccionarios, con los
+    cambios pendientes ya aplicados.
+    Si los archivos no cambiaron desde la última lectura (misma fecha de
+    modificación, tamaño e inodo) se devuelven las filas guardadas en memoria
+    sin volver a leer el archivo.
+
+    La lista devuelta es nueva, pero los diccionarios son compartidos con la
+    caché: para modificar una fila se debe reemplazar por una copia
+    (por ejemplo dict(fila, estado="APROBADO")) en lugar de cambiarla directamente.
+    """
+    if _motor is not None:
+        return _motor.leer_tabla(nombre_archivo)
+    return leer_tabla_csv(nombre_archivo)
+
+
+def leer_tabla_csv(nombre_archivo):
+    """
+    Igual que leer_tabla, pero siempre desde los CSV (sin importar el motor
+    activo). La usa la migración a SQLite.
+    """
+    try:
+        return list(_filas_vigentes(nombre_archivo))
+
+    except FileNotFoundError:
+        print(f"Error: No se encontró el archivo {nombre_archivo}")
+    except Exception as e:
+        print(f"Error al leer {nombre_archivo}: {e}")
+
+    return []
+
+
+def recorrer_tabla(nombre_archivo):
+    """
+    Devuelve las filas de la tabla de a una (generador), con los cambios
+    pendientes ya aplicados, sin armar la lista completa: si la tabla no
+    está en memoria se lee el archivo línea por línea y no queda en la caché.
+    Sirve para recorrer tablas grandes con memoria acotada.
+    """
+    if _motor is not None:
+        yield from _motor.recorrer_tabla(nombre_archivo)
+        return
+
+    try:
+        asegurar_recuperacion()
+        vista = _vista(nombre_archivo)
+        if vista is not None and vista["reemplazo"] is not None:
+            yield from _filas_vigentes(nombre_archivo)
+            return
+
+        entrada = _cache.get(nombre_archivo)
+        if entrada is not None and entrada["firma"] == _firma_tabla(nombre_archivo) and vista is None:
+            yield from entrada["filas"]
+            return
+
+        cambios = cambios_por_clave(nombre_archivo)
+        if vista is None or os.path.exists(nombre_archivo):
+            with open(nombre_archivo, "r", encoding="utf-8") as archivo:
+                encabezados = formato_csv.dividir(archivo.readline().strip())
+                for fila in formato_csv.filas(archivo, fabrica_filas(nombre_archivo, encabezados)):
+                    campos = cambios.get(next(iter(fila.values())))
+                    yield con_cambios(fila, campos) if campos else fila
+
+        if vista is not None:
+            for fila in vista["agregadas"]:
+                campos = cambios.get(next(iter(fila.values())))
+                yield con_cambios(fila, campos) if campos else fila
+
+    except FileNotFoundError:
+        print(f"Error: No se encontró el archivo {nombre_archivo}")
+    except Exception as e:
+        print(f"Error al leer {nombre_archivo}: {e}")
+
+
+def buscar_en_cache(nombre_archivo, clave):
+    """
+    Busca una fila por su clave sin leer el archivo: en lo que agregó
+    la transacción abierta o en la tabla en memoria, si está vigente.
+    Devuelve (True, fila o None) si se pudo resolver así,
+    o (False, None) si hay que buscar en el archivo.
+    """
+    asegurar_recuperacion()
+    vista = _vista(nombre_archivo)
+    if vista is not None:
+        if vista["reemplazo"] is not None:
+            for fila in _filas_vigentes(nombre_archivo):
+                if next(iter(fila.values()), None) == clave:
+                    return True, fila
+            return True, None
+        for fila in vista["agregadas"]:
+            if next(iter(fila.values()), None) == clave:
+                return True, fila
+
+    entrada = _cache.get(nombre_archivo)
+    if entrada is None or entrada["firma"] != _firma_tabla(nombre_archivo):
+        return False, None
+
+    indice = _posiciones(entrada).get(clave)
+    if indice is None:
+        return True, None
+    fila = entrada["filas"][indice]
+    if vista is not None:
+        for clave_cambio, campos in vista["cambios"]:
+            if clave_cambio == clave:
+                fila = con_cambios(fila, campos)
+    return True, fila
+
+
+def filas_en_transaccion(nombre_archivo):
+    """
+    Devuelve (filas que reemplazan la tabla o None, filas agregadas)
+    por la transacción abierta, para que las búsquedas por índice
+    también las tengan en cuenta.
+    """
+    vista = _vista(nombre_archivo)
+    if vista is None:
+        return None, []
+    if vista["reemplazo"] is not None:
+        return _filas_vigentes(nombre_archivo), []
+    return None, list(vista["agregadas"])
+
+
+def buscar_por_clave(nombre_archivo, clave):
+    """
+    Devuelve la fila cuya primera columna vale clave, o None.
+    Lee la tabla completa la primera vez (queda en caché); las búsquedas
+    siguientes son directas. Pensada para tablas chicas, como la de
+    préstamos abiertos.
+    """
+    if _motor is not None:
+        return _motor.buscar_fila(nombre_archivo, clave)
+    try:
+        if _vista(nombre_archivo) is not None:
+            for fila in _filas_vigentes(nombre_archivo):
+                if next(iter(fila.values()), None) == clave:
+                    return fila
+            return None
+        entrada = _cargar_tabla(nombre_archivo)
+    except FileNotFoundError:
+        print(f"Error: No se encontró el archivo {nombre_archivo}")
+        return None
+    except Exception as e:
+        print(f"Error al leer {nombre_archivo}: {e}")
+        return None
+
+    indice = _posiciones(entrada).get(clave)
+    if indice is None:
+        return None
+    return entrada["filas"][indice]
+
+
+# =========================================================
+# Transacciones
+# =========================================================
+
+def iniciar_transaccion():
+    """
+    Abre una transacción. Si ya había una abierta, esta queda incluida
+    en ella y se confirma junto con la de afuera (así un lote de
+    operaciones se guarda con un único fsync).
+    La transacción de más afuera toma el bloqueo entre procesos hasta
+    confirmarse o cancelarse (ver concurrencia.py): no se debe pedir
+    datos al usuario con una transacción abierta.
+    """
+    global _transaccion
+    if _motor is not None:
+        return _motor.iniciar_transaccion()
+    asegurar_recuperacion()
+    if _transaccion is None:
+        bloqueada = concurrencia.bloquear()
+        _transaccion = {"nivel": 0, "fallida": not bloqueada, "bloqueada": bloqueada,
+                        "operaciones": [], "tablas": {}, "compactar": {}}
+    _transaccion["nivel"] += 1
+
+
+def cancelar_transaccion():
+    """
+    Descarta los cambios de la transacción abierta.
+    Si está dentro de otra, la de afuera tampoco se va a guardar.
+    """
+    global _transaccion
+    if _motor is not None:
+        return _motor.cancelar_transaccion()
+    if _transaccion is None:
+        return
+    _transaccion["fallida"] = True
+    _transaccion["nivel"] -= 1
+    if _transaccion["nivel"] <= 0:
+        transaccion, _transaccion = _transaccion, None
+        if transaccion["bloqueada"]:
+            concurrencia.desbloquear()
+
+
+def en_transaccion():
+    """
+    Indica si hay una transacción abierta en este proceso.
+    """
+    if _motor is not None:
+        return _motor.en_transaccion()
+    return _transaccion is not None
+
+
+def _vista_para_escribir(nombre_archivo):
+    """
+    Devuelve (creándola si hace falta) la vista de la tabla en la transacción abierta.
+    """
+    return _transaccion["tablas"].setdefault(
+        nombre_archivo, {"reemplazo": None, "agregadas": [], "cambios": []})
+
+
+def _termina_en_salto(nombre_archivo):
+    """
+    Indica si el archivo termina con un salto de línea (solo lee el último byte).
+    """
+    with open(nombre_archivo, "rb") as archivo:
+        archivo.seek(0, os.SEEK_END)
+        if archivo.tell() == 0:
+            return True
+        archivo.seek(-1, os.SEEK_END)
+        return archivo.read(1) == b"\n"
+
+
+def _unir_textos(agregada):
+    """
+    Completa el texto de una operación "agregar" con todas las líneas que se le sumaron.
+    """
+    operacion, textos = agregada
+    operacion["texto"] = "".join(textos)
+
+
+def _resolver_operaciones(operaciones):
+    """
+    Convierte las escrituras pendientes en operaciones del registro,
+    calculando en qué byte de cada archivo va cada línea agregada.
+    """
+    tamanos = {}  # tamaño que va a tener cada archivo (None si no existe)
+    resueltas = []
+    # Última operación "agregar" de cada archivo, con la lista de textos que
+    # lleva: las líneas siguientes del mismo archivo se suman a ella, así
+    # cada archivo se escribe una sola vez
+    ultima_agregada = {}
+
+    for operacion in operaciones:
+        tipo, nombre_archivo = operacion[0], operacion[1]
+
+        if nombre_archivo not in tamanos:
+            existe = os.path.exists(nombre_archivo)
+            tamanos[nombre_archivo] = os.path.getsize(nombre_archivo) if existe else None
+            if existe and not _termina_en_salto(nombre_archivo):
+                # Si la última línea no tiene salto, se lo agregamos antes
+                ultima_agregada[nombre_archivo] = ({"tipo": "agregar", "archivo": nombre_archivo,
+                                                    "posicion": tamanos[nombre_archivo]}, ["\n"])
+                resueltas.append(ultima_agregada[nombre_archivo][0])
+                tamanos[nombre_archivo] += transacciones.tamano_en_disco("\n")
+
+        if tipo == "agregar":
+            encabezados, linea = operacion[2], operacion[3]
+            texto = linea + "\n"
+            if not tamanos[nombre_archivo] and encabezados is not None:
+                texto = ",".join(encabezados) + "\n" + texto
+            posicion = tamanos[nombre_archivo] or 0
+            if nombre_archivo in ultima_agregada:
+                ultima_agregada[nombre_archivo][1].append(texto)
+            else:
+                ultima_agregada[nombre_archivo] = ({"tipo": "agregar", "archivo": nombre_archivo,
+                                                    "posicion": posicion}, [texto])
+                resueltas.append(ultima_agregada[nombre_archivo][0])
+            tamanos[nombre_archivo] = posicion + transacciones.tamano_en_disco(texto)
+
+        elif tipo == "reemplazar":
+            encabezados, filas = operacion[2], operacion[3]
+            lineas = [",".join(encabezados)]
+            for fila in filas:
+                lineas.append(formato_csv.unir([fila[encabezado] for encabezado in encabezados]))
+            texto = "\n".join(lineas) + "\n"
+            resueltas.append({"tipo": "reemplazar", "archivo": nombre_archivo, "texto": texto})
+            resueltas.append({"tipo": "borrar", "archivo": archivo_cambios(nombre_archivo)})
+            for cerrado in (nombre_archivo, archivo_cambios(nombre_archivo)):
+                if cerrado in ultima_agregada:
+                    _unir_textos(ultima_agregada.pop(cerrado))
+            tamanos[nombre_archivo] = transacciones.tamano_en_disco(texto)
+            tamanos[archivo_cambios(nombre_archivo)] = None
+
+    for agregada in ultima_agregada.values():
+        _unir_textos(agregada)
+    return resueltas
+
+
+def _actualizar_cache(tablas, firmas_antes):
+    """
+    Después de aplicar una transacción, pasa sus cambios a las tablas
+    en memoria que estaban vigentes (así no hay que volver a leerlas).
+    """
+    for nombre_archivo, vista in tablas.items():
+        entrada = _cache.get(nombre_archivo)
+        if vista["reemplazo"] is not None:
+            entrada = {"firma": firmas_antes[nombre_archivo], "filas": list(vista["reemplazo"]),
+                       "posiciones": None}
+            _cache[nombre_archivo] = entrada
+        elif entrada is None or entrada["firma"] != firmas_antes[nombre_archivo]:
+            # La caché no estaba al día: la próxima lectura lee el archivo
+            _cache.pop(nombre_archivo, None)
+            continue
+
+        for fila in vista["agregadas"]:
+            entrada["filas"].append(fila)
+            if entrada["posiciones"] is not None:
+                entrada["posiciones"][next(iter(fila.values()))] = len(entrada["filas"]) - 1
+        for clave, campos in vista["cambios"]:
+            _aplicar_cambios(entrada, clave, campos)
+        entrada["firma"] = _firma_tabla(nombre_archivo)
+
+
+def confirmar_transaccion():
+    """
+    Confirma la transacción abierta: la escribe en el registro (un único
+    fsync), la aplica sobre los archivos y actualiza la caché.
+    Si está dentro de otra transacción, solo se confirma al cerrar la de afuera.
+    Devuelve True si se guardó bien, False si hubo un error o se canceló.
+    """
+    global _transaccion
+    if _motor is not None:
+        return _motor.confirmar_transaccion()
+    if _transaccion is None:
+        return True
+
+    _transaccion["nivel"] -= 1
+    if _transaccion["nivel"] > 0:
+        return not _transaccion["fallida"]
+
+    transaccion, _transaccion = _transaccion, None
+    try:
+        return _guardar_transaccion(transaccion)
+    finally:
+        # El bloqueo se suelta después de aplicar (y compactar) los cambios
+        if transaccion["bloqueada"]:
+            concurrencia.desbloquear()
+
+
+def _guardar_transaccion(transaccion):
+    """
+    Escribe la transacción de más afuera en el registro, la aplica sobre
+    los archivos y actualiza la caché.
+    Devuelve True si se guardó bien, False si hubo un error o se canceló.
+    """
+    global _recuperado
+    if transaccion["fallida"]:
+        return False
+    if not transaccion["operaciones"]:
+        return True
+
+    try:
+        operaciones = _resolver_operaciones(transaccion["operaciones"])
+        firmas_antes = {nombre: _firma_tabla(nombre) for nombre in transaccion["tablas"]}
+        transacciones.escribir_registro(operaciones)
+    except Exception as e:
+        print(f"Error al guardar los cambios: {e}")
+        return False
+
+    try:
+        for operacion in operaciones:
+            transacciones.aplicar_operacion(operacion)
+    except Exception as e:
+        # La transacción ya está en el registro: se va a repetir en la próxima recuperación
+        _recuperado = False
+        for nombre_archivo in transaccion["tablas"]:
+            _cache.pop(nombre_archivo, None)
+        print(f"Error al guardar los cambios: {e}")
+        return False
+
+    _actualizar_cache(transaccion["tablas"], firmas_antes)
+
+    if transacciones.necesita_punto_de_control():
+        transacciones.punto_de_control()
+
+    for nombre_archivo, encabezados in transaccion["compactar"].items():
+        cambios = archivo_cambios(nombre_archivo)
+        if os.path.exists(cambios) and os.path.getsize(cambios) > LIMITE_CAMBIOS_BYTES:
+            compactar_tabla(nombre_archivo, encabezados)
+
+    return True
+
+
+# =========================================================
+# Escrituras
+# =========================================================
+
+def guardar_tabla(nombre_archivo, encabezados, filas):
+    """
+    Reemplaza el CSV con las filas dadas (solo las columnas de encabezados)
+    y borra el archivo de cambios, porque las filas ya los incluyen.
+    El archivo nuevo se escribe en un temporal y después reemplaza al
+    original, así nunca queda a medio escribir y su inodo cambia
+    (indices.py usa el inodo para saber que el archivo se reescribió).
+    Devuelve True si se guardó bien, False si hubo un error.
+    """
+    if _motor is not None:
+        return _motor.guardar_tabla(nombre_archivo, encabezados, filas)
+    fabricar = fabrica_filas(nombre_archivo, encabezados)
+    filas_guardadas = [fabricar([fila.get(encabezado, "") for encabezado in encabezados])
+                       for fila in filas]
+
+    iniciar_transaccion()
+    _transaccion["operaciones"].append(("reemplazar", nombre_archivo, encabezados, filas_guardadas))
+    _transaccion["tablas"][nombre_archivo] = {"reemplazo": filas_guardadas, "agregadas": [], "cambios": []}
+    return confirmar_transaccion()
+
+
+def agregar_fila(nombre_archivo, encabezados, fila):
+    """
+    Agrega una fila nueva al final del CSV sin leer ni reescribir las
+    filas anteriores. Si la tabla estaba en caché, la fila se agrega
+    también en memoria.
+    Devuelve True si se guardó bien, False si hubo un error.
+    """
+    if _motor is not None:
+        return _motor.agregar_fila(nombre_archivo, encabezados, fila)
+    valores = [fila.get(encabezado, "") for encabezado in encabezados]
+
+    iniciar_transaccion()
+    _transaccion["operaciones"].append(("agregar", nombre_archivo, encabezados, formato_csv.unir(valores)))
+    _vista_para_escribir(nombre_archivo)["agregadas"].append(crear_fila(nombre_archivo, encabezados, valores))
+    return confirmar_transaccion()
+
+
+def actualizar_fila(nombre_archivo, encabezados, clave, cambios, version=None):
+    """
+    Registra un cambio sobre la fila cuya primera columna vale clave,
+    agregando una línea al archivo de cambios (no se reescribe el CSV).
+    Si el archivo de cambios creció demasiado, al confirmar se compacta la tabla.
+    version: la de la fila que se leyó antes de decidir el cambio (ver
+    concurrencia.version_fila); si otro proceso la cambió, no se guarda.
+    Devuelve True si se guardó bien, False si hubo un error o un conflicto.
+    """
+    if version is not None:
+        # La comprobación y el cambio van en la misma transacción (con el bloqueo tomado)
+        iniciar_transaccion()
+        if (verificar_version(nombre_archivo, clave, version) and
+                actualizar_fila(nombre_archivo, encabezados, clave, cambios)):
+            return confirmar_transaccion()
+        cancelar_transaccion()
+        return False
+
+    if _motor is not None:
+        return _motor.actualizar_fila(nombre_archivo, encabezados, clave, cambios)
+    partes = [clave] + [f"{campo}={valor}" for campo, valor in cambios.items()]
+
+    iniciar_transaccion()
+    _transaccion["operaciones"].append(("agregar", archivo_cambios(nombre_archivo), None, formato_csv.unir(partes)))
+    _transaccion["compactar"][nombre_archivo] = encabezados
+
+    vista = _vista_para_escribir(nombre_archivo)
+    for i, fila in enumerate(vista["agregadas"]):
+        if next(iter(fila.values()), None) == clave:
+            # La fila se agregó en esta misma transacción: se cambia directamente
+            vista["agregadas"][i] = con_cambios(fila, cambios)
+            break
+    else:
+        if vista["reemplazo"] is not None:
+            entrada = {"filas": vista["reemplazo"], "posiciones": None}
+            _aplicar_cambios(entrada, clave, cambios)
+        else:
+            vista["cambios"].append((clave, dict(cambios)))
+    return confirmar_transaccion()
+
+
+def verificar_version(nombre_archivo, clave, version):
+    """
+    Comprueba que la fila con esa clave siga en la versión que se leyó
+    (concurrencia.version_fila de la fila leída). Si otro proceso la
+    cambió o la borró, avisa y devuelve False. Con version None no
+    comprueba nada. Se usa con una transacción abierta, así nadie puede
+    cambiar la fila entre la comprobación y la escritura.
+    """
+    if version is None:
+        return True
+    import indices  # se importa acá porque indices usa este módulo
+    if concurrencia.version_fila(indices.buscar_fila(nombre_archivo, clave)) == version:
+        return True
+    concurrencia.contar_conflicto()
+    print(f"\n✗ Otro usuario modificó '{clave}' mientras se editaba. Vuelva a consultarlo e intente de nuevo.")
+    return False
+
+
+def borrar_filas(nombre_archivo, encabezados, claves):
+    """
+    Quita las filas cuya primera columna está en claves.
+    En los CSV se reescribe la tabla una sola vez sin esas filas (pensada
+    para tablas chicas, como la de préstamos abiertos).
+    Devuelve True si se guardó bien, False si hubo un error.
+    """
+    if _motor is not None:
+        return _motor.borrar_filas(nombre_archivo, encabezados, claves)
+    claves = set(claves)
+    filas = [fila for fila in leer_tabla(nombre_archivo) if next(iter(fila.values()), None) not in claves]
+    return guardar_tabla(nombre_archivo, encabezados, filas)
+
+
+def compactar_tabla(nombre_archivo, encabezados):
+    """
+    Aplica todos los cambios pendientes sobre el CSV base, lo reescribe
+    y borra el archivo de cambios.
+    Antes hace un punto de control del registro, así ninguna transacción
+    vieja se vuelve a aplicar sobre el archivo ya compactado.
+    Devuelve True si se guardó bien, False si hubo un error.
+    """
+    if _motor is not None:
+        return True  # en SQLite los cambios ya se guardan sobre cada fila
+    if not os.path.exists(archivo_cambios(nombre_archivo)):
+        return True  # no hay nada que compactar
+
+    if _transaccion is not None:
+        # Dentro de una transacción se guarda como cualquier otro reemplazo
+        return guardar_tabla(nombre_archivo, encabezados, leer_tabla(nombre_archivo))
+
+    if not concurrencia.bloquear():
+        return False
+    try:
+        filas = _cargar_tabla(nombre_archivo)["filas"]
+        transacciones.punto_de_control()
+
+        temporal = nombre_archivo + ".tmp"
+        with open(temporal, "w", encoding="utf-8") as archivo:
+            archivo.write(",".join(encabezados) + "\n")
+            for fila in filas:
+                archivo.write(formato_csv.unir([fila.get(encabezado, "") for encabezado in encabezados]) + "\n")
+            archivo.flush()
+            os.fsync(archivo.fileno())
+
+        # Si el programa se corta entre estos dos pasos, al volver a aplicar
+        # los cambios sobre el CSV compactado el resultado es el mismo
+        transacciones.avanzar_generacion(nombre_archivo)
+        os.replace(temporal, nombre_archivo)
+        os.remove(archivo_cambios(nombre_archivo))
+
+        _cache[nombre_archivo] = {"firma": _firma_tabla(nombre_archivo), "filas": filas, "posiciones": None}
+        return True
+
+    except Exception as e:
+        _cache.pop(nombre_archivo, None)
+        print(f"Error al guardar {nombre_archivo}: {e}")
+        return False
+
+    finally:
+        concurrencia.desbloquear()
+
+
+def estadisticas_cache():
+    """
+    Devuelve cuántas lecturas se resolvieron desde memoria (aciertos)
+    y cuántas tuvieron que leer el archivo (fallos).
+    """
+    return dict(_estadisticas)
+
+
+def limpiar_cache():
+    """
+    Borra todas las tablas guardadas en memoria y reinicia los contadores.
+    """
+    _cache.clear()
+    _cache_cambios.clear()
+    _estadisticas["aciertos"] = 0
+    _estadisticas["fallos"] = 0
+
+
+# El motor se puede elegir sin tocar el código: TECHLAB_MOTOR=sqlite python main.py
+usar_motor(os.environ.get("TECHLAB_MOTOR", "csv"))
@@ -0,0 +1,295 @@
+"""
+Módulo de almacenamiento en SQLite
+Guarda las mismas tablas que los CSV (equipos, préstamos, usuarios,
+préstamos abiertos y secuencias) en un archivo techlab.db, con índices
+sobre los campos que usan las búsquedas. Cada operación es una sola
+sentencia sobre las filas afectadas, sin reescribir la tabla completa.
+
+Se activa con la variable de entorno TECHLAB_MOTOR=sqlite (o llamando a
+almacenamiento.usar_motor("sqlite")); el resto del sistema sigue usando
+las mismas funciones de almacenamiento.py e indices.py.
+
+Para pasar los datos de los CSV a la base de datos:
+    python almacenamiento_sqlite.py
+"""
+import sqlite3
+
+import almacenamiento
+
+ARCHIVO_BASE_DATOS = "techlab.db"
+
+# Tabla de SQLite que corresponde a cada archivo CSV, con su clave primaria
+TABLAS = {
+    "equipos.csv": ("equipos", almacenamiento.ENCABEZADOS_EQUIPOS),
+    "prestamos.csv": ("prestamos", almacenamiento.ENCABEZADOS_PRESTAMOS),
+    "usuarios.csv": ("usuarios", almacenamiento.ENCABEZADOS_USUARIOS),
+    "prestamos_abiertos.csv": ("prestamos_abiertos", almacenamiento.ENCABEZADOS_ABIERTOS),
+    "secuencias.csv": ("secuencias", almacenamiento.ENCABEZADOS_SECUENCIAS),
+}
+
+# Índices para las búsquedas del sistema (la clave primaria ya tiene el suyo)
+INDICES = [
+    "CREATE INDEX IF NOT EXISTS idx_equipos_estado ON equipos (estado_actual)",
+    "CREATE INDEX IF NOT EXISTS idx_prestamos_equipo ON prestamos (equipo_id)",
+    "CREATE INDEX IF NOT EXISTS idx_prestamos_usuario ON prestamos (usuario_prestatario)",
+    "CREATE INDEX IF NOT EXISTS idx_prestamos_estado ON prestamos (estado)",
+    "CREATE INDEX IF NOT EXISTS idx_prestamos_periodo ON prestamos (anio, mes)",
+]
+
+# Conexión abierta (una por proceso) y cantidad de transacciones anidadas
+_conexion = None
+_nivel_transaccion = 0
+_transaccion_fallida = False
+
+
+def _conectar():
+    """
+    Abre la base de datos la primera vez y crea las tablas que falten.
+    """
+    global _conexion
+    if _conexion is None:
+        # isolation_level=None: las transacciones se manejan a mano con BEGIN/COMMIT
+        _conexion = sqlite3.connect(ARCHIVO_BASE_DATOS, isolation_level=None)
+        _conexion.execute("PRAGMA journal_mode=WAL")
+        for tabla, encabezados in TABLAS.values():
+            columnas = [f"{encabezados[0]} TEXT PRIMARY KEY"]
+            columnas += [f"{encabezado} TEXT" for encabezado in encabezados[1:]]
+            _conexion.execute(f"CREATE TABLE IF NOT EXISTS {tabla} ({', '.join(columnas)})")
+        for sentencia in INDICES:
+            _conexion.execute(sentencia)
+    return _conexion
+
+
+def _tabla(nombre_archivo):
+    """
+    Devuelve (nombre de la tabla, encabezados) del archivo CSV equivalente.
+    """
+    return TABLAS[nombre_archivo]
+
+
+def _a_filas(nombre_archivo, cursor):
+    """
+    Convierte el resultado de una consulta en una lista de filas
+    (registros o diccionarios, igual que al leer el CSV).
+    """
+    columnas = [descripcion[0] for descripcion in cursor.description]
+    fabricar = almacenamiento.fabrica_filas(nombre_archivo, columnas)
+    return [fabricar(fila) for fila in cursor]
+
+
+def leer_tabla(nombre_archivo):
+    """
+    Devuelve todas las filas de la tabla, en el orden en que se agregaron.
+    """
+    try:
+        tabla, _ = _tabla(nombre_archivo)
+        return _a_filas(nombre_archivo, _conectar().execute(f"SELECT * FROM {tabla} ORDER BY rowid"))
+    except sqlite3.Error as e:
+        print(f"Error al leer {nombre_archivo}: {e}")
+        return []
+
+
+def recorrer_tabla(nombre_archivo):
+    """
+    Devuelve las filas de la tabla de a una (generador), en el orden en que
+    se agregaron, sin cargar el resultado completo en memoria.
+    """
+    try:
+        tabla, _ = _tabla(nombre_archivo)
+        cursor = _conectar().execute(f"SELECT * FROM {tabla} ORDER BY rowid")
+        columnas = [descripcion[0] for descripcion in cursor.description]
+        fabricar = almacenamiento.fabrica_filas(nombre_archivo, columnas)
+        for fila in cursor:
+            yield fabricar(fila)
+    except sqlite3.Error as e:
+        print(f"Error al leer {nombre_archivo}: {e}")
+
+
+def buscar_fila(nombre_archivo, clave):
+    """
+    Devuelve la fila con esa clave primaria, o None.
+    """
+    try:
+        tabla, encabezados = _tabla(nombre_archivo)
+        cursor = _conectar().execute(f"SELECT * FROM {tabla} WHERE {encabezados[0]} = ?", (clave,))
+        filas = _a_filas(nombre_archivo, cursor)
+        return filas[0] if filas else None
+    except sqlite3.Error as e:
+        print(f"Error al leer {nombre_archivo}: {e}")
+        return None
+
+
+def buscar_filas(nombre_archivo, campo, valor):
+    """
+    Devuelve las filas cuyo campo vale valor (usa el índice del campo).
+    """
+    try:
+        tabla, encabezados = _tabla(nombre_archivo)
+        if campo not in encabezados:
+            return []
+        cursor = _conectar().execute(
+            f"SELECT * FROM {tabla} WHERE {campo} = ? ORDER BY rowid", (valor,))
+        return _a_filas(nombre_archivo, cursor)
+    except sqlite3.Error as e:
+        print(f"Error al leer {nombre_archivo}: {e}")
+        return []
+
+
+def buscar_devueltos_del_mes(anio, mes):
+    """
+    Devuelve los préstamos DEVUELTOS de un año y mes (usa el índice (anio, mes)).
+    """
+    try:
+        cursor = _conectar().execute(
+            "SELECT * FROM prestamos WHERE anio = ? AND mes = ? AND estado = 'DEVUELTO' ORDER BY rowid",
+            (anio, mes))
+        return _a_filas("prestamos.csv", cursor)
+    except sqlite3.Error as e:
+        print(f"Error al leer prestamos.csv: {e}")
+        return []
+
+
+def _ejecutar(nombre_archivo, sentencias):
+    """
+    Ejecuta las sentencias dentro de una transacción (o de la que ya
+    esté abierta). Devuelve True si todo salió bien.
+    """
+    iniciar_transaccion()
+    try:
+        conexion = _conectar()
+        for sentencia, parametros in sentencias:
+            conexion.execute(sentencia, parametros)
+    except sqlite3.Error as e:
+        print(f"Error al guardar {nombre_archivo}: {e}")
+        cancelar_transaccion()
+        return False
+    return confirmar_transaccion()
+
+
+def guardar_tabla(nombre_archivo, encabezados, filas):
+    """
+    Reemplaza todas las filas de la tabla.
+    """
+    tabla, _ = _tabla(nombre_archivo)
+    marcas = ", ".join("?" for _ in encabezados)
+    sentencias = [(f"DELETE FROM {tabla}", ())]
+    for fila in filas:
+        valores = tuple(fila.get(encabezado, "") for encabezado in encabezados)
+        sentencias.append((f"INSERT INTO {tabla} ({', '.join(encabezados)}) VALUES ({marcas})", valores))
+    return _ejecutar(nombre_archivo, sentencias)
+
+
+def agregar_fila(nombre_archivo, encabezados, fila):
+    """
+    Inserta una fila nueva.
+    """
+    tabla, _ = _tabla(nombre_archivo)
+    marcas = ", ".join("?" for _ in encabezados)
+    valores = tuple(fila.get(encabezado, "") for encabezado in encabezados)
+    return _ejecutar(nombre_archivo, [
+        (f"INSERT INTO {tabla} ({', '.join(encabezados)}) VALUES ({marcas})", valores)
+    ])
+
+
+def actualizar_fila(nombre_archivo, encabezados, clave, cambios):
+    """
+    Cambia algunos campos de la fila con esa clave primaria.
+    """
+    tabla, _ = _tabla(nombre_archivo)
+    asignaciones = ", ".join(f"{campo} = ?" for campo in cambios)
+    valores = tuple(cambios.values()) + (clave,)
+    return _ejecutar(nombre_archivo, [
+        (f"UPDATE {tabla} SET {asignaciones} WHERE {encabezados[0]} = ?", valores)
+    ])
+
+
+def borrar_filas(nombre_archivo, encabezados, claves):
+    """
+    Borra las filas con esas claves primarias.
+    """
+    tabla, _ = _tabla(nombre_archivo)
+    return _ejecutar(nombre_archivo, [
+        (f"DELETE FROM {tabla} WHERE {encabezados[0]} = ?", (clave,)) for clave in claves
+    ])
+
+
+def iniciar_transaccion():
+    """
+    Abre una transacción (o se suma a la que ya está abierta).
+    """
+    global _nivel_transaccion, _transaccion_fallida
+    if _nivel_transaccion == 0:
+        _conectar().execute("BEGIN IMMEDIATE")
+        _transaccion_fallida = False
+    _nivel_transaccion += 1
+
+
+def confirmar_transaccion():
+    """
+    Confirma la transacción cuando se cierra la de más afuera.
+    Devuelve True si se guardó bien, False si se canceló o hubo un error.
+    """
+    global _nivel_transaccion
+    if _nivel_transaccion == 0:
+        return True
+    _nivel_transaccion -= 1
+    if _nivel_transaccion > 0:
+        return not _transaccion_fallida
+
+    try:
+        if _transaccion_fallida:
+            _conectar().execute("ROLLBACK")
+            return False
+        _conectar().execute("COMMIT")
+        return True
+    except sqlite3.Error as e:
+        print(f"Error al guardar los cambios: {e}")
+        _conectar().execute("ROLLBACK")
+        return False
+
+
+def cancelar_transaccion():
+    """
+    Descarta los cambios de la transacción abierta.
+    """
+    global _nivel_transaccion, _transaccion_fallida
+    if _nivel_transaccion == 0:
+        return
+    _transaccion_fallida = True
+    _nivel_transaccion -= 1
+    if _nivel_transaccion == 0:
+        _conectar().execute("ROLLBACK")
+
+
+def en_transaccion():
+    """
+    Indica si hay una transacción abierta.
+    """
+    return _nivel_transaccion > 0
+
+
+def migrar_desde_csv():
+    """
+    Copia el contenido de los CSV (con sus cambios pendientes aplicados)
+    a la base de datos, reemplazando lo que hubiera.
+    Devuelve True si se migraron todas las tablas.
+    """
+    iniciar_transaccion()
+    for nombre_archivo, (tabla, encabezados) in TABLAS.items():
+        filas = almacenamiento.leer_tabla_csv(nombre_archivo)
+        if not guardar_tabla(nombre_archivo, encabezados, filas):
+            cancelar_transaccion()
+            return False
+        print(f"{nombre_archivo} -> {tabla}: {len(filas)} filas")
+    return confirmar_transaccion()
+
+
+if __name__ == "__main__":
+    import prestamos
+
+    # Los préstamos abiertos y la secuencia se generan desde los CSV si todavía no existen
+    prestamos.reconstruir_prestamos_abiertos()
+    if migrar_desde_csv():
+        print(f"\n✓ Datos migrados a {ARCHIVO_BASE_DATOS}")
+    else:
+        print("\n✗ Error al migrar los datos")
@@ -0,0 +1,443 @@
+"""
+Módulo de estadísticas de préstamos
+Calcula los indicadores del tablero de reportes sobre todo el historial:
+- tasa_retraso_por_tipo: porcentaje de devoluciones con retraso por tipo de usuario
+- dias_por_categoria: días usados contra días autorizados por categoría de equipo
+- uso_por_equipo_mes: préstamos y días de uso de cada equipo en cada mes
+- principales_usuarios: usuarios con más préstamos
+Además prestamos_vencidos() lista los préstamos APROBADOS que ya
+deberían haberse devuelto a una fecha dada.
+
+Los cálculos no recorren las filas una por una: primero se arma una
+columna (arreglo de números) por campo con cargar_columnas() y después
+cada indicador se calcula con operaciones sobre columnas completas
+(agrupar con bincount, filtrar con máscaras) usando NumPy.
+NumPy es opcional: si no está instalado se usan los arreglos del módulo
+array y los mismos cálculos con bucles de Python (dan los mismos
+resultados, pero tardan bastante más en historiales grandes).
+
+Las columnas se arman desde la instantánea por columnas si está vigente
+(ver instantanea.py), sin convertir fila por fila; si no, desde las filas
+de prestamos.csv. Si hay préstamos archivados (ver archivado.py) se arman
+desde el historial completo.
+"""
+import calendar
+from array import array
+from collections import Counter
+from datetime import date
+
+import almacenamiento
+import archivado
+import fechas
+import instantanea
+import lector_mapeado
+
+try:
+    import numpy as np
+except ImportError:  # NumPy es opcional
+    np = None
+
+# Campos con texto repetido: cada fila guarda el número de su valor
+# en la lista columnas["valores"][campo]
+CAMPOS_CODIGOS = ["equipo_id", "usuario_prestatario", "tipo_usuario", "retraso", "estado"]
+
+# Campos con números: las filas sin un número válido guardan VACIO
+CAMPOS_ENTEROS = ["dias_autorizados", "dias_reales_usados", "mes", "anio"]
+
+VACIO = instantanea.VACIO
+
+# Categoría de los préstamos de equipos que no están en equipos.csv
+SIN_CATEGORIA = "(sin categoría)"
+
+
+def _entero(texto):
+    """
+    Convierte el texto de un campo numérico, o devuelve VACIO si no es un número.
+    """
+    try:
+        valor = int(texto)
+    except (TypeError, ValueError):
+        return VACIO
+    return valor if VACIO < valor < 2 ** 31 else VACIO
+
+
+# =========================================================
+# Armar las columnas
+# =========================================================
+
+class _Acumulador:
+    """
+    Arma las columnas agregando filas de a una (para las filas que no
+    están en la instantánea, o para todas si no hay instantánea).
+    """
+
+    def __init__(self, valores):
+        self.valores = valores
+        self.numeros = {}  # campo -> {valor: número}, se arma al primer uso
+        self.columnas = {campo: array("i") for campo in CAMPOS_CODIGOS + CAMPOS_ENTEROS}
+
+    def codigo(self, campo, texto):
+        """
+        Devuelve el número del valor en la lista del campo (lo agrega si es nuevo).
+        """
+        numeros = self.numeros.get(campo)
+        if numeros is None:
+            numeros = self.numeros[campo] = {valor: i for i, valor in enumerate(self.valores[campo])}
+        numero = numeros.get(texto)
+        if numero is None:
+            numero = numeros[texto] = len(self.valores[campo])
+            self.valores[campo].append(texto)
+        return numero
+
+    def valores_de(self, fila):
+        """
+        Devuelve los números de cada campo de la fila, en el orden de
+        CAMPOS_CODIGOS + CAMPOS_ENTEROS.
+        """
+        return ([self.codigo(campo, fila.get(campo, "")) for campo in CAMPOS_CODIGOS] +
+                [_entero(fila.get(campo, "")) for campo in CAMPOS_ENTEROS])
+
+    def agregar(self, fila):
+        for campo, valor in zip(CAMPOS_CODIGOS + CAMPOS_ENTEROS, self.valores_de(fila)):
+            self.columnas[campo].append(valor)
+
+
+def _desde_filas(filas):
+    """
+    Arma las columnas recorriendo las filas.
+    """
+    acumulador = _Acumulador({campo: [] for campo in CAMPOS_CODIGOS})
+    for fila in filas:
+        acumulador.agregar(fila)
+    return acumulador.valores, acumulador.columnas
+
+
+def _desde_instantanea(tabla):
+    """
+    Arma las columnas copiando los arreglos de la instantánea (sin
+    convertir filas) y corrige solo las filas con cambios pendientes y
+    las que se agregaron después de generarla.
+    """
+    valores = {}
+    columnas = {}
+    for campo in CAMPOS_CODIGOS + CAMPOS_ENTEROS:
+        arreglo, descripcion = tabla.columna(campo)
+        columna = np.array(arreglo, dtype=np.int32) if np is not None else array("i", arreglo)
+        if campo in CAMPOS_CODIGOS:
+            valores[campo] = list(descripcion["valores"])
+        else:
+            # Los textos guardados aparte se convierten igual que en _desde_filas
+            for fila, texto in descripcion["excepciones"].items():
+                columna[fila] = _entero(texto)
+        columnas[campo] = columna
+
+    acumulador = _Acumulador(valores)
+    for numero, fila in tabla.filas_con_cambios():
+        for campo, valor in zip(CAMPOS_CODIGOS + CAMPOS_ENTEROS, acumulador.valores_de(fila)):
+            columnas[campo][numero] = valor
+    for fila in tabla.cola:
+        acumulador.agregar(fila)
+
+    for campo, agregadas in acumulador.columnas.items():
+        if np is not None:
+            columnas[campo] = np.concatenate([columnas[campo], np.asarray(agregadas, dtype=np.int32)])
+        else:
+            columnas[campo].extend(agregadas)
+    return valores, columnas
+
+
+def cargar_columnas(nombre_archivo="prestamos.csv"):
+    """
+    Devuelve las columnas de la tabla de préstamos para calcular estadísticas:
+    un diccionario con
+    - "filas": cantidad de préstamos
+    - "valores": campo -> lista de valores distintos (campos de CAMPOS_CODIGOS)
+    - una columna por campo (arreglo de NumPy, o array("i") sin NumPy)
+    """
+    # Con préstamos archivados la instantánea (solo prestamos.csv) no alcanza
+    archivados = nombre_archivo == "prestamos.csv" and archivado.hay_archivados()
+    tabla = None if archivados else instantanea.cargar(nombre_archivo)
+    if tabla is not None:
+        valores, columnas = _desde_instantanea(tabla)
+    else:
+        filas = archivado.recorrer_historial() if archivados else almacenamiento.leer_tabla(nombre_archivo)
+        valores, columnas = _desde_filas(filas)
+        if np is not None:
+            columnas = {campo: np.asarray(columna, dtype=np.int32) for campo, columna in columnas.items()}
+    columnas["valores"] = valores
+    columnas["filas"] = len(columnas["estado"])
+    return columnas
+
+
+def _candidatos(numeros, limite):
+    """
+    Posiciones de los valores que pueden quedar entre los limite mayores
+    (los que llegan al limite-ésimo mayor, incluidos los empates), para
+    ordenar solo esas en lugar de todo el arreglo.
+    """
+    if len(numeros) <= limite:
+        return np.arange(len(numeros))
+    umbral = np.partition(numeros, len(numeros) - limite)[len(numeros) - limite]
+    return np.nonzero(numeros >= umbral)[0]
+
+
+def _codigo(columnas, campo, valor):
+    """
+    Número del valor en la lista del campo, o -1 si ninguna fila lo tiene.
+    """
+    try:
+        return columnas["valores"][campo].index(valor)
+    except ValueError:
+        return -1
+
+
+# =========================================================
+# Estadísticas
+# =========================================================
+
+def tasa_retraso_por_tipo(columnas):
+    """
+    Para cada tipo de usuario: cantidad de préstamos devueltos, cuántos se
+    devolvieron con retraso y el porcentaje (tasa_retraso, de 0 a 100).
+    """
+    tipos = columnas["valores"]["tipo_usuario"]
+    devuelto = _codigo(columnas, "estado", "DEVUELTO")
+    con_retraso = _codigo(columnas, "retraso", "SI")
+
+    if np is not None:
+        devueltos = columnas["estado"] == devuelto
+        tipo = columnas["tipo_usuario"]
+        totales = np.bincount(tipo[devueltos], minlength=len(tipos))
+        tarde = np.bincount(tipo[devueltos & (columnas["retraso"] == con_retraso)], minlength=len(tipos))
+    else:
+        totales = [0] * len(tipos)
+        tarde = [0] * len(tipos)
+        for tipo, estado, retraso in zip(columnas["tipo_usuario"], columnas["estado"], columnas["retraso"]):
+            if estado == devuelto:
+                totales[tipo] += 1
+                if retraso == con_retraso:
+                    tarde[tipo] += 1
+
+    resultado = []
+    for numero, tipo in enumerate(tipos):
+        if totales[numero]:
+            resultado.append({
+                "tipo_usuario": tipo,
+                "devueltos": int(totales[numero]),
+                "con_retraso": int(tarde[numero]),
+                "tasa_retraso": 100 * int(tarde[numero]) / int(totales[numero]),
+            })
+    return sorted(resultado, key=lambda fila: fila["tipo_usuario"])
+
+
+def _categorias_de_equipos(columnas, categorias):
+    """
+    Devuelve (nombres de categorías, lista con la categoría de cada valor de equipo_id).
+    """
+    if categorias is None:
+        categorias = {equipo.get("equipo_id"): equipo.get("categoria")
+                      for equipo in almacenamiento.leer_tabla("equipos.csv")}
+    nombres = sorted(set(categorias.values())) + [SIN_CATEGORIA]
+    numeros = {nombre: i for i, nombre in enumerate(nombres)}
+    sin_categoria = numeros[SIN_CATEGORIA]
+    por_equipo = [numeros.get(categorias.get(equipo_id), sin_categoria)
+                  for equipo_id in columnas["valores"]["equipo_id"]]
+    return nombres, por_equipo
+
+
+def dias_por_categoria(columnas, categorias=None):
+    """
+    Para cada categoría de equipo, sobre los préstamos devueltos: cantidad,
+    promedio de días autorizados, promedio de días realmente usados y
+    qué parte de los días autorizados se usó (proporcion_usada).
+    categorias es un diccionario equipo_id -> categoría; si no se da, se lee equipos.csv.
+    """
+    nombres, por_equipo = _categorias_de_equipos(columnas, categorias)
+    devuelto = _codigo(columnas, "estado", "DEVUELTO")
+
+    if np is not None:
+        autorizados = columnas["dias_autorizados"]
+        reales = columnas["dias_reales_usados"]
+        validos = (columnas["estado"] == devuelto) & (autorizados != VACIO) & (reales != VACIO)
+        categoria = np.asarray(por_equipo, dtype=np.int32)[columnas["equipo_id"][validos]]
+        cantidades = np.bincount(categoria, minlength=len(nombres))
+        suma_autorizados = np.bincount(categoria, weights=autorizados[validos], minlength=len(nombres))
+        suma_reales = np.bincount(categoria, weights=reales[validos], minlength=len(nombres))
+    else:
+        cantidades = [0] * len(nombres)
+        suma_autorizados = [0] * len(nombres)
+        suma_reales = [0] * len(nombres)
+        filas = zip(columnas["equipo_id"], columnas["estado"],
+                    columnas["dias_autorizados"], columnas["dias_reales_usados"])
+        for equipo, estado, autorizados, reales in filas:
+            if estado == devuelto and autorizados != VACIO and reales != VACIO:
+                categoria = por_equipo[equipo]
+                cantidades[categoria] += 1
+                suma_autorizados[categoria] += autorizados
+                suma_reales[categoria] += reales
+
+    resultado = []
+    for numero, nombre in enumerate(nombres):
+        cantidad = int(cantidades[numero])
+        if cantidad:
+            resultado.append({
+                "categoria": nombre,
+                "devueltos": cantidad,
+                "promedio_dias_autorizados": float(suma_autorizados[numero]) / cantidad,
+                "promedio_dias_reales": float(suma_reales[numero]) / cantidad,
+                "proporcion_usada": (float(suma_reales[numero]) / float(suma_autorizados[numero])
+                                     if suma_autorizados[numero] else 0.0),
+            })
+    return resultado
+
+
+def _dias_del_mes(periodo):
+    """
+    Cantidad de días del mes de un período (anio * 12 + mes - 1).
+    """
+    return calendar.monthrange(periodo // 12, periodo % 12 + 1)[1]
+
+
+def uso_por_equipo_mes(columnas, anio=None, limite=None):
+    """
+    Para cada equipo y mes (de los préstamos devueltos): cantidad de
+    préstamos, días de uso y utilización (días de uso / días del mes).
+    Si se da anio, solo ese año. Si se da limite, devuelve solo los
+    limite equipo-mes de mayor utilización (a igual utilización, por
+    equipo, año y mes); si no, todos ordenados por equipo, año y mes.
+    """
+    devuelto = _codigo(columnas, "estado", "DEVUELTO")
+    equipos = columnas["valores"]["equipo_id"]
+
+    if np is not None:
+        mes = columnas["mes"]
+        anios = columnas["anio"]
+        reales = columnas["dias_reales_usados"]
+        validos = (columnas["estado"] == devuelto) & (mes >= 1) & (mes <= 12) & (anios >= 1) & (anios <= 9999)
+        if anio is not None:
+            validos &= anios == anio
+        periodo = anios[validos].astype(np.int64) * 12 + mes[validos] - 1
+        claves = (columnas["equipo_id"][validos].astype(np.int64) << 32) | periodo
+        grupos, numero_grupo = np.unique(claves, return_inverse=True)
+        prestamos = np.bincount(numero_grupo)
+        dias = np.bincount(numero_grupo, weights=np.where(reales[validos] != VACIO, reales[validos], 0))
+        periodos = grupos & 0xFFFFFFFF
+        primero = int(periodos.min()) if len(periodos) else 0
+        dias_mes = np.array([_dias_del_mes(periodo) for periodo in range(primero, int(periodos.max(initial=primero)) + 1)])
+        utilizacion = dias / dias_mes[periodos - primero]
+        equipo = grupos >> 32
+        if limite is not None:
+            seleccion = sorted(_candidatos(utilizacion, limite).tolist(),
+                               key=lambda i: (-utilizacion[i], equipos[equipo[i]], periodos[i]))[:limite]
+        else:
+            seleccion = range(len(grupos))
+        filas = [(int(equipo[i]), int(periodos[i]), int(prestamos[i]), int(dias[i]), float(utilizacion[i]))
+                 for i in seleccion]
+    else:
+        contador = Counter()
+        dias = Counter()
+        registros = zip(columnas["equipo_id"], columnas["estado"], columnas["mes"],
+                        columnas["anio"], columnas["dias_reales_usados"])
+        for equipo, estado, mes, anio_fila, reales in registros:
+            if estado == devuelto and 1 <= mes <= 12 and 1 <= anio_fila <= 9999 and (anio is None or anio_fila == anio):
+                clave = (equipo, anio_fila * 12 + mes - 1)
+                contador[clave] += 1
+                if reales != VACIO:
+                    dias[clave] += reales
+        filas = [(equipo, periodo, cantidad, dias[(equipo, periodo)],
+                  dias[(equipo, periodo)] / _dias_del_mes(periodo))
+                 for (equipo, periodo), cantidad in contador.items()]
+        if limite is not None:
+            filas = sorted(filas, key=lambda fila: (-fila[4], equipos[fila[0]], fila[1]))[:limite]
+
+    resultado = [{
+        "equipo_id": equipos[equipo],
+        "anio": periodo // 12,
+        "mes": periodo % 12 + 1,
+        "prestamos": cantidad,
+        "dias_usados": dias_usados,
+        "utilizacion": utilizacion_mes,
+    } for equipo, periodo, cantidad, dias_usados, utilizacion_mes in filas]
+    if limite is None:
+        resultado.sort(key=lambda fila: (fila["equipo_id"], fila["anio"], fila["mes"]))
+    return resultado
+
+
+def principales_usuarios(columnas, limite=10):
+    """
+    Los limite usuarios con más préstamos (aprobados o devueltos), con su
+    cantidad de préstamos y el total de días usados. Si empatan, por nombre.
+    """
+    usuarios = columnas["valores"]["usuario_prestatario"]
+    estados = [_codigo(columnas, "estado", "APROBADO"), _codigo(columnas, "estado", "DEVUELTO")]
+
+    if np is not None:
+        validos = np.isin(columnas["estado"], estados)
+        usuario = columnas["usuario_prestatario"][validos]
+        reales = columnas["dias_reales_usados"][validos]
+        cantidades = np.bincount(usuario, minlength=len(usuarios))
+        dias = np.bincount(usuario, weights=np.where(reales != VACIO, reales, 0), minlength=len(usuarios))
+        mejores = sorted(_candidatos(cantidades, limite).tolist(),
+                         key=lambda numero: (-cantidades[numero], usuarios[numero]))[:limite]
+    else:
+        cantidades = [0] * len(usuarios)
+        dias = [0] * len(usuarios)
+        for usuario, estado, reales in zip(columnas["usuario_prestatario"], columnas["estado"],
+                                           columnas["dias_reales_usados"]):
+            if estado in estados:
+                cantidades[usuario] += 1
+                if reales != VACIO:
+                    dias[usuario] += reales
+        mejores = sorted(range(len(usuarios)), key=lambda numero: (-cantidades[numero], usuarios[numero]))[:limite]
+
+    return [{"usuario": usuarios[numero], "prestamos": int(cantidades[numero]), "dias_usados": int(dias[numero])}
+            for numero in mejores if cantidades[numero]]
+
+
+# =========================================================
+# Préstamos vencidos
+# =========================================================
+
+def _dia_de(prestamo, campo):
+    """
+    Número de día (date.toordinal()) de un campo de fecha, o VACIO si no es
+    una fecha válida (ver fechas.dia_de).
+    """
+    dia = fechas.dia_de(prestamo, campo)
+    return VACIO if dia is None else dia
+
+
+def _entero_de(prestamo, campo):
+    """
+    Valor de un campo numérico (ya convertido en los registros), o VACIO.
+    """
+    valor = getattr(prestamo, campo, None)
+    return valor if isinstance(valor, int) else _entero(prestamo.get(campo, ""))
+
+
+def prestamos_vencidos(fecha_referencia=None):
+    """
+    Devuelve los préstamos APROBADOS (sin devolver) cuyo plazo
+    (fecha_prestamo + dias_autorizados) ya pasó a la fecha de referencia
+    (hoy si no se da), como lista de (préstamo, días de atraso), de mayor
+    a menor atraso. Los préstamos sin fecha o días válidos no se incluyen.
+    El atraso se calcula con números de día sobre todas las filas a la vez,
+    sin convertir las fechas de texto una por una.
+    """
+    referencia = (fecha_referencia or date.today()).toordinal()
+    aprobados = lector_mapeado.filtrar("prestamos.csv", "estado", "APROBADO")
+    fechas = array("i", [_dia_de(prestamo, "fecha_prestamo") for prestamo in aprobados])
+    dias = array("i", [_entero_de(prestamo, "dias_autorizados") for prestamo in aprobados])
+
+    if np is not None:
+        fechas = np.asarray(fechas, dtype=np.int64)
+        dias = np.asarray(dias, dtype=np.int64)
+        atraso = referencia - (fechas + dias)
+        vencidos = np.nonzero((fechas != VACIO) & (dias != VACIO) & (atraso > 0))[0]
+        orden = vencidos[np.argsort(-atraso[vencidos], kind="stable")]
+        return [(aprobados[numero], int(atraso[numero])) for numero in orden]
+
+    vencidos = [(prestamo, referencia - (fecha + dias_prestamo))
+                for prestamo, fecha, dias_prestamo in zip(aprobados, fechas, dias)
+                if fecha != VACIO and dias_prestamo != VACIO and referencia > fecha + dias_prestamo]
+    return sorted(vencidos, key=lambda vencido: -vencido[1])
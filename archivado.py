@@ -0,0 +1,487 @@
+"""
+Módulo de archivo de préstamos cerrados
+prestamos.csv guarda solo los préstamos abiertos (PENDIENTES y APROBADOS)
+y los que se cerraron después del último archivado. Los préstamos cerrados
+(DEVUELTO y RECHAZADO) se mueven a un archivo comprimido por año, en la
+carpeta archivo/ (prestamos_AAAA.csv.gz, con las mismas columnas que
+prestamos.csv y las filas ordenadas por ID). El año es el de la columna
+anio (el de la fecha del préstamo); las filas sin un año válido quedan en
+prestamos.csv.
+
+Así las operaciones de todos los días (solicitar, aprobar, devolver)
+leen un archivo que crece con los préstamos abiertos y no con el historial.
+El historial completo (particiones y estadísticas) se lee con
+recorrer_historial(), que junta prestamos.csv y los archivos de cada año.
+
+Cada archivo de un año está comprimido en bloques de FILAS_POR_BLOQUE filas
+(cada bloque es un miembro gzip: gzip.open lo lee como un único archivo) y
+tiene índices como los de indices.py, que se generan al archivar:
+- primario (prestamos_AAAA.csv.gz.idx): ID del préstamo -> posición de su bloque
+- secundarios sobre equipo_id y usuario_prestatario: valor -> posiciones
+  de los bloques con ese valor
+Así buscar un préstamo o el historial de un equipo o usuario
+(buscar_prestamo, completar_con_archivados) solo descomprime los bloques
+que tienen filas buscadas, y no lee los años donde no hay ninguna.
+Si un índice no corresponde al archivo (por ejemplo si el archivado se
+cortó antes de guardarlo) se vuelve a construir recorriendo los bloques.
+
+Archivar escribe primero los archivos del año (temporal + os.replace) y
+después reescribe prestamos.csv. Si el programa se corta entre los dos
+pasos un préstamo puede quedar en los dos lugares: al leer se usa la fila
+de prestamos.csv y el siguiente archivado lo corrige.
+
+Para archivar los préstamos cerrados:
+    python archivado.py
+
+Con el motor SQLite no se archiva: las consultas ya usan los índices de
+la base de datos.
+"""
+import gzip
+import heapq
+import os
+import zlib
+
+import almacenamiento
+import formato_csv
+import indices
+import instantanea
+import transacciones
+
+CARPETA_ARCHIVO = "archivo"
+
+ESTADOS_CERRADOS = ("DEVUELTO", "RECHAZADO")
+
+# Nivel de compresión: el 6 comprime casi igual que el 9 y bastante más rápido
+NIVEL_COMPRESION = 6
+
+# Cantidad de filas de cada bloque comprimido por separado
+FILAS_POR_BLOQUE = 500
+
+# Campos con índice en los archivos de cada año (None es el índice primario)
+CAMPOS_INDEXADOS = (None, "equipo_id", "usuario_prestatario")
+
+# Tamaño de cada lectura del archivo comprimido al descomprimir un bloque
+TAMANO_LECTURA = 64 * 1024
+
+# Índices cargados en memoria: (nombre del archivo, campo) ->
+# {"estado", "posiciones"}; estado es el del archivo cuando se indexó
+_indices = {}
+
+
+def archivo_anual(anio):
+    """
+    Devuelve el nombre del archivo de los préstamos cerrados de un año.
+    """
+    return os.path.join(CARPETA_ARCHIVO, f"prestamos_{anio}.csv.gz")
+
+
+def anios_archivados():
+    """
+    Devuelve la lista ordenada de años que tienen archivo.
+    """
+    if not os.path.isdir(CARPETA_ARCHIVO):
+        return []
+    anios = []
+    for nombre in os.listdir(CARPETA_ARCHIVO):
+        if nombre.startswith("prestamos_") and nombre.endswith(".csv.gz"):
+            anio = nombre[len("prestamos_"):-len(".csv.gz")]
+            if anio.isdigit():
+                anios.append(anio)
+    return sorted(anios)
+
+
+def numero_id(fila):
+    """
+    Clave para ordenar las filas por ID: los IDs se asignan en orden
+    (P0001, P0002, ...), así que el número del ID sigue el orden en que
+    se agregaron los préstamos.
+    """
+    prestamo_id = fila.get("prestamo_id", "")
+    numero = prestamo_id[1:]
+    return (0, int(numero), prestamo_id) if numero.isdigit() else (1, 0, prestamo_id)
+
+
+# =========================================================
+# Lectura de los archivos de cada año
+# =========================================================
+
+def recorrer_archivo_anual(anio):
+    """
+    Devuelve (generador) los préstamos archivados de un año, de a uno y
+    ordenados por ID, sin dejarlos en memoria.
+    """
+    nombre_archivo = archivo_anual(anio)
+    if not os.path.exists(nombre_archivo):
+        return
+    try:
+        with gzip.open(nombre_archivo, "rt", encoding="utf-8") as archivo:
+            encabezados = formato_csv.dividir(archivo.readline().strip())
+            yield from formato_csv.filas(archivo, almacenamiento.fabrica_filas("prestamos.csv", encabezados))
+    except Exception as e:
+        print(f"Error al leer {nombre_archivo}: {e}")
+
+
+def _leer_bloque(archivo, datos=b""):
+    """
+    Descomprime el bloque (miembro gzip) que empieza en la posición actual
+    del archivo; datos son bytes ya leídos de esa posición en adelante.
+    Devuelve (texto del bloque, bytes comprimidos que ocupa, bytes leídos
+    de más), o None si el archivo ya no tenía más bloques.
+    """
+    descompresor = zlib.decompressobj(wbits=31)
+    partes = []
+    usados = 0
+    while not descompresor.eof:
+        if not datos:
+            datos = archivo.read(TAMANO_LECTURA)
+            if not datos:
+                if usados == 0:
+                    return None
+                raise EOFError("el archivo comprimido está cortado")
+        partes.append(descompresor.decompress(datos))
+        usados += len(datos) - len(descompresor.unused_data)
+        datos = descompresor.unused_data
+    return b"".join(partes).decode("utf-8"), usados, datos
+
+
+def _recorrer_bloques(nombre_archivo):
+    """
+    Devuelve (generador) la posición y las líneas de cada bloque del
+    archivo, sin la línea de encabezados.
+    """
+    with open(nombre_archivo, "rb") as archivo:
+        posicion = 0
+        datos = b""
+        while True:
+            bloque = _leer_bloque(archivo, datos)
+            if bloque is None:
+                return
+            texto, usados, datos = bloque
+            lineas = texto.splitlines()
+            yield posicion, lineas[1:] if posicion == 0 else lineas
+            posicion += usados
+
+
+def _filas_del_bloque(nombre_archivo, posicion, encabezados):
+    """
+    Devuelve las filas del bloque que empieza en esa posición del archivo.
+    """
+    with open(nombre_archivo, "rb") as archivo:
+        archivo.seek(posicion)
+        lineas = _leer_bloque(archivo)[0].splitlines()
+    if posicion == 0:
+        lineas = lineas[1:]  # el primer bloque empieza con los encabezados
+    return list(formato_csv.filas(lineas, almacenamiento.fabrica_filas("prestamos.csv", encabezados)))
+
+
+def _leer_encabezados(nombre_archivo):
+    """
+    Lee solo la primera línea del archivo (los encabezados).
+    """
+    with gzip.open(nombre_archivo, "rt", encoding="utf-8") as archivo:
+        return formato_csv.dividir(archivo.readline().strip())
+
+
+# =========================================================
+# Índices de los archivos de cada año
+# =========================================================
+
+def _estado_archivo(nombre_archivo):
+    """
+    Devuelve (tamaño, inodo, fecha de modificación, generación) del
+    archivo, o None si no existe: si cambia, el archivo se reescribió.
+    """
+    try:
+        estado = os.stat(nombre_archivo)
+    except FileNotFoundError:
+        return None
+    return (estado.st_size, estado.st_ino, estado.st_mtime_ns, transacciones.generacion(nombre_archivo))
+
+
+def _guardar_indice(nombre_archivo, campo, estado, posiciones):
+    """
+    Escribe un índice del archivo (temporal + reemplazo), con el estado
+    del archivo en la primera línea como en indices.py.
+    """
+    temporal = indices.archivo_indice(nombre_archivo, campo) + ".tmp"
+    with open(temporal, "w", encoding="utf-8") as archivo:
+        archivo.write(",".join(f"{valor:020d}" for valor in estado) + "\n")
+        for valor, lista in posiciones.items():
+            for posicion in lista:
+                archivo.write(f"{valor},{posicion}\n")
+    os.replace(temporal, indices.archivo_indice(nombre_archivo, campo))
+
+
+def _leer_indice_guardado(nombre_archivo, campo):
+    """
+    Lee un índice del archivo. Devuelve None si no existe o está dañado.
+    """
+    try:
+        with open(indices.archivo_indice(nombre_archivo, campo), "r", encoding="utf-8") as archivo:
+            estado = tuple(map(int, archivo.readline().strip().split(",")))
+            posiciones = {}
+            for linea in archivo:
+                linea = linea.rstrip("\r\n")
+                if linea:
+                    valor, posicion = linea.rsplit(",", 1)
+                    posiciones.setdefault(valor, []).append(int(posicion))
+        return {"estado": estado, "posiciones": posiciones}
+    except (FileNotFoundError, ValueError):
+        return None
+
+
+def _agregar_posiciones(posiciones, encabezados, posicion, filas):
+    """
+    Agrega a posiciones (campo -> valor -> lista de posiciones) el bloque
+    de esa posición para los valores de sus filas.
+    """
+    for campo in CAMPOS_INDEXADOS:
+        columna = encabezados.index(campo or "prestamo_id")
+        for valor in dict.fromkeys(fila[columna] for fila in filas):
+            posiciones[campo].setdefault(valor, []).append(posicion)
+
+
+def _construir_indices(nombre_archivo):
+    """
+    Construye todos los índices del archivo recorriendo sus bloques y los guarda.
+    """
+    estado = _estado_archivo(nombre_archivo)
+    encabezados = _leer_encabezados(nombre_archivo)
+    posiciones = {campo: {} for campo in CAMPOS_INDEXADOS}
+    for posicion, lineas in _recorrer_bloques(nombre_archivo):
+        filas = [formato_csv.dividir(linea) for linea in lineas if linea.strip()]
+        _agregar_posiciones(posiciones, encabezados, posicion, filas)
+    for campo in CAMPOS_INDEXADOS:
+        _guardar_indice(nombre_archivo, campo, estado, posiciones[campo])
+        _indices[(nombre_archivo, campo)] = {"estado": estado, "posiciones": posiciones[campo]}
+
+
+def _obtener_indice(nombre_archivo, campo):
+    """
+    Devuelve el índice del archivo sobre campo (None: primario) al día
+    con el archivo, leyéndolo del disco o construyéndolo si hace falta.
+    Devuelve None si el archivo no existe o no se pudo leer.
+    """
+    estado = _estado_archivo(nombre_archivo)
+    if estado is None:
+        return None
+    indice = _indices.get((nombre_archivo, campo))
+    if indice is not None and indice["estado"] == estado:
+        return indice
+
+    indice = _leer_indice_guardado(nombre_archivo, campo)
+    if indice is None or indice["estado"] != estado:
+        try:
+            _construir_indices(nombre_archivo)
+        except Exception as e:
+            print(f"Error al indexar {nombre_archivo}: {e}")
+            return None
+        return _indices[(nombre_archivo, campo)]
+    _indices[(nombre_archivo, campo)] = indice
+    return indice
+
+
+def hay_archivados():
+    """
+    Indica si hay préstamos archivados.
+    """
+    return bool(anios_archivados())
+
+
+def recorrer_historial():
+    """
+    Devuelve todos los préstamos (prestamos.csv y archivos de cada año)
+    de a uno, ordenados por ID. Si un préstamo está en prestamos.csv y en
+    un archivo (archivado cortado a la mitad) se devuelve una sola vez,
+    con la fila de prestamos.csv.
+    """
+    actuales = almacenamiento.recorrer_tabla("prestamos.csv")
+    anios = anios_archivados()
+    if not anios:
+        yield from actuales
+        return
+
+    # prestamos.csv va primero: ante IDs iguales heapq.merge respeta ese orden
+    fuentes = [actuales] + [recorrer_archivo_anual(anio) for anio in anios]
+    anterior = None
+    for fila in heapq.merge(*fuentes, key=numero_id):
+        prestamo_id = fila.get("prestamo_id")
+        if prestamo_id != anterior:
+            yield fila
+        anterior = prestamo_id
+
+
+def buscar_archivados(campo, valor):
+    """
+    Devuelve los préstamos archivados (de todos los años) cuyo campo
+    tiene ese valor, ordenados por año y por ID. Con los campos de
+    CAMPOS_INDEXADOS (o prestamo_id) solo se descomprimen los bloques que
+    tienen ese valor; con otro campo se recorren todos los archivos.
+    """
+    indexado = None if campo == "prestamo_id" else campo
+    resultados = []
+    for anio in anios_archivados():
+        nombre_archivo = archivo_anual(anio)
+        if indexado not in CAMPOS_INDEXADOS:
+            resultados.extend(fila for fila in recorrer_archivo_anual(anio) if fila.get(campo) == valor)
+            continue
+
+        indice = _obtener_indice(nombre_archivo, indexado)
+        posiciones = indice["posiciones"].get(valor) if indice is not None else None
+        if not posiciones:
+            continue
+        try:
+            encabezados = _leer_encabezados(nombre_archivo)
+            for posicion in sorted(set(posiciones)):
+                resultados.extend(fila for fila in _filas_del_bloque(nombre_archivo, posicion, encabezados)
+                                  if fila.get(campo) == valor)
+        except Exception as e:
+            print(f"Error al leer {nombre_archivo}: {e}")
+    return resultados
+
+
+def buscar_prestamo(prestamo_id):
+    """
+    Devuelve el préstamo archivado con ese ID, o None si no está archivado.
+    """
+    for fila in buscar_archivados("prestamo_id", prestamo_id):
+        return fila
+    return None
+
+
+def completar_con_archivados(filas, campo, valor):
+    """
+    Agrega a las filas de prestamos.csv que tienen campo == valor las
+    archivadas con el mismo valor (sin repetir IDs) y devuelve todas
+    ordenadas por ID.
+    """
+    archivadas = buscar_archivados(campo, valor)
+    if not archivadas:
+        return filas
+    vistos = {fila.get("prestamo_id") for fila in filas}
+    filas = list(filas) + [fila for fila in archivadas if fila.get("prestamo_id") not in vistos]
+    return sorted(filas, key=numero_id)
+
+
+def ultimo_numero():
+    """
+    Devuelve el número de ID más alto de los préstamos archivados (0 si no hay).
+    """
+    ultimo = 0
+    for anio in anios_archivados():
+        indice = _obtener_indice(archivo_anual(anio), None)
+        for prestamo_id in indice["posiciones"] if indice is not None else ():
+            clave = numero_id({"prestamo_id": prestamo_id})
+            if clave[0] == 0:
+                ultimo = max(ultimo, clave[1])
+    return ultimo
+
+
+# =========================================================
+# Archivar
+# =========================================================
+
+def _escribir_archivo_anual(anio, filas, encabezados):
+    """
+    Reemplaza el archivo de un año por las filas dadas (ya ordenadas),
+    comprimidas en bloques de FILAS_POR_BLOQUE filas, y guarda sus índices.
+    El archivo nuevo se escribe en un temporal y se sincroniza con el
+    disco antes de reemplazar al anterior.
+    """
+    nombre_archivo = archivo_anual(anio)
+    temporal = nombre_archivo + ".tmp"
+    posiciones = {campo: {} for campo in CAMPOS_INDEXADOS}
+    with open(temporal, "wb") as crudo:
+        # Los encabezados van solos en el primer bloque
+        bloques = [[",".join(encabezados)]]
+        for inicio in range(0, len(filas), FILAS_POR_BLOQUE):
+            bloques.append([formato_csv.unir([fila.get(encabezado, "") for encabezado in encabezados])
+                            for fila in filas[inicio:inicio + FILAS_POR_BLOQUE]])
+        for numero, lineas in enumerate(bloques):
+            posicion = crudo.tell()
+            with gzip.GzipFile(fileobj=crudo, mode="wb", compresslevel=NIVEL_COMPRESION, mtime=0) as comprimido:
+                comprimido.write(("\n".join(lineas) + "\n").encode("utf-8"))
+            if numero > 0:
+                _agregar_posiciones(posiciones, encabezados, posicion,
+                                    [formato_csv.dividir(linea) for linea in lineas])
+        crudo.flush()
+        os.fsync(crudo.fileno())
+
+    # La generación cambia antes del reemplazo: un índice viejo nunca
+    # corresponde al archivo nuevo, aunque se reutilice el inodo
+    transacciones.avanzar_generacion(nombre_archivo)
+    os.replace(temporal, nombre_archivo)
+    estado = _estado_archivo(nombre_archivo)
+    for campo in CAMPOS_INDEXADOS:
+        _guardar_indice(nombre_archivo, campo, estado, posiciones[campo])
+        _indices[(nombre_archivo, campo)] = {"estado": estado, "posiciones": posiciones[campo]}
+
+
+def archivar_prestamos_cerrados():
+    """
+    Mueve los préstamos DEVUELTOS y RECHAZADOS de prestamos.csv al archivo
+    de su año y deja en prestamos.csv solo los demás.
+    Devuelve un diccionario año -> cantidad de préstamos archivados,
+    o None si hubo un error (en ese caso prestamos.csv no cambia).
+    """
+    if almacenamiento.motor_sqlite() is not None:
+        print("Con el motor SQLite los préstamos cerrados quedan en la base de datos.")
+        return {}
+
+    # Todo el archivado va dentro de una transacción: mientras tanto ninguna
+    # otra terminal escribe, así no se pierde un préstamo agregado entre la
+    # lectura de prestamos.csv y su reescritura (ver concurrencia.py)
+    almacenamiento.iniciar_transaccion()
+    archivados = _archivar(almacenamiento.leer_tabla("prestamos.csv"))
+    if archivados is None:
+        almacenamiento.cancelar_transaccion()
+        return None
+    if not almacenamiento.confirmar_transaccion():
+        return None
+
+    # La instantánea por columnas (si se usaba) pasa a tener solo los abiertos
+    if archivados and os.path.exists(instantanea.archivo_instantanea("prestamos.csv")):
+        instantanea.generar_instantanea("prestamos.csv")
+    return archivados
+
+
+def _archivar(prestamos):
+    """
+    Escribe los archivos de cada año con los préstamos cerrados y
+    reemplaza prestamos.csv por los demás (en la transacción abierta).
+    Devuelve el diccionario año -> cantidad, o None si hubo un error.
+    """
+    encabezados = almacenamiento.ENCABEZADOS_PRESTAMOS
+    por_anio = {}
+    abiertos = []
+    for prestamo in prestamos:
+        anio = prestamo.get("anio", "")
+        if prestamo.get("estado") in ESTADOS_CERRADOS and anio.isdigit():
+            por_anio.setdefault(anio, []).append(prestamo)
+        else:
+            abiertos.append(prestamo)
+    if not por_anio:
+        return {}
+
+    try:
+        os.makedirs(CARPETA_ARCHIVO, exist_ok=True)
+        for anio, nuevas in por_anio.items():
+            # Si ya estaban archivados (archivado cortado a la mitad) no se repiten
+            ids_nuevos = {fila.get("prestamo_id") for fila in nuevas}
+            anteriores = [fila for fila in recorrer_archivo_anual(anio) if fila.get("prestamo_id") not in ids_nuevos]
+            _escribir_archivo_anual(anio, sorted(anteriores + nuevas, key=numero_id), encabezados)
+    except Exception as e:
+        print(f"Error al escribir el archivo de préstamos: {e}")
+        return None
+
+    if not almacenamiento.guardar_tabla("prestamos.csv", encabezados, abiertos):
+        return None
+    return {anio: len(filas) for anio, filas in sorted(por_anio.items())}
+
+
+if __name__ == "__main__":
+    archivados = archivar_prestamos_cerrados()
+    if archivados is not None:
+        for anio, cantidad in archivados.items():
+            print(f"  {archivo_anual(anio)}: {cantidad} préstamo(s)")
+        print(f"\n✓ Préstamos archivados: {sum(archivados.values())}")
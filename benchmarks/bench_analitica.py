@@ -0,0 +1,110 @@
+"""
+Benchmark de las estadísticas del tablero (ver analitica.py)
+Arma directamente en memoria las columnas de un historial sintético
+(sin escribir el CSV, que con 10 millones de filas tarda más que las
+propias estadísticas) y mide cuánto tarda cada estadística.
+
+Uso:
+    python benchmarks/bench_analitica.py                # 10 millones de préstamos
+    python benchmarks/bench_analitica.py 1000000        # solo ese tamaño
+Sin NumPy instalado se miden los cálculos con bucles de Python.
+"""
+import random
+import sys
+import time
+from array import array
+from datetime import date
+
+import datos_sinteticos
+
+import analitica
+
+TAMANOS = [10_000_000]
+
+ESTADOS = ["DEVUELTO", "APROBADO", "PENDIENTE", "RECHAZADO"]
+CATEGORIAS = datos_sinteticos.CATEGORIAS
+
+
+def generar_columnas(cantidad, prestamos_por_equipo=10, prestamos_por_usuario=20, semilla=1):
+    """
+    Devuelve columnas como las de analitica.cargar_columnas, con la misma
+    forma de datos que datos_sinteticos.generar_prestamos: casi todos
+    DEVUELTO, varios préstamos por equipo y por usuario, dos años de fechas.
+    También devuelve el diccionario equipo_id -> categoría.
+    """
+    cantidad_equipos = max(1, cantidad // prestamos_por_equipo)
+    cantidad_usuarios = max(1, cantidad // prestamos_por_usuario)
+    inicio = date(2020, 1, 1).toordinal()
+    meses = [(date.fromordinal(dia).year, date.fromordinal(dia).month) for dia in range(inicio, inicio + 2001)]
+
+    np = analitica.np
+    if np is not None:
+        aleatorio = np.random.default_rng(semilla)
+        dias = inicio + np.arange(1, cantidad + 1, dtype=np.int64) * 2000 // cantidad - inicio
+        tabla_meses = np.array(meses, dtype=np.int32)
+        autorizados = aleatorio.integers(1, 8, cantidad, dtype=np.int32)
+        columnas = {
+            "equipo_id": aleatorio.integers(0, cantidad_equipos, cantidad, dtype=np.int32),
+            "usuario_prestatario": aleatorio.integers(0, cantidad_usuarios, cantidad, dtype=np.int32),
+            "tipo_usuario": aleatorio.integers(0, 3, cantidad, dtype=np.int32),
+            "estado": np.where(aleatorio.random(cantidad) < 0.98, 0, aleatorio.integers(1, 4, cantidad)).astype(np.int32),
+            "dias_autorizados": autorizados,
+            "dias_reales_usados": (autorizados + aleatorio.integers(-1, 4, cantidad, dtype=np.int32)).clip(0),
+            "anio": tabla_meses[dias, 0],
+            "mes": tabla_meses[dias, 1],
+        }
+        columnas["retraso"] = (columnas["dias_reales_usados"] > columnas["dias_autorizados"]).astype(np.int32)
+    else:
+        aleatorio = random.Random(semilla)
+        columnas = {campo: array("i") for campo in analitica.CAMPOS_CODIGOS + analitica.CAMPOS_ENTEROS}
+        for numero in range(1, cantidad + 1):
+            anio, mes = meses[numero * 2000 // cantidad]
+            autorizados = aleatorio.randint(1, 7)
+            reales = max(0, autorizados + aleatorio.randint(-1, 3))
+            columnas["equipo_id"].append(aleatorio.randrange(cantidad_equipos))
+            columnas["usuario_prestatario"].append(aleatorio.randrange(cantidad_usuarios))
+            columnas["tipo_usuario"].append(aleatorio.randrange(3))
+            columnas["estado"].append(0 if aleatorio.random() < 0.98 else aleatorio.randint(1, 3))
+            columnas["dias_autorizados"].append(autorizados)
+            columnas["dias_reales_usados"].append(reales)
+            columnas["retraso"].append(1 if reales > autorizados else 0)
+            columnas["anio"].append(anio)
+            columnas["mes"].append(mes)
+
+    columnas["valores"] = {
+        "equipo_id": [f"EQ{numero:06d}" for numero in range(cantidad_equipos)],
+        "usuario_prestatario": [f"usuario{numero:06d}" for numero in range(cantidad_usuarios)],
+        "tipo_usuario": list(datos_sinteticos.TIPOS_USUARIO),
+        "retraso": ["NO", "SI"],
+        "estado": list(ESTADOS),
+    }
+    columnas["filas"] = cantidad
+    categorias = {equipo_id: CATEGORIAS[numero % len(CATEGORIAS)]
+                  for numero, equipo_id in enumerate(columnas["valores"]["equipo_id"])}
+    return columnas, categorias
+
+
+def medir(nombre, funcion):
+    inicio = time.perf_counter()
+    funcion()
+    print(f"  {nombre:<36} {time.perf_counter() - inicio:8.2f} s")
+
+
+def main():
+    tamanos = [int(valor) for valor in sys.argv[1:]] or TAMANOS
+    print("Cálculo con", "NumPy" if analitica.np is not None else "bucles de Python (NumPy no está instalado)")
+
+    for cantidad in tamanos:
+        print(f"\n{cantidad:,} préstamos")
+        inicio = time.perf_counter()
+        columnas, categorias = generar_columnas(cantidad)
+        print(f"  {'(generar columnas)':<36} {time.perf_counter() - inicio:8.2f} s")
+
+        medir("tasa_retraso_por_tipo", lambda: analitica.tasa_retraso_por_tipo(columnas))
+        medir("dias_por_categoria", lambda: analitica.dias_por_categoria(columnas, categorias))
+        medir("uso_por_equipo_mes (10 mayores)", lambda: analitica.uso_por_equipo_mes(columnas, limite=10))
+        medir("principales_usuarios", lambda: analitica.principales_usuarios(columnas, limite=10))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,70 @@
+"""
+Benchmark de la lectura en paralelo de prestamos.csv (ver carga_paralela.py)
+Compara leer el archivo completo en un solo proceso contra leerlo con
+1, 2, 4 y 8 procesos, y comprueba que las filas sean las mismas y en el
+mismo orden que en la lectura en serie.
+
+Uso:
+    python benchmarks/bench_carga_paralela.py                # 2 millones de préstamos
+    python benchmarks/bench_carga_paralela.py 1000000        # solo ese tamaño
+"""
+import os
+import sys
+import tempfile
+import time
+
+import datos_sinteticos
+
+import almacenamiento
+import carga_paralela
+
+TAMANOS = [2_000_000]
+TRABAJADORES = [1, 2, 4, 8]
+
+
+def medir(funcion):
+    """
+    Devuelve (segundos, resultado) de una llamada.
+    """
+    inicio = time.perf_counter()
+    resultado = funcion()
+    return time.perf_counter() - inicio, resultado
+
+
+def main():
+    tamanos = [int(valor) for valor in sys.argv[1:]] or TAMANOS
+    carpeta_original = os.getcwd()
+    print(f"Procesadores disponibles: {os.cpu_count()}")
+
+    for cantidad in tamanos:
+        with tempfile.TemporaryDirectory() as carpeta:
+            os.chdir(carpeta)
+            try:
+                datos_sinteticos.generar_prestamos("prestamos.csv", cantidad)
+                megas = os.path.getsize("prestamos.csv") / 1e6
+                print(f"\n{cantidad:,} préstamos ({megas:.0f} MB)")
+                print(f"{'Procesos':>10} {'Segundos':>10} {'Filas/s':>14} {'Aceleración':>12} {'Iguales':>8}")
+                print("-" * 58)
+
+                # En serie: la lectura normal de almacenamiento.py
+                trabajadores_antes = carga_paralela.TRABAJADORES
+                carga_paralela.TRABAJADORES = 1
+                try:
+                    en_serie, esperadas = medir(lambda: almacenamiento._parsear_archivo("prestamos.csv"))
+                finally:
+                    carga_paralela.TRABAJADORES = trabajadores_antes
+                print(f"{'serie':>10} {en_serie:10.2f} {cantidad / en_serie:14,.0f} {1:12.2f} {'':>8}")
+
+                for trabajadores in TRABAJADORES:
+                    segundos, filas = medir(lambda: carga_paralela.parsear_archivo("prestamos.csv", trabajadores))
+                    iguales = len(filas) == len(esperadas) and all(
+                        tuple(fila.items()) == tuple(esperada.items()) for fila, esperada in zip(filas, esperadas))
+                    print(f"{trabajadores:>10} {segundos:10.2f} {cantidad / segundos:14,.0f} "
+                          f"{en_serie / segundos:12.2f} {'sí' if iguales else 'NO':>8}")
+                    del filas
+            finally:
+                os.chdir(carpeta_original)
+
+
+if __name__ == "__main__":
+    main()
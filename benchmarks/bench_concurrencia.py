@@ -0,0 +1,219 @@
+"""
+Prueba de carga con varias terminales a la vez (ver concurrencia.py)
+Cada empleado es un proceso aparte que, sobre la misma carpeta de datos,
+repite durante unos segundos operaciones elegidas al azar:
+- solicitar un préstamo de un equipo al azar (pocos equipos, así varias
+  terminales compiten por los mismos)
+- aprobar un préstamo PENDIENTE al azar (puede ser de otra terminal)
+- devolver un préstamo APROBADO al azar
+Al mismo tiempo un proceso lector lee prestamos.csv sin parar, para medir
+que las lecturas no esperan a las escrituras.
+
+Al final se comprueba que los archivos sean consistentes:
+- ningún ID de préstamo repetido
+- cada operación que se informó como guardada está en los archivos
+- como mucho un préstamo abierto por equipo, y el equipo está PRESTADO
+  solo si tiene un préstamo APROBADO
+
+Con --sin-bloqueo se repite la prueba sin el bloqueo entre procesos (como
+antes): ahí aparecen IDs repetidos y operaciones perdidas.
+
+Uso:
+    python benchmarks/bench_concurrencia.py                  # 1, 2, 4 y 8 empleados
+    python benchmarks/bench_concurrencia.py 4 8              # solo esas cantidades
+    python benchmarks/bench_concurrencia.py --sin-bloqueo 4
+"""
+import contextlib
+import io
+import multiprocessing
+import os
+import random
+import sys
+import tempfile
+import time
+
+import datos_sinteticos
+
+import almacenamiento
+import concurrencia
+import equipos
+import lector_mapeado
+import prestamos
+
+EMPLEADOS = [1, 2, 4, 8]
+DURACION = 5  # segundos de prueba para cada cantidad de empleados
+CANTIDAD_EQUIPOS = 20
+FECHA = "2025-11-24"
+
+# Segundos para que todos los procesos terminen de arrancar antes de empezar
+ARRANQUE = 2
+
+
+def empleado(numero, carpeta, comienzo, duracion, sin_bloqueo):
+    """
+    Trabajo de una terminal. Devuelve (cantidades guardadas por operación,
+    cantidades no guardadas, latencias en segundos, estadísticas de concurrencia).
+    """
+    os.chdir(carpeta)
+    if sin_bloqueo:
+        concurrencia.fcntl = None
+    aleatorio = random.Random(numero)
+    guardadas = {"solicitar": 0, "aprobar": 0, "devolver": 0}
+    fallidas = dict.fromkeys(guardadas, 0)
+    latencias = []
+
+    time.sleep(max(0.0, comienzo - time.time()))
+    fin = time.perf_counter() + duracion
+    # Los avisos de conflicto de cada operación no se muestran
+    with contextlib.redirect_stdout(io.StringIO()):
+        while time.perf_counter() < fin:
+            operacion = aleatorio.choice(["solicitar", "solicitar", "aprobar", "devolver"])
+            inicio = time.perf_counter()
+
+            if operacion == "solicitar":
+                equipo = equipos.obtener_equipo_por_id(f"EQ{aleatorio.randrange(CANTIDAD_EQUIPOS):06d}")
+                guardado = (equipo.get("estado_actual") == "DISPONIBLE" and
+                            prestamos.obtener_prestamo_abierto(equipo.get("equipo_id")) is None and
+                            prestamos.guardar_solicitud(equipo, f"usuario{numero}", "ESTUDIANTE", FECHA, 3)[0]
+                            is not None)
+            elif operacion == "aprobar":
+                pendientes = lector_mapeado.filtrar("prestamos.csv", "estado", "PENDIENTE")
+                guardado = bool(pendientes) and prestamos.procesar_prestamos_en_lote(
+                    "APROBADO", [aleatorio.choice(pendientes).get("prestamo_id")])[0][1]
+            else:
+                aprobados = lector_mapeado.filtrar("prestamos.csv", "estado", "APROBADO")
+                guardado = bool(aprobados) and prestamos.procesar_devoluciones_en_lote(
+                    [f"{aleatorio.choice(aprobados).get('prestamo_id')},{FECHA}"])[0][2]
+
+            latencias.append(time.perf_counter() - inicio)
+            if guardado:
+                guardadas[operacion] += 1
+            else:
+                fallidas[operacion] += 1
+
+    return guardadas, fallidas, latencias, concurrencia.estadisticas()
+
+
+def lector(carpeta, comienzo, duracion):
+    """
+    Lee prestamos.csv completo una y otra vez (sin usar la caché).
+    Devuelve (lecturas, lecturas con error, lectura más lenta en segundos).
+    """
+    os.chdir(carpeta)
+    time.sleep(max(0.0, comienzo - time.time()))
+    lecturas = 0
+    mas_lenta = 0.0
+    fin = time.perf_counter() + duracion
+    with contextlib.redirect_stdout(io.StringIO()) as salida:
+        while time.perf_counter() < fin:
+            almacenamiento.limpiar_cache()
+            inicio = time.perf_counter()
+            almacenamiento.leer_tabla("prestamos.csv")
+            mas_lenta = max(mas_lenta, time.perf_counter() - inicio)
+            lecturas += 1
+    errores = salida.getvalue().count("Error")
+    return lecturas, errores, mas_lenta
+
+
+def verificar(guardadas):
+    """
+    Comprueba la consistencia de los archivos. Devuelve la lista de problemas.
+    """
+    almacenamiento.limpiar_cache()
+    lista = almacenamiento.leer_tabla("prestamos.csv")
+    problemas = []
+
+    ids = [p.get("prestamo_id") for p in lista]
+    if len(ids) != len(set(ids)):
+        problemas.append(f"{len(ids) - len(set(ids))} ID(s) repetido(s)")
+    if len(lista) != guardadas["solicitar"]:
+        problemas.append(f"{guardadas['solicitar']} solicitudes guardadas, {len(lista)} en el archivo")
+
+    devueltos = sum(1 for p in lista if p.get("estado") == "DEVUELTO")
+    aprobados = sum(1 for p in lista if p.get("estado") == "APROBADO")
+    if devueltos != guardadas["devolver"]:
+        problemas.append(f"{guardadas['devolver']} devoluciones guardadas, {devueltos} en el archivo")
+    if aprobados + devueltos != guardadas["aprobar"]:
+        problemas.append(f"{guardadas['aprobar']} aprobaciones guardadas, {aprobados + devueltos} en el archivo")
+
+    abiertos_por_equipo = {}
+    for p in lista:
+        if p.get("estado") in ("PENDIENTE", "APROBADO"):
+            abiertos_por_equipo.setdefault(p.get("equipo_id"), []).append(p.get("estado"))
+    for equipo in almacenamiento.leer_tabla("equipos.csv"):
+        abiertos = abiertos_por_equipo.get(equipo.get("equipo_id"), [])
+        if len(abiertos) > 1:
+            problemas.append(f"{equipo.get('equipo_id')} con {len(abiertos)} préstamos abiertos")
+        if (equipo.get("estado_actual") == "PRESTADO") != ("APROBADO" in abiertos):
+            problemas.append(f"{equipo.get('equipo_id')} {equipo.get('estado_actual')} con préstamos {abiertos}")
+    return problemas
+
+
+def percentil(valores, fraccion):
+    valores = sorted(valores)
+    return valores[min(len(valores) - 1, int(len(valores) * fraccion))] if valores else 0.0
+
+
+def medir(cantidad, sin_bloqueo):
+    """
+    Corre la prueba con cantidad empleados en una carpeta nueva e imprime una línea.
+    """
+    carpeta_original = os.getcwd()
+    with tempfile.TemporaryDirectory() as carpeta:
+        os.chdir(carpeta)
+        try:
+            datos_sinteticos.generar_equipos("equipos.csv", CANTIDAD_EQUIPOS)
+            with open("prestamos.csv", "w", encoding="utf-8") as archivo:
+                archivo.write(",".join(almacenamiento.ENCABEZADOS_PRESTAMOS) + "\n")
+
+            contexto = multiprocessing.get_context("spawn")
+            comienzo = time.time() + ARRANQUE
+            with contexto.Pool(cantidad + 1) as procesos:
+                lectura = procesos.apply_async(lector, (carpeta, comienzo, DURACION))
+                resultados = procesos.starmap(
+                    empleado, [(numero, carpeta, comienzo, DURACION, sin_bloqueo) for numero in range(cantidad)])
+                lecturas, errores_lectura, lectura_mas_lenta = lectura.get()
+
+            guardadas = {"solicitar": 0, "aprobar": 0, "devolver": 0}
+            fallidas = dict.fromkeys(guardadas, 0)
+            latencias = []
+            esperas = bloqueos = conflictos = 0
+            for guardadas_empleado, fallidas_empleado, latencias_empleado, estadisticas in resultados:
+                for operacion in guardadas:
+                    guardadas[operacion] += guardadas_empleado[operacion]
+                    fallidas[operacion] += fallidas_empleado[operacion]
+                latencias.extend(latencias_empleado)
+                esperas += estadisticas["esperas"]
+                bloqueos += estadisticas["bloqueos"]
+                conflictos += estadisticas["conflictos"]
+
+            problemas = verificar(guardadas)
+        finally:
+            os.chdir(carpeta_original)
+
+    total = sum(guardadas.values())
+    print(f"{cantidad:>9} {total / DURACION:>10.1f} {len(latencias) / DURACION:>10.1f} "
+          f"{percentil(latencias, 0.5) * 1000:>9.1f} {percentil(latencias, 0.99) * 1000:>9.1f} "
+          f"{esperas * 100 / max(bloqueos, 1):>8.0f}% {conflictos:>10} "
+          f"{lecturas / DURACION:>9.1f} {lectura_mas_lenta * 1000:>9.1f} {errores_lectura:>7} "
+          f"{'sí' if not problemas else 'NO':>11}")
+    for problema in problemas[:5]:
+        print(f"          ✗ {problema}")
+
+
+def main():
+    argumentos = sys.argv[1:]
+    sin_bloqueo = "--sin-bloqueo" in argumentos
+    cantidades = [int(valor) for valor in argumentos if valor != "--sin-bloqueo"] or EMPLEADOS
+
+    print(f"Procesadores disponibles: {os.cpu_count()}, {CANTIDAD_EQUIPOS} equipos, {DURACION} s por prueba"
+          f"{', SIN bloqueo entre procesos' if sin_bloqueo else ''}")
+    print(f"{'Empleados':>9} {'Guard./s':>10} {'Oper./s':>10} {'p50 ms':>9} {'p99 ms':>9} "
+          f"{'Esperas':>9} {'Conflictos':>10} {'Lect./s':>9} {'Lect. máx':>9} {'Errores':>7} {'Consistente':>11}")
+    print("-" * 112)
+    for cantidad in cantidades:
+        medir(cantidad, sin_bloqueo)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,140 @@
+"""
+Benchmark del formato CSV (ver formato_csv.py)
+Mide filas por segundo y MB por segundo al leer y escribir prestamos.csv:
+- antes: linea.split(",") y ",".join(...), que cortan mal los valores con comas
+- csv: el lector y el escritor del módulo csv para todas las líneas
+- formato_csv: str.split en las líneas sin comillas y el módulo csv en las demás
+Se mide con un archivo sin comillas y con otro donde el 10 % de las filas
+tiene una coma en el nombre del equipo (ahí "antes" divide mal esas filas).
+
+Uso:
+    python benchmarks/bench_csv.py              # 1 millón de préstamos
+    python benchmarks/bench_csv.py 100000       # solo ese tamaño
+"""
+import csv
+import io
+import os
+import sys
+import tempfile
+import time
+
+import datos_sinteticos
+
+import almacenamiento
+import formato_csv
+
+TAMANOS = [1_000_000]
+
+# Una de cada tantas filas lleva una coma en el nombre del equipo
+CADA_CUANTAS_CON_COMA = 10
+
+
+def leer_antes(archivo, fabricar):
+    filas = []
+    for linea in archivo:
+        linea = linea.strip()
+        if linea:
+            filas.append(fabricar(linea.split(",")))
+    return filas
+
+
+def leer_csv(archivo, fabricar):
+    return [fabricar(valores) for valores in csv.reader(archivo) if valores]
+
+
+def leer_formato_csv(archivo, fabricar):
+    return list(formato_csv.filas(archivo, fabricar))
+
+
+def escribir_antes(salida, filas):
+    for valores in filas:
+        salida.write(",".join(valores) + "\n")
+
+
+def escribir_csv(salida, filas):
+    csv.writer(salida, lineterminator="\n").writerows(filas)
+
+
+def escribir_formato_csv(salida, filas):
+    for valores in filas:
+        salida.write(formato_csv.unir(valores) + "\n")
+
+
+def poner_comas(nombre_archivo):
+    """
+    Reescribe el archivo con una coma en el nombre del equipo de una de
+    cada CADA_CUANTAS_CON_COMA filas (con las comillas del formato CSV).
+    """
+    with open(nombre_archivo, "r", encoding="utf-8") as archivo:
+        encabezados = archivo.readline().strip().split(",")
+        filas = [linea.strip().split(",") for linea in archivo if linea.strip()]
+    columna = encabezados.index("nombre_equipo")
+    for numero in range(0, len(filas), CADA_CUANTAS_CON_COMA):
+        filas[numero][columna] += ", con cargador"
+    with open(nombre_archivo, "w", encoding="utf-8", newline="") as archivo:
+        escribir_csv(archivo, [encabezados] + filas)
+
+
+def medir_lectura(nombre_archivo, leer):
+    """
+    Devuelve (segundos, filas leídas como listas de textos).
+    """
+    with open(nombre_archivo, "r", encoding="utf-8", newline="") as archivo:
+        archivo.readline()
+        inicio = time.perf_counter()
+        filas = leer(archivo, list)
+        return time.perf_counter() - inicio, filas
+
+
+def medir_escritura(filas, escribir):
+    salida = io.StringIO()
+    inicio = time.perf_counter()
+    escribir(salida, filas)
+    return time.perf_counter() - inicio
+
+
+def imprimir(nombre, segundos, cantidad, megas, nota=""):
+    print(f"  {nombre:<24} {cantidad / segundos:>14,.0f} {megas / segundos:>9.1f} {nota}")
+
+
+def main():
+    tamanos = [int(valor) for valor in sys.argv[1:]] or TAMANOS
+    carpeta_original = os.getcwd()
+    lectores = [("antes (split)", leer_antes), ("csv", leer_csv), ("formato_csv", leer_formato_csv)]
+    escritores = [("antes (join)", escribir_antes), ("csv", escribir_csv), ("formato_csv", escribir_formato_csv)]
+
+    for cantidad in tamanos:
+        with tempfile.TemporaryDirectory() as carpeta:
+            os.chdir(carpeta)
+            try:
+                datos_sinteticos.generar_prestamos("prestamos.csv", cantidad)
+                for con_comas in (False, True):
+                    if con_comas:
+                        poner_comas("prestamos.csv")
+                    megas = os.path.getsize("prestamos.csv") / 1e6
+                    print(f"\n{cantidad:,} préstamos ({megas:.0f} MB), "
+                          f"{'10 % de las filas con comas' if con_comas else 'sin comillas'}")
+                    print(f"  {'':<24} {'filas/s':>14} {'MB/s':>9}")
+
+                    print(" Lectura")
+                    _, correctas = medir_lectura("prestamos.csv", leer_csv)
+                    for nombre, leer in lectores:
+                        segundos, filas = medir_lectura("prestamos.csv", leer)
+                        mal = sum(1 for fila, correcta in zip(filas, correctas) if fila != correcta)
+                        imprimir(nombre, segundos, len(filas), megas, f"({mal:,} filas mal divididas)" if mal else "")
+
+                    print(" Escritura")
+                    for nombre, escribir in escritores:
+                        imprimir(nombre, medir_escritura(correctas, escribir), len(correctas), megas)
+
+                # Lectura completa de la tabla (con los registros Prestamo)
+                almacenamiento.limpiar_cache()
+                inicio = time.perf_counter()
+                filas = almacenamiento.leer_tabla_csv("prestamos.csv")
+                imprimir("leer_tabla_csv", time.perf_counter() - inicio, len(filas), megas, "(registros)")
+            finally:
+                os.chdir(carpeta_original)
+
+
+if __name__ == "__main__":
+    main()
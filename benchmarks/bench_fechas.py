@@ -0,0 +1,109 @@
+"""
+Microbenchmark de las fechas
+Compara validar_fecha y calcular_dias_diferencia como eran antes (con
+datetime.strptime) contra las de ahora (fechas.py: date.fromisoformat
+con memoria LRU), y el cálculo de días de un lote de devoluciones
+convirtiendo los textos contra usar los números de día de los registros.
+
+Uso:
+    python benchmarks/bench_fechas.py               # 1 millón de llamadas
+    python benchmarks/bench_fechas.py 100000        # solo esa cantidad
+"""
+import os
+import random
+import sys
+import time
+from datetime import date, datetime
+
+# Los módulos del sistema están en la carpeta de arriba
+CARPETA_PROYECTO = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if CARPETA_PROYECTO not in sys.path:
+    sys.path.insert(0, CARPETA_PROYECTO)
+
+import almacenamiento
+import fechas
+import prestamos
+
+CANTIDADES = [1_000_000]
+
+# Fechas distintas del conjunto de prueba (unos dos años, como en los datos sintéticos)
+DIAS_DISTINTOS = 730
+
+
+def validar_fecha_antes(fecha_str):
+    try:
+        datetime.strptime(fecha_str, "%Y-%m-%d")
+        return True
+    except ValueError:
+        return False
+
+
+def calcular_dias_diferencia_antes(fecha_inicio, fecha_fin):
+    try:
+        fecha1 = datetime.strptime(fecha_inicio, "%Y-%m-%d")
+        fecha2 = datetime.strptime(fecha_fin, "%Y-%m-%d")
+        return (fecha2 - fecha1).days
+    except ValueError:
+        return 0
+
+
+def medir(funcion, argumentos):
+    """
+    Devuelve el tiempo por llamada (en nanosegundos) de llamar a la
+    función con cada tupla de argumentos.
+    """
+    inicio = time.perf_counter()
+    for valores in argumentos:
+        funcion(*valores)
+    return (time.perf_counter() - inicio) * 1e9 / len(argumentos)
+
+
+def main():
+    cantidades = [int(valor) for valor in sys.argv[1:]] or CANTIDADES
+    aleatorio = random.Random(3)
+    inicio = date(2024, 1, 1).toordinal()
+    textos = [date.fromordinal(inicio + numero).isoformat() for numero in range(DIAS_DISTINTOS)]
+
+    for cantidad in cantidades:
+        fechas.dia.cache_clear()
+        una = [(aleatorio.choice(textos),) for _ in range(cantidad)]
+        dos = [(aleatorio.choice(textos), aleatorio.choice(textos)) for _ in range(cantidad)]
+
+        # Lote de devoluciones: registros leídos del CSV contra diccionarios de textos
+        encabezados = almacenamiento.ENCABEZADOS_PRESTAMOS
+        crear = almacenamiento.fabrica_filas("prestamos.csv", encabezados)
+        filas = []
+        for fecha_prestamo, fecha_devolucion in dos[:min(cantidad, 200_000)]:
+            valores = [""] * len(encabezados)
+            valores[encabezados.index("fecha_prestamo")] = fecha_prestamo
+            valores[encabezados.index("fecha_devolucion")] = fecha_devolucion
+            filas.append(crear(valores))
+        diccionarios = [(dict(fila.items()),) for fila in filas]
+        registros = [(fila,) for fila in filas]
+
+        print(f"\n{cantidad:,} llamadas ({DIAS_DISTINTOS} fechas distintas)")
+        print(f"{'':<42} {'antes (ns)':>11} {'ahora (ns)':>11} {'veces':>7}")
+        print("-" * 74)
+        comparaciones = [
+            ("validar_fecha", validar_fecha_antes, prestamos.validar_fecha, una),
+            ("calcular_dias_diferencia", calcular_dias_diferencia_antes, prestamos.calcular_dias_diferencia, dos),
+            ("días del lote (texto -> registro)",
+             lambda fila: calcular_dias_diferencia_antes(fila["fecha_prestamo"], fila["fecha_devolucion"]),
+             lambda fila: fila.fecha_devolucion - fila.fecha_prestamo,
+             None),
+        ]
+        for nombre, antes, ahora, argumentos in comparaciones:
+            if argumentos is None:
+                tiempo_antes, tiempo_ahora = medir(antes, diccionarios), medir(ahora, registros)
+            else:
+                tiempo_antes, tiempo_ahora = medir(antes, argumentos), medir(ahora, argumentos)
+            print(f"{nombre:<42} {tiempo_antes:11.0f} {tiempo_ahora:11.0f} {tiempo_antes / tiempo_ahora:7.1f}")
+
+        # Solo el camino rápido, sin la memoria LRU (fechas.dia sin lru_cache)
+        tiempo_antes, tiempo_ahora = medir(validar_fecha_antes, una), medir(fechas.dia.__wrapped__, una)
+        print(f"{'conversión sin memoria (fromisoformat)':<42} {tiempo_antes:11.0f} {tiempo_ahora:11.0f} "
+              f"{tiempo_antes / tiempo_ahora:7.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,96 @@
+"""
+Benchmark de consultar_historial con índices secundarios
+Mide cuánto tarda buscar los préstamos de un equipo o de un usuario
+a medida que prestamos.csv crece (10 mil a 10 millones de filas).
+La cantidad de resultados por búsqueda se mantiene fija, así se ve que
+la búsqueda con índice no depende del tamaño del archivo.
+
+Uso:
+    python benchmarks/bench_historial.py                 # 10k, 100k, 1M y 10M filas
+    python benchmarks/bench_historial.py 10000 100000    # solo esos tamaños
+"""
+import os
+import random
+import sys
+import tempfile
+import time
+
+import datos_sinteticos
+
+import almacenamiento
+import indices
+
+TAMANOS = [10_000, 100_000, 1_000_000, 10_000_000]
+CONSULTAS = 200
+
+# Por encima de este tamaño no se mide la búsqueda recorriendo todo el archivo
+MAXIMO_RECORRIDO = 1_000_000
+
+
+def medir_consultas(campo, valores):
+    """
+    Devuelve (mediana en microsegundos, promedio de resultados)
+    de buscar cada valor con el índice del campo.
+    """
+    tiempos = []
+    resultados = 0
+    for valor in valores:
+        inicio = time.perf_counter()
+        filas = indices.buscar_filas("prestamos.csv", campo, valor)
+        tiempos.append(time.perf_counter() - inicio)
+        resultados += len(filas)
+    tiempos.sort()
+    return tiempos[len(tiempos) // 2] * 1e6, resultados / len(valores)
+
+
+def medir_recorrido(campo, valor):
+    """
+    Tiempo (en milisegundos) de la búsqueda anterior: leer todo el archivo y filtrar.
+    """
+    almacenamiento.limpiar_cache()
+    inicio = time.perf_counter()
+    filas = almacenamiento.leer_tabla("prestamos.csv")
+    [p for p in filas if p.get(campo) == valor]
+    return (time.perf_counter() - inicio) * 1000
+
+
+def main():
+    tamanos = [int(valor) for valor in sys.argv[1:]] or TAMANOS
+    aleatorio = random.Random(7)
+    carpeta_original = os.getcwd()
+
+    print(f"{'Filas':>12} {'Índices (s)':>12} {'Equipo (µs)':>12} {'Usuario (µs)':>13} "
+          f"{'Res./equipo':>12} {'Res./usuario':>13} {'Sin índice (ms)':>16}")
+    print("-" * 97)
+
+    for cantidad in tamanos:
+        with tempfile.TemporaryDirectory() as carpeta:
+            os.chdir(carpeta)
+            try:
+                equipos, usuarios = datos_sinteticos.generar_prestamos("prestamos.csv", cantidad)
+
+                inicio = time.perf_counter()
+                indices.obtener_indice("prestamos.csv", "equipo_id")
+                indices.obtener_indice("prestamos.csv", "usuario_prestatario")
+                tiempo_indices = time.perf_counter() - inicio
+
+                valores_equipo = [f"EQ{aleatorio.randrange(equipos):06d}" for _ in range(CONSULTAS)]
+                valores_usuario = [f"usuario{aleatorio.randrange(usuarios):06d}" for _ in range(CONSULTAS)]
+                tiempo_equipo, resultados_equipo = medir_consultas("equipo_id", valores_equipo)
+                tiempo_usuario, resultados_usuario = medir_consultas("usuario_prestatario", valores_usuario)
+
+                if cantidad <= MAXIMO_RECORRIDO:
+                    recorrido = f"{medir_recorrido('equipo_id', valores_equipo[0]):16.1f}"
+                else:
+                    recorrido = f"{'-':>16}"
+
+                print(f"{cantidad:>12,} {tiempo_indices:12.2f} {tiempo_equipo:12.1f} {tiempo_usuario:13.1f} "
+                      f"{resultados_equipo:12.1f} {resultados_usuario:13.1f} {recorrido}")
+            finally:
+                os.chdir(carpeta_original)
+                indices._indices.clear()
+                almacenamiento.limpiar_cache()
+
+
+if __name__ == "__main__":
+    main()
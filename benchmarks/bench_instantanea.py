@@ -0,0 +1,66 @@
+"""
+Benchmark del arranque en frío con la instantánea por columnas
+Compara cuánto tarda, con la caché vacía, leer prestamos.csv completo
+contra abrir su instantánea (ver instantanea.py), y cuánto tarda listar
+los préstamos pendientes de cada forma.
+
+Uso:
+    python benchmarks/bench_instantanea.py              # 100 mil y 1 millón de préstamos
+    python benchmarks/bench_instantanea.py 100000       # solo ese tamaño
+"""
+import os
+import sys
+import tempfile
+import time
+
+import datos_sinteticos
+
+import almacenamiento
+import instantanea
+import lector_mapeado
+
+TAMANOS = [100_000, 1_000_000]
+
+
+def medir(funcion):
+    """
+    Devuelve (segundos, resultado) de una llamada.
+    """
+    inicio = time.perf_counter()
+    resultado = funcion()
+    return time.perf_counter() - inicio, resultado
+
+
+def main():
+    tamanos = [int(valor) for valor in sys.argv[1:]] or TAMANOS
+    carpeta_original = os.getcwd()
+
+    print(f"{'Filas':>12} {'Generar (s)':>12} {'Leer CSV (s)':>13} {'Abrir (ms)':>11} "
+          f"{'Pendientes CSV (ms)':>20} {'Pendientes inst. (ms)':>22}")
+    print("-" * 96)
+
+    for cantidad in tamanos:
+        with tempfile.TemporaryDirectory() as carpeta:
+            os.chdir(carpeta)
+            try:
+                datos_sinteticos.generar_prestamos("prestamos.csv", cantidad)
+
+                almacenamiento.limpiar_cache()
+                leer_csv, _ = medir(lambda: almacenamiento.leer_tabla_csv("prestamos.csv"))
+                almacenamiento.limpiar_cache()
+                pendientes_csv, _ = medir(lambda: lector_mapeado.filtrar("prestamos.csv", "estado", "PENDIENTE"))
+
+                generar, _ = medir(lambda: instantanea.generar_instantanea("prestamos.csv"))
+                instantanea._abiertas.clear()
+                abrir, _ = medir(lambda: instantanea.cargar("prestamos.csv"))
+                pendientes_inst, _ = medir(lambda: lector_mapeado.filtrar("prestamos.csv", "estado", "PENDIENTE"))
+
+                print(f"{cantidad:>12,} {generar:12.2f} {leer_csv:13.2f} {abrir * 1000:11.1f} "
+                      f"{pendientes_csv * 1000:20.1f} {pendientes_inst * 1000:22.1f}")
+            finally:
+                instantanea._abiertas.clear()
+                os.chdir(carpeta_original)
+
+
+if __name__ == "__main__":
+    main()
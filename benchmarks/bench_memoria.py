@@ -0,0 +1,87 @@
+"""
+Benchmark de memoria de las filas de préstamos
+Compara cuánta memoria ocupan los préstamos leídos como diccionarios de
+textos (como se leían antes) y como registros Prestamo (ver registros.py),
+y cuánto tarda leer el archivo de cada forma.
+
+Uso:
+    python benchmarks/bench_memoria.py              # 1 millón de préstamos
+    python benchmarks/bench_memoria.py 100000       # solo ese tamaño
+"""
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import datos_sinteticos
+
+import almacenamiento
+
+TAMANOS = [1_000_000]
+
+
+def leer_diccionarios(nombre_archivo):
+    """
+    Lectura anterior: un diccionario encabezado -> texto por cada fila.
+    """
+    filas = []
+    with open(nombre_archivo, "r", encoding="utf-8") as archivo:
+        encabezados = archivo.readline().strip().split(",")
+        for linea in archivo:
+            linea = linea.strip()
+            if linea:
+                filas.append(dict(zip(encabezados, linea.split(","))))
+    return filas
+
+
+def leer_registros(nombre_archivo):
+    """
+    Lectura actual: la de almacenamiento.py, un registro Prestamo por cada fila.
+    """
+    almacenamiento.limpiar_cache()
+    return almacenamiento.leer_tabla_csv(nombre_archivo)
+
+
+def medir(leer, nombre_archivo):
+    """
+    Devuelve (segundos, bytes que quedan ocupados por las filas leídas).
+    El tiempo se mide sin tracemalloc, porque lo hace más lento.
+    """
+    inicio = time.perf_counter()
+    filas = leer(nombre_archivo)
+    segundos = time.perf_counter() - inicio
+    del filas
+    almacenamiento.limpiar_cache()
+
+    tracemalloc.start()
+    antes = tracemalloc.get_traced_memory()[0]
+    filas = leer(nombre_archivo)
+    ocupados = tracemalloc.get_traced_memory()[0] - antes
+    tracemalloc.stop()
+    del filas
+    return segundos, ocupados
+
+
+def main():
+    tamanos = [int(valor) for valor in sys.argv[1:]] or TAMANOS
+    carpeta_original = os.getcwd()
+
+    print(f"{'Filas':>12} {'Formato':>12} {'Lectura (s)':>12} {'Memoria (MB)':>13} {'Bytes/fila':>11}")
+    print("-" * 64)
+
+    for cantidad in tamanos:
+        with tempfile.TemporaryDirectory() as carpeta:
+            os.chdir(carpeta)
+            try:
+                datos_sinteticos.generar_prestamos("prestamos.csv", cantidad)
+                for formato, leer in [("diccionario", leer_diccionarios), ("registro", leer_registros)]:
+                    segundos, ocupados = medir(leer, "prestamos.csv")
+                    print(f"{cantidad:>12,} {formato:>12} {segundos:12.2f} "
+                          f"{ocupados / 1e6:13.1f} {ocupados / cantidad:11.0f}")
+            finally:
+                os.chdir(carpeta_original)
+
+
+if __name__ == "__main__":
+    main()
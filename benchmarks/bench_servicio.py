@@ -0,0 +1,200 @@
+"""
+Benchmark del servicio HTTP (ver servicio.py)
+Arranca el servicio en otro proceso sobre una carpeta con datos generados
+y lo usa con un cliente asyncio de conexiones persistentes:
+- lecturas: cada conexión pide sin parar un préstamo, el historial de un
+  usuario o un equipo al azar
+- escrituras: cada conexión registra su propio equipo y repite el ciclo
+  solicitar -> aprobar -> devolver (tres POST por ciclo)
+Para cada cantidad de conexiones muestra pedidos por segundo, latencia
+(p50 y p99) y, en las escrituras, cuántas se guardaron por lote en promedio.
+Las escrituras se miden también con LOTE_MAXIMO = 1 (cada escritura con su
+propia transacción y su fsync) para ver lo que aporta guardar por lotes.
+
+Uso:
+    python benchmarks/bench_servicio.py              # 1, 8, 32 y 64 conexiones
+    python benchmarks/bench_servicio.py 16 128       # solo esas cantidades
+"""
+import asyncio
+import base64
+import json
+import os
+import random
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+
+import datos_sinteticos
+
+import servicio
+
+CONEXIONES = [1, 8, 32, 64]
+DURACION = 3  # segundos de cada medición
+CANTIDAD_PRESTAMOS = 100_000
+PUERTO = 8765
+AUTORIZACION = "Basic " + base64.b64encode(b"admin:admin123").decode("ascii")
+
+
+class Cliente:
+    """
+    Conexión HTTP/1.1 persistente con el servicio (un pedido a la vez).
+    """
+    def __init__(self, lector, escritor):
+        self.lector = lector
+        self.escritor = escritor
+
+    @classmethod
+    async def conectar(cls):
+        return cls(*await asyncio.open_connection("127.0.0.1", PUERTO))
+
+    async def pedir(self, metodo, ruta, datos=None):
+        """
+        Hace un pedido y devuelve (estado, respuesta JSON).
+        """
+        cuerpo = b"" if datos is None else json.dumps(datos).encode("utf-8")
+        cabecera = (f"{metodo} {ruta} HTTP/1.1\r\nHost: 127.0.0.1\r\nAuthorization: {AUTORIZACION}\r\n"
+                    f"Content-Length: {len(cuerpo)}\r\n\r\n")
+        self.escritor.write(cabecera.encode("ascii") + cuerpo)
+        respuesta = await self.lector.readuntil(b"\r\n\r\n")
+        lineas = respuesta.decode("latin-1").split("\r\n")
+        largo = next(int(linea.split(":", 1)[1]) for linea in lineas if linea.lower().startswith("content-length:"))
+        contenido = await self.lector.readexactly(largo)
+        return int(lineas[0].split()[1]), json.loads(contenido)
+
+    def cerrar(self):
+        self.escritor.close()
+
+
+async def leer(numero, fin, latencias, errores):
+    aleatorio = random.Random(numero)
+    cliente = await Cliente.conectar()
+    while time.perf_counter() < fin:
+        eleccion = aleatorio.random()
+        if eleccion < 0.5:
+            ruta = f"/prestamos/P{aleatorio.randrange(1, CANTIDAD_PRESTAMOS + 1):04d}"
+        elif eleccion < 0.8:
+            ruta = f"/historial?usuario=usuario{aleatorio.randrange(CANTIDAD_PRESTAMOS // 20):06d}"
+        else:
+            ruta = f"/equipos/EQ{aleatorio.randrange(CANTIDAD_PRESTAMOS // 10):06d}"
+        inicio = time.perf_counter()
+        estado, _ = await cliente.pedir("GET", ruta)
+        latencias.append(time.perf_counter() - inicio)
+        if estado != 200:
+            errores.append(estado)
+    cliente.cerrar()
+
+
+async def escribir(numero, fin, latencias, errores):
+    """
+    Ciclo de escrituras de una conexión sobre su propio equipo (no compite con las demás).
+    """
+    cliente = await Cliente.conectar()
+    equipo_id = f"BENCH{numero:04d}"
+    await cliente.pedir("POST", "/equipos", {"equipo_id": equipo_id, "nombre_equipo": "Equipo de prueba",
+                                             "categoria": "laptops"})
+    solicitud = {"equipo_id": equipo_id, "usuario_prestatario": f"cliente{numero}",
+                 "tipo_usuario": "ESTUDIANTE", "fecha_prestamo": "2025-11-24", "dias_solicitados": 3}
+
+    async def pedir(metodo, ruta, datos=None, esperado=200):
+        inicio = time.perf_counter()
+        estado, respuesta = await cliente.pedir(metodo, ruta, datos)
+        latencias.append(time.perf_counter() - inicio)
+        if estado != esperado:
+            errores.append(estado)
+        return estado == esperado, respuesta
+
+    while time.perf_counter() < fin:
+        guardado, prestamo = await pedir("POST", "/prestamos", solicitud, 201)
+        if not guardado:
+            break
+        ruta = f"/prestamos/{prestamo['prestamo_id']}"
+        if not (await pedir("POST", f"{ruta}/aprobar"))[0]:
+            break
+        if not (await pedir("POST", f"{ruta}/devolver", {"fecha_devolucion": "2025-11-26"}))[0]:
+            break
+    cliente.cerrar()
+
+
+async def medir(trabajo, conexiones):
+    """
+    Corre trabajo en conexiones clientes a la vez durante DURACION segundos.
+    Devuelve (latencias, errores, estadísticas del servicio antes, después).
+    """
+    cliente = await Cliente.conectar()
+    _, antes = await cliente.pedir("GET", "/estadisticas")
+    latencias, errores = [], []
+    fin = time.perf_counter() + DURACION
+    await asyncio.gather(*(trabajo(numero, fin, latencias, errores) for numero in range(conexiones)))
+    _, despues = await cliente.pedir("GET", "/estadisticas")
+    cliente.cerrar()
+    return latencias, errores, antes["servicio"], despues["servicio"]
+
+
+def percentil(valores, fraccion):
+    valores = sorted(valores)
+    return valores[min(len(valores) - 1, int(len(valores) * fraccion))] if valores else 0.0
+
+
+def mostrar(nombre, conexiones, latencias, errores, antes, despues):
+    lotes = despues["lotes"] - antes["lotes"]
+    escrituras = despues["escrituras"] - antes["escrituras"]
+    por_lote = f"{escrituras / lotes:.1f}" if lotes else "-"
+    print(f"{nombre:<22} {conexiones:>10} {len(latencias) / DURACION:>10.0f} "
+          f"{percentil(latencias, 0.5) * 1000:>9.2f} {percentil(latencias, 0.99) * 1000:>9.2f} "
+          f"{por_lote:>8} {len(errores):>8}")
+
+
+def arrancar_servicio(carpeta, lote_maximo):
+    """
+    Arranca servicio.py en otro proceso con ese LOTE_MAXIMO y espera a que atienda.
+    """
+    codigo = (f"import sys; sys.path.insert(0, {datos_sinteticos.CARPETA_PROYECTO!r}); import servicio; "
+              f"servicio.LOTE_MAXIMO = {lote_maximo}; servicio.main()")
+    proceso = subprocess.Popen([sys.executable, "-c", codigo, str(PUERTO)], cwd=carpeta,
+                               stdout=subprocess.DEVNULL)
+    limite = time.perf_counter() + 60
+    while time.perf_counter() < limite:
+        try:
+            socket.create_connection(("127.0.0.1", PUERTO), timeout=0.1).close()
+            return proceso
+        except OSError:
+            time.sleep(0.1)
+    proceso.kill()
+    raise RuntimeError("El servicio no arrancó")
+
+
+async def medir_todo(cantidades, lote_maximo):
+    if lote_maximo > 1:
+        for conexiones in cantidades:
+            mostrar("lecturas", conexiones, *await medir(leer, conexiones))
+    for conexiones in cantidades:
+        mostrar(f"escrituras (lote {lote_maximo})", conexiones, *await medir(escribir, conexiones))
+
+
+def main():
+    cantidades = [int(valor) for valor in sys.argv[1:]] or CONEXIONES
+    print(f"Procesadores disponibles: {os.cpu_count()}, {CANTIDAD_PRESTAMOS:,} préstamos, "
+          f"{DURACION} s por medición")
+    print(f"{'Prueba':<22} {'Conexiones':>10} {'Pedidos/s':>10} {'p50 ms':>9} {'p99 ms':>9} "
+          f"{'Por lote':>8} {'Errores':>8}")
+    print("-" * 82)
+
+    for lote_maximo in (servicio.LOTE_MAXIMO, 1):
+        with tempfile.TemporaryDirectory() as carpeta:
+            datos_sinteticos.generar_prestamos(os.path.join(carpeta, "prestamos.csv"), CANTIDAD_PRESTAMOS)
+            datos_sinteticos.generar_equipos(os.path.join(carpeta, "equipos.csv"), CANTIDAD_PRESTAMOS // 10)
+            with open(os.path.join(carpeta, "usuarios.csv"), "w", encoding="utf-8") as archivo:
+                archivo.write("usuario,contrasena,rol\nadmin,admin123,ADMIN\n")
+
+            proceso = arrancar_servicio(carpeta, lote_maximo)
+            try:
+                asyncio.run(medir_todo(cantidades, lote_maximo))
+            finally:
+                proceso.terminate()
+                proceso.wait()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,97 @@
+"""
+Generador de datos de prueba para los benchmarks
+Crea archivos prestamos.csv y equipos.csv con la cantidad de filas pedida
+"""
+import os
+import random
+import sys
+from datetime import date, timedelta
+
+# Los benchmarks se ejecutan desde la carpeta benchmarks/, pero los módulos
+# del sistema están en la carpeta de arriba
+CARPETA_PROYECTO = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if CARPETA_PROYECTO not in sys.path:
+    sys.path.insert(0, CARPETA_PROYECTO)
+
+import almacenamiento
+
+TIPOS_USUARIO = ["ESTUDIANTE", "INSTRUCTOR", "ADMINISTRATIVO"]
+CATEGORIAS = ["drones", "laptops", "camaras", "tablets", "kits"]
+
+
+def generar_prestamos(nombre_archivo, cantidad, prestamos_por_equipo=10,
+                      prestamos_por_usuario=20, semilla=1):
+    """
+    Escribe un prestamos.csv con cantidad filas.
+    Cada equipo tiene unos prestamos_por_equipo préstamos y cada usuario
+    unos prestamos_por_usuario, así la cantidad de resultados de una
+    consulta de historial no depende del tamaño del archivo.
+    Los préstamos terminan DEVUELTO, salvo algunos al final que quedan
+    APROBADO o PENDIENTE.
+    """
+    aleatorio = random.Random(semilla)
+    cantidad_equipos = max(1, cantidad // prestamos_por_equipo)
+    cantidad_usuarios = max(1, cantidad // prestamos_por_usuario)
+    inicio = date(2020, 1, 1).toordinal()
+    abiertos_desde = cantidad - min(cantidad // 100, 1000)
+
+    with open(nombre_archivo, "w", encoding="utf-8") as archivo:
+        archivo.write(",".join(almacenamiento.ENCABEZADOS_PRESTAMOS) + "\n")
+        lineas = []
+        for numero in range(1, cantidad + 1):
+            equipo = aleatorio.randrange(cantidad_equipos)
+            tipo = TIPOS_USUARIO[aleatorio.randrange(3)]
+            dias_autorizados = aleatorio.randint(1, {"ESTUDIANTE": 3, "INSTRUCTOR": 7}.get(tipo, 10))
+            fecha_prestamo = date.fromordinal(inicio + numero * 2000 // max(cantidad, 1))
+
+            if numero <= abiertos_desde:
+                dias_reales = aleatorio.randint(0, dias_autorizados + 3)
+                fecha_devolucion = (fecha_prestamo + timedelta(days=dias_reales)).isoformat()
+                retraso = "SI" if dias_reales > dias_autorizados else "NO"
+                estado = "DEVUELTO"
+                dias_reales = str(dias_reales)
+            else:
+                fecha_devolucion = dias_reales = retraso = ""
+                estado = "APROBADO" if numero % 2 else "PENDIENTE"
+
+            lineas.append(",".join([
+                f"P{numero:04d}",
+                f"EQ{equipo:06d}",
+                f"equipo {equipo}",
+                f"usuario{aleatorio.randrange(cantidad_usuarios):06d}",
+                tipo,
+                (fecha_prestamo - timedelta(days=1)).isoformat(),
+                fecha_prestamo.isoformat(),
+                fecha_devolucion,
+                str(dias_autorizados),
+                dias_reales,
+                retraso,
+                estado,
+                str(fecha_prestamo.month).zfill(2),
+                str(fecha_prestamo.year),
+            ]))
+            if len(lineas) >= 100000:
+                archivo.write("\n".join(lineas) + "\n")
+                lineas = []
+        if lineas:
+            archivo.write("\n".join(lineas) + "\n")
+
+    return cantidad_equipos, cantidad_usuarios
+
+
+def generar_equipos(nombre_archivo, cantidad, semilla=1):
+    """
+    Escribe un equipos.csv con cantidad equipos (EQ000000, EQ000001, ...).
+    """
+    aleatorio = random.Random(semilla)
+    with open(nombre_archivo, "w", encoding="utf-8") as archivo:
+        archivo.write(",".join(almacenamiento.ENCABEZADOS_EQUIPOS) + "\n")
+        for numero in range(cantidad):
+            archivo.write(",".join([
+                f"EQ{numero:06d}",
+                f"equipo {numero}",
+                CATEGORIAS[aleatorio.randrange(len(CATEGORIAS))],
+                "DISPONIBLE",
+                "2020-01-01",
+                "",
+            ]) + "\n")
@@ -0,0 +1,137 @@
+"""
+Módulo de lectura en paralelo de CSV grandes
+Con historiales de millones de filas, convertir prestamos.csv en un solo
+proceso es lo que más tarda al arrancar. Para los archivos grandes,
+almacenamiento.py lee la tabla así:
+
+1. Se divide el archivo en tramos de bytes que empiezan y terminan en un
+   salto de línea (uno por proceso).
+2. Cada proceso lee su tramo, divide las líneas (ver formato_csv.py) y
+   devuelve los textos por columna. Los textos se internan (sys.intern)
+   para que al enviarlos los repetidos viajen una sola vez.
+3. El proceso principal arma los registros (ver registros.py) en el orden
+   de los tramos, así el resultado es el mismo que leyendo en serie.
+
+Armar los registros queda en el proceso principal (los objetos de Python
+no se pueden compartir entre procesos), por eso la ganancia depende de
+cuánto de la lectura es dividir líneas y cuánto es crear objetos; ver
+benchmarks/bench_carga_paralela.py.
+
+Los procesos se crean con "spawn" (igual que en Windows), así no heredan
+los hilos del programa (por ejemplo el de vencimientos.py).
+
+Como armar los registros queda en serie, en las mediciones la lectura en
+paralelo no fue más rápida que en serie y además cada lectura en frío paga
+el arranque de los procesos. Por eso está desactivada: se activa indicando
+la cantidad de procesos con la variable de entorno TECHLAB_CARGA_PARALELA,
+por ejemplo:
+    TECHLAB_CARGA_PARALELA=4 python main.py
+"""
+import gc
+import io
+import multiprocessing
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+import almacenamiento
+import formato_csv
+
+def _trabajadores_elegidos():
+    """
+    Devuelve la cantidad de procesos de TECHLAB_CARGA_PARALELA (1 si no está o no es válida).
+    """
+    valor = os.environ.get("TECHLAB_CARGA_PARALELA") or "1"
+    if not valor.isdigit() or int(valor) < 1:
+        print(f"Aviso: TECHLAB_CARGA_PARALELA inválida ({valor}), se lee en serie")
+        return 1
+    return int(valor)
+
+
+# Cantidad de procesos (1 = leer siempre en serie, lo normal)
+TRABAJADORES = _trabajadores_elegidos()
+
+# Por debajo de este tamaño se lee en serie: arrancar los procesos cuesta más
+TAMANO_MINIMO = 64 * 1024 * 1024
+
+
+def conviene(nombre_archivo):
+    """
+    Indica si conviene leer el archivo en paralelo.
+    """
+    try:
+        return TRABAJADORES > 1 and os.path.getsize(nombre_archivo) >= TAMANO_MINIMO
+    except OSError:
+        return False
+
+
+def tramos(nombre_archivo, cantidad):
+    """
+    Divide el archivo (sin la línea de encabezados) en hasta cantidad
+    tramos (inicio, fin) de bytes que empiezan al principio de una línea.
+    Devuelve (encabezados, tramos).
+    """
+    with open(nombre_archivo, "rb") as archivo:
+        primera = archivo.readline()
+        total = os.fstat(archivo.fileno()).st_size
+        cortes = [len(primera)]
+        for numero in range(1, cantidad):
+            posicion = len(primera) + (total - len(primera)) * numero // cantidad
+            if posicion <= cortes[-1]:
+                continue
+            # El tramo termina en el salto de línea que está en posicion - 1 o después
+            archivo.seek(posicion - 1)
+            archivo.readline()
+            cortes.append(archivo.tell())
+        cortes.append(total)
+    encabezados = formato_csv.dividir(primera.decode("utf-8").strip())
+    return encabezados, [(inicio, fin) for inicio, fin in zip(cortes, cortes[1:]) if inicio < fin]
+
+
+def columnas_del_tramo(nombre_archivo, inicio, fin, cantidad_columnas):
+    """
+    Lee un tramo del archivo y devuelve sus textos por columna (una tupla
+    por columna, en el orden de las líneas). Se ejecuta en otro proceso.
+    """
+    with open(nombre_archivo, "rb") as archivo:
+        archivo.seek(inicio)
+        datos = archivo.read(fin - inicio)
+    # Mismos saltos de línea que al abrir el archivo en modo texto
+    lineas = io.TextIOWrapper(io.BytesIO(datos), encoding="utf-8")
+    filas = list(formato_csv.filas(lineas, list))
+    if any(len(valores) < cantidad_columnas for valores in filas):
+        raise IndexError("la línea tiene menos columnas que los encabezados")
+    intern = sys.intern
+    return [tuple(map(intern, columna)) for columna in list(zip(*filas))[:cantidad_columnas]]
+
+
+def parsear_archivo(nombre_archivo, trabajadores=None):
+    """
+    Lee un CSV completo en paralelo y devuelve la lista de filas
+    (registros o diccionarios), igual que almacenamiento._parsear_archivo.
+    Devuelve None si no se pudieron usar los procesos (se lee en serie).
+    """
+    trabajadores = trabajadores or TRABAJADORES
+    encabezados, partes = tramos(nombre_archivo, trabajadores)
+    fabricar = almacenamiento.fabrica_filas(nombre_archivo, encabezados)
+
+    filas = []
+    contexto = multiprocessing.get_context("spawn")
+    try:
+        with ProcessPoolExecutor(max_workers=trabajadores, mp_context=contexto) as procesos:
+            pendientes = [procesos.submit(columnas_del_tramo, nombre_archivo, inicio, fin, len(encabezados))
+                          for inicio, fin in partes]
+            # Mientras se crean las filas se pausa el recolector de basura (ver almacenamiento.py)
+            recolector_activo = gc.isenabled()
+            gc.disable()
+            try:
+                for pendiente in pendientes:
+                    filas.extend(map(fabricar, zip(*pendiente.result())))
+            finally:
+                if recolector_activo:
+                    gc.enable()
+    except (BrokenProcessPool, OSError) as e:
+        print(f"No se pudo leer {nombre_archivo} en paralelo ({e}); se lee en serie.")
+        return None
+    return filas
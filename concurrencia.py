@@ -0,0 +1,140 @@
+"""
+Módulo de concurrencia entre procesos
+Varias terminales (cada una con su main.py) pueden trabajar al mismo
+tiempo sobre la misma carpeta de datos:
+
+- Escrituras: cada transacción de almacenamiento.py toma un bloqueo
+  exclusivo sobre techlab.lock (fcntl.flock, un bloqueo "advisory": solo
+  lo respetan los procesos que lo piden) desde iniciar_transaccion hasta
+  confirmar o cancelar. Con el bloqueo tomado las lecturas ven lo último
+  que guardó cualquier proceso (la caché se valida con la firma de los
+  archivos), así dos terminales no pueden usar el mismo ID de préstamo ni
+  abrir dos préstamos para el mismo equipo. Las transacciones no piden
+  datos al usuario: el bloqueo dura lo que tarda en escribirse el registro
+  y aplicarse los cambios.
+- Lecturas: no toman el bloqueo y nunca esperan a los que escriben. Los
+  archivos se reemplazan enteros (os.replace) o crecen al final; si la
+  firma de un archivo cambió mientras se leía, se vuelve a leer.
+- Versiones: lo que el encargado ve en pantalla antes de decidir puede
+  cambiar mientras tanto (otra terminal aprobó el mismo préstamo).
+  version_fila(fila) es una etiqueta del contenido de la fila; al guardar,
+  almacenamiento.verificar_version compara la versión leída con la actual
+  y, si otro proceso cambió la fila, la operación no se guarda.
+
+Sin fcntl (Windows) no hay bloqueo entre procesos: ahí se debe usar una
+sola terminal a la vez, o el motor SQLite, que tiene su propio bloqueo.
+"""
+import hashlib
+import os
+import time
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None  # sin bloqueo entre procesos (ver arriba)
+
+ARCHIVO_BLOQUEO = "techlab.lock"
+
+# Segundos que se espera el bloqueo antes de avisar que no se pudo guardar
+ESPERA_MAXIMA = 10
+
+# Pausa máxima entre intentos mientras otro proceso tiene el bloqueo
+PAUSA_MAXIMA = 0.01
+
+# Descriptor de techlab.lock mientras este proceso tiene el bloqueo, y
+# cuántas veces se pidió sin soltarlo (el bloqueo se puede pedir anidado)
+_descriptor = None
+_nivel = 0
+
+_estadisticas = {"bloqueos": 0, "esperas": 0, "segundos_esperando": 0.0, "conflictos": 0}
+
+
+def bloquear():
+    """
+    Toma el bloqueo de escritura (o se suma al que este proceso ya tiene).
+    Si otro proceso lo tiene, espera hasta ESPERA_MAXIMA segundos.
+    Devuelve True si se tomó, False si no se pudo.
+    """
+    global _descriptor, _nivel
+    if _nivel > 0:
+        _nivel += 1
+        return True
+    if fcntl is None:
+        _nivel = 1
+        return True
+
+    try:
+        descriptor = os.open(ARCHIVO_BLOQUEO, os.O_RDWR | os.O_CREAT, 0o644)
+    except OSError as e:
+        print(f"Error al abrir {ARCHIVO_BLOQUEO}: {e}")
+        return False
+
+    inicio = time.perf_counter()
+    pausa = 0.0005
+    espero = False
+    while True:
+        try:
+            fcntl.flock(descriptor, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            break
+        except BlockingIOError:
+            if time.perf_counter() - inicio > ESPERA_MAXIMA:
+                os.close(descriptor)
+                print("Error: Otra terminal está guardando cambios hace demasiado tiempo. Intente de nuevo.")
+                return False
+            espero = True
+            time.sleep(pausa)
+            pausa = min(pausa * 2, PAUSA_MAXIMA)
+
+    _estadisticas["bloqueos"] += 1
+    if espero:
+        _estadisticas["esperas"] += 1
+        _estadisticas["segundos_esperando"] += time.perf_counter() - inicio
+    _descriptor = descriptor
+    _nivel = 1
+    return True
+
+
+def desbloquear():
+    """
+    Suelta el bloqueo tomado con bloquear() (cuando se suelta el de más afuera).
+    """
+    global _descriptor, _nivel
+    if _nivel == 0:
+        return
+    _nivel -= 1
+    if _nivel == 0 and _descriptor is not None:
+        descriptor, _descriptor = _descriptor, None
+        try:
+            fcntl.flock(descriptor, fcntl.LOCK_UN)
+        finally:
+            os.close(descriptor)
+
+
+# =========================================================
+# Versiones de las filas
+# =========================================================
+
+def version_fila(fila):
+    """
+    Devuelve la versión de una fila: un texto corto que cambia si cambia
+    cualquiera de sus valores (None si la fila es None).
+    """
+    if fila is None:
+        return None
+    texto = "\x1f".join(fila.values())
+    return hashlib.blake2b(texto.encode("utf-8"), digest_size=8).hexdigest()
+
+
+def contar_conflicto():
+    """
+    Cuenta una operación que no se guardó porque otro proceso cambió la fila.
+    """
+    _estadisticas["conflictos"] += 1
+
+
+def estadisticas():
+    """
+    Devuelve cuántas veces se tomó el bloqueo, cuántas hubo que esperar
+    (y cuánto en total) y cuántos conflictos de versión hubo.
+    """
+    return dict(_estadisticas)
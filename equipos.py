@@ -1,4 +1,6 @@
 from datetime import datetime  # para obtener la fecha actual
+import almacenamiento
+import indices
 
 # =========================================================
 # FUNCIÓN: leer_equipos()
@@ -6,37 +8,8 @@ from datetime import datetime  # para obtener la fecha actual
 # donde cada diccionario es un equipo con todos sus datos.
 # =========================================================
 def leer_equipos():
-    equipos = []  # lista donde guardaremos todos los equipos
-    
-    try:
-        # Abrimos el archivo en modo lectura
-        with open("equipos.csv", "r", encoding="utf-8") as archivo:
-            
-            # Leer la primera línea (los encabezados)
-            encabezados = archivo.readline().strip().split(",")
-            
-            # Leer cada línea restante del archivo
-            for linea in archivo:
-                linea = linea.strip()  # quitar espacios y saltos de línea
-                
-                if linea:  # si la línea no está vacía
-                    valores = linea.split(",")  # separar por comas
-                    
-                    equipo = {}  # aquí guardaremos un equipo
-                    
-                    # Construimos el diccionario: encabezado → valor
-                    for i, encabezado in enumerate(encabezados):
-                        equipo[encabezado] = valores[i]
-                    
-                    equipos.append(equipo)  # agregar a la lista
-    
-    except FileNotFoundError:
-        print("Error: No se encontró el archivo equipos.csv")
-    
-    except Exception as e:
-        print(f"Error al leer equipos: {e}")
-    
-    return equipos  # lista de diccionarios
+    # La lectura y la caché en memoria las maneja almacenamiento.py
+    return almacenamiento.leer_tabla("equipos.csv")  # lista de diccionarios
 
 # =========================================================
 # FUNCIÓN: guardar_equipos()
@@ -44,32 +17,15 @@ def leer_equipos():
 # Sobrescribe el archivo con los datos nuevos.
 # =========================================================
 def guardar_equipos(equipos):
-    try:
-        with open("equipos.csv", "w", encoding="utf-8") as archivo:
-            
-            # Encabezados que queremos escribir
-            encabezados = ["equipo_id", "nombre_equipo", "categoria", "estado_actual", "fecha_registro", "descripcion"]
-            
-            archivo.write(",".join(encabezados) + "\n")  # escribir encabezados
-            
-            # Escribir cada equipo
-            for equipo in equipos:
-                valores = [
-                    equipo.get("equipo_id", ""),
-                    equipo.get("nombre_equipo", ""),
-                    equipo.get("categoria", ""),
-                    equipo.get("estado_actual", ""),
-                    equipo.get("fecha_registro", ""),
-                    equipo.get("descripcion", "")
-                ]
-                
-                archivo.write(",".join(valores) + "\n")  # escribir fila
-        
-        return True
-    
-    except Exception as e:
-        print(f"Error al guardar equipos: {e}")
-        return False
+    return almacenamiento.guardar_tabla("equipos.csv", almacenamiento.ENCABEZADOS_EQUIPOS, equipos)
+
+# =========================================================
+# FUNCIÓN: agregar_equipo()
+# Agrega un equipo nuevo al final de equipos.csv
+# sin reescribir los equipos que ya estaban.
+# =========================================================
+def agregar_equipo(equipo):
+    return almacenamiento.agregar_fila("equipos.csv", almacenamiento.ENCABEZADOS_EQUIPOS, equipo)
 
 # =========================================================
 # FUNCIÓN: registrar_equipo()
@@ -80,16 +36,13 @@ def registrar_equipo():
     print("REGISTRAR NUEVO EQUIPO")
     print("="*50)
     
-    equipos = leer_equipos()  # cargar equipos existentes
-    
     # Pedir ID del equipo
     equipo_id = input("\nID del equipo: ").strip()
     
     # Validar que NO exista ese ID
-    for equipo in equipos:
-        if equipo.get("equipo_id") == equipo_id:
-            print(f"\n✗ Error: Ya existe un equipo con ID '{equipo_id}'")
-            return False
+    if obtener_equipo_por_id(equipo_id) is not None:
+        print(f"\n✗ Error: Ya existe un equipo con ID '{equipo_id}'")
+        return False
     
     # Pedir más datos
     nombre_equipo = input("Nombre del equipo: ").strip()
@@ -111,16 +64,34 @@ def registrar_equipo():
         "descripcion": descripcion
     }
     
-    equipos.append(nuevo_equipo)  # agregar a la lista
-    
-    # Guardar en el archivo
-    if guardar_equipos(equipos):
+    # Guardar en el archivo (se agrega al final, sin reescribir los demás)
+    guardado, mensaje = guardar_equipo_nuevo(nuevo_equipo)
+    if guardado:
         print(f"\n✓ Equipo '{nombre_equipo}' registrado exitosamente!")
         return True
     else:
-        print("\n✗ Error al registrar el equipo")
+        print(f"\n✗ Error al registrar el equipo: {mensaje}")
         return False
 
+# =========================================================
+# FUNCIÓN: guardar_equipo_nuevo()
+# Guarda un equipo nuevo si todavía no existe su ID.
+# Con la transacción abierta ninguna otra terminal escribe: se vuelve a
+# comprobar que nadie haya registrado el mismo ID mientras se pedían los datos.
+# Devuelve (guardado, mensaje): el mensaje dice por qué no se guardó.
+# =========================================================
+def guardar_equipo_nuevo(nuevo_equipo):
+    equipo_id = nuevo_equipo.get("equipo_id")
+    almacenamiento.iniciar_transaccion()
+    if obtener_equipo_por_id(equipo_id) is not None:
+        almacenamiento.cancelar_transaccion()
+        return False, f"otro usuario registró un equipo con ID '{equipo_id}'"
+
+    if agregar_equipo(nuevo_equipo) and almacenamiento.confirmar_transaccion():
+        return True, "registrado"
+    almacenamiento.cancelar_transaccion()
+    return False, "error al guardar los cambios"
+
 # =========================================================
 # FUNCIÓN: listar_equipos()
 # Muestra todos los equipos en forma de tabla.
@@ -160,15 +131,8 @@ def consultar_equipo():
     
     equipo_id = input("\nIngrese el ID del equipo a consultar: ").strip()
     
-    equipos = leer_equipos()
-    
-    equipo_encontrado = None  # por si se encuentra
-    
-    # Buscar el equipo
-    for equipo in equipos:
-        if equipo.get("equipo_id") == equipo_id:
-            equipo_encontrado = equipo
-            break
+    # Buscar el equipo (usa el índice por ID, no recorre toda la tabla)
+    equipo_encontrado = obtener_equipo_por_id(equipo_id)
     
     if equipo_encontrado:
         print("\n" + "="*50)
@@ -194,32 +158,21 @@ def consultar_equipo():
 # =========================================================
 # FUNCIÓN: obtener_equipo_por_id()
 # Devuelve un equipo por ID o None si no existe.
+# Usa el índice de equipos.csv.idx para leer solo esa fila.
 # =========================================================
 def obtener_equipo_por_id(equipo_id):
-    equipos = leer_equipos()
-    
-    for equipo in equipos:
-        if equipo.get("equipo_id") == equipo_id:
-            return equipo  # lo encontró
-    
-    return None  # no existe
+    return indices.buscar_fila("equipos.csv", equipo_id)
 
 # =========================================================
 # FUNCIÓN: actualizar_estado_equipo()
 # Cambia el estado de un equipo en el CSV.
+# Si se pasa version (la del equipo que se leyó, ver concurrencia.py)
+# y otra terminal cambió el equipo mientras tanto, no se guarda.
 # =========================================================
-def actualizar_estado_equipo(equipo_id, nuevo_estado):
-    equipos = leer_equipos()
-    
-    encontrado = False  # bandera
+def actualizar_estado_equipo(equipo_id, nuevo_estado, version=None):
+    if obtener_equipo_por_id(equipo_id) is None:
+        return False  # no se encontró ese equipo
     
-    for equipo in equipos:
-        if equipo.get("equipo_id") == equipo_id:
-            equipo["estado_actual"] = nuevo_estado
-            encontrado = True
-            break
-    
-    if encontrado:
-        return guardar_equipos(equipos)  # guardar cambios
-    else:
-        return False  # no se encontró ese Informe 
+    # El cambio se registra en equipos.csv.delta, sin reescribir el CSV
+    return almacenamiento.actualizar_fila("equipos.csv", almacenamiento.ENCABEZADOS_EQUIPOS,
+                                          equipo_id, {"estado_actual": nuevo_estado}, version)
@@ -0,0 +1,81 @@
+"""
+Módulo de fechas
+Convierte las fechas 'YYYY-MM-DD' del sistema en números de día
+(date.toordinal()), con los que comparar y restar fechas es solo
+aritmética de enteros.
+
+- Camino rápido: date.fromisoformat, bastante más rápido que strptime,
+  solo para textos con la forma exacta AAAA-MM-DD (fromisoformat también
+  acepta otras formas ISO, como 20251105, que el sistema no acepta).
+- Lo demás pasa por strptime con el formato de siempre, así se aceptan
+  las mismas fechas que antes (por ejemplo 2025-1-05).
+- Los últimos textos convertidos se recuerdan (LRU), porque en un lote
+  o un reporte las mismas fechas se repiten muchas veces.
+
+Los registros de préstamos (ver registros.py) ya guardan fecha_solicitud,
+fecha_prestamo y fecha_devolucion como número de día; dia_de usa ese
+número y solo convierte el texto cuando la fila es un diccionario.
+"""
+from datetime import date, datetime
+from functools import lru_cache
+
+FORMATO = "%Y-%m-%d"
+
+# Cantidad de textos distintos que recuerda la conversión
+TAMANO_MEMORIA = 4096
+
+
+@lru_cache(maxsize=TAMANO_MEMORIA)
+def dia(texto):
+    """
+    Número de día de la fecha 'YYYY-MM-DD', o None si no es una fecha válida.
+    """
+    if not isinstance(texto, str):
+        return None
+    if len(texto) == 10 and texto[4] == "-" and texto[7] == "-":
+        try:
+            return date.fromisoformat(texto).toordinal()
+        except ValueError:
+            pass  # strptime decide (acepta por ejemplo 2025-11- 5)
+    try:
+        return datetime.strptime(texto, FORMATO).toordinal()
+    except (TypeError, ValueError):
+        return None
+
+
+def es_valida(texto):
+    """
+    True si el texto es una fecha válida con formato 'YYYY-MM-DD'.
+    """
+    return dia(texto) is not None
+
+
+def fecha(texto):
+    """
+    Devuelve el date de la fecha 'YYYY-MM-DD', o None si no es válida.
+    """
+    numero = dia(texto)
+    return None if numero is None else date.fromordinal(numero)
+
+
+def dia_de(fila, campo):
+    """
+    Número de día de un campo de fecha de una fila, o None si no es válido.
+    Los registros ya lo tienen calculado; en los diccionarios se convierte
+    el texto (con la memoria de dia).
+    """
+    valor = getattr(fila, campo, None)
+    if isinstance(valor, int):
+        return valor
+    return dia(fila.get(campo, ""))
+
+
+def diferencia_dias(inicio, fin):
+    """
+    Días entre dos fechas 'YYYY-MM-DD' (fin - inicio), o None si alguna
+    no es válida.
+    """
+    dia_inicio, dia_fin = dia(inicio), dia(fin)
+    if dia_inicio is None or dia_fin is None:
+        return None
+    return dia_fin - dia_inicio
@@ -0,0 +1,79 @@
+"""
+Módulo del formato CSV
+Única forma de pasar de una línea de los CSV del sistema a sus valores
+y al revés, con las comillas del formato CSV: un valor que tiene comas
+o comillas se escribe entre comillas ("Laptop 14"", gris, con cargador"),
+así una coma en la descripción o el nombre de un equipo ya no corre las
+columnas de la fila.
+
+- dividir(linea) / dividir_bytes(linea): valores de una línea.
+  Las líneas sin comillas (casi todas) se dividen con str.split, que en
+  ellas da exactamente lo mismo que el lector csv y es más rápido; las
+  que tienen comillas las divide el lector del módulo csv (escrito en C).
+- unir(valores): línea (sin salto) con los valores. Solo si algún valor
+  tiene comas, comillas o saltos de línea se usa el escritor csv; las
+  demás líneas quedan igual que antes, byte por byte.
+- filas(lineas, fabricar): filas de un archivo abierto, armadas por
+  posición con fabricar (ver almacenamiento.fabrica_filas).
+
+Cada fila ocupa una sola línea del archivo (los índices, el lector
+mapeado y el archivo de cambios trabajan por líneas): los saltos de línea
+dentro de un valor no se admiten y se guardan como espacios. Los espacios
+al principio o al final de la línea se escriben entre comillas, porque
+los lectores quitan los de los extremos de cada línea.
+"""
+import csv
+import io
+
+
+def dividir(linea):
+    """
+    Devuelve la lista de valores de una línea (texto sin salto de línea).
+    """
+    if '"' not in linea:
+        return linea.split(",")
+    return next(csv.reader((linea,)), [""])
+
+
+def dividir_bytes(linea):
+    """
+    Igual que dividir, para una línea en bytes (UTF-8); devuelve bytes.
+    """
+    if b'"' not in linea:
+        return linea.split(b",")
+    return [valor.encode("utf-8") for valor in dividir(linea.decode("utf-8"))]
+
+
+def unir(valores):
+    """
+    Devuelve la línea CSV (sin salto de línea) con la lista de valores.
+    Los valores no pueden tener saltos de línea: cada \\n, \\r o \\r\\n se
+    reemplaza por un espacio (al leerlo vuelve como espacio, no como salto).
+    """
+    texto = ",".join(valores)
+    if ('"' not in texto and "\n" not in texto and "\r" not in texto and
+            texto.count(",") == len(valores) - 1 and texto == texto.strip()):
+        return texto
+
+    valores = [valor.replace("\r\n", " ").replace("\n", " ").replace("\r", " ") for valor in valores]
+    salida = io.StringIO()
+    csv.writer(salida, lineterminator="").writerow(valores)
+    linea = salida.getvalue()
+    if linea != linea.strip():
+        # Los lectores quitan los espacios de los extremos de la línea:
+        # entre comillas se conservan
+        salida = io.StringIO()
+        csv.writer(salida, lineterminator="", quoting=csv.QUOTE_ALL).writerow(valores)
+        linea = salida.getvalue()
+    return linea
+
+
+def filas(lineas, fabricar):
+    """
+    Devuelve (generador) la fila de cada línea no vacía de lineas
+    (por ejemplo un archivo abierto), armada con fabricar(valores).
+    """
+    for linea in lineas:
+        linea = linea.strip()
+        if linea:
+            yield fabricar(linea.split(",") if '"' not in linea else dividir(linea))
@@ -0,0 +1,397 @@
+"""
+Módulo de índices sobre las tablas CSV
+Guarda la posición (en bytes) de cada fila dentro del CSV, así se pueden
+leer solo las filas buscadas sin leer el archivo completo
+
+Hay dos tipos de índice:
+- índice primario (<archivo>.idx): clave (primera columna) -> posición de su fila
+- índice secundario (<archivo>.<campo>.idx): valor del campo -> lista de
+  posiciones de todas las filas con ese valor (por ejemplo todos los
+  préstamos de un equipo o de un usuario)
+
+Cada archivo de índice tiene:
+- una primera línea con el tamaño, el inodo, la fecha de modificación y
+  la generación (ver transacciones.py) del CSV cuando se indexó (con
+  ancho fijo, para poder actualizarla sin reescribir el archivo)
+- una línea valor,posición por cada fila del CSV
+Si el CSV creció (se agregaron filas al final), solo se indexa la parte nueva.
+Si el CSV se reescribió (cambió su generación, o su fecha sin cambiar el
+tamaño), el índice se vuelve a construir completo. Si aun así una búsqueda
+no encuentra la clave, o la fila de una posición no corresponde, el
+índice se reconstruye y se busca de nuevo antes de darla por inexistente.
+
+Con el motor SQLite activo, buscar_fila y buscar_filas usan los índices
+de la base de datos en lugar de estos archivos.
+"""
+import os
+
+import almacenamiento
+import formato_csv
+import transacciones
+
+# Índices cargados en memoria: (nombre_archivo, campo) ->
+# {"tamano", "inodo", "modificado", "generacion", "posiciones", "construido"}
+# campo es None para el índice primario; "construido" es la firma del CSV
+# cuando el índice se construyó completo en este proceso (o None)
+_indices = {}
+
+
+def archivo_indice(nombre_archivo, campo=None):
+    """
+    Devuelve el nombre del archivo de índice de una tabla
+    (primario si campo es None, secundario sobre campo si no).
+    """
+    if campo is None:
+        return nombre_archivo + ".idx"
+    return f"{nombre_archivo}.{campo}.idx"
+
+
+def _encabezado_indice(indice):
+    """
+    Primera línea del archivo de índice (siempre del mismo largo).
+    """
+    return f"{indice['tamano']:020d},{indice['inodo']:020d},{indice['modificado']:020d},{indice['generacion']:020d}\n"
+
+
+def _nuevo_indice(estado, generacion):
+    """
+    Índice vacío para el CSV con ese os.stat y esa generación.
+    """
+    return {"tamano": estado.st_size, "inodo": estado.st_ino, "modificado": estado.st_mtime_ns,
+            "generacion": generacion, "posiciones": {}, "construido": None}
+
+
+def _firma(estado):
+    return (estado.st_mtime_ns, estado.st_size, estado.st_ino)
+
+
+def _leer_encabezados(nombre_archivo):
+    """
+    Lee solo la primera línea del CSV (los encabezados).
+    """
+    with open(nombre_archivo, "r", encoding="utf-8") as archivo:
+        return formato_csv.dividir(archivo.readline().strip())
+
+
+def _columna(nombre_archivo, campo):
+    """
+    Devuelve el número de columna de un campo (0 para el índice primario).
+    """
+    if campo is None:
+        return 0
+    return _leer_encabezados(nombre_archivo).index(campo)
+
+
+def _agregar_posicion(indice, campo, valor, posicion):
+    """
+    Agrega una posición al índice: en el primario reemplaza,
+    en el secundario se suma a la lista de ese valor.
+    """
+    if campo is None:
+        indice["posiciones"][valor] = posicion
+    else:
+        indice["posiciones"].setdefault(valor, []).append(posicion)
+
+
+def _indexar_desde(nombre_archivo, inicio, fin, columna):
+    """
+    Recorre el CSV desde el byte inicio hasta el byte fin y devuelve la
+    lista de (valor de la columna, posición de la línea) de cada fila.
+    (Lo que se agregue al CSV mientras tanto se indexa la próxima vez.)
+    """
+    nuevas = []
+    with open(nombre_archivo, "rb") as archivo:
+        if inicio == 0:
+            archivo.readline()  # saltar los encabezados
+        else:
+            archivo.seek(inicio)
+        posicion = archivo.tell()
+
+        for linea in archivo:
+            if posicion + len(linea) > fin:
+                break
+            linea_limpia = linea.strip()
+            if linea_limpia:
+                valor = formato_csv.dividir_bytes(linea_limpia)[columna].decode("utf-8")
+                nuevas.append((valor, posicion))
+            posicion += len(linea)
+    return nuevas
+
+
+def _recorrer_posiciones(indice, campo):
+    """
+    Devuelve todas las (valor, posición) del índice, en orden de posición.
+    """
+    if campo is None:
+        pares = indice["posiciones"].items()
+    else:
+        pares = [(valor, posicion)
+                 for valor, lista in indice["posiciones"].items()
+                 for posicion in lista]
+    return sorted(pares, key=lambda par: par[1])
+
+
+def _guardar_indice(nombre_archivo, campo, indice):
+    """
+    Escribe el índice completo en disco (archivo temporal + reemplazo).
+    """
+    temporal = archivo_indice(nombre_archivo, campo) + ".tmp"
+    with open(temporal, "w", encoding="utf-8") as archivo:
+        archivo.write(_encabezado_indice(indice))
+        for valor, posicion in _recorrer_posiciones(indice, campo):
+            archivo.write(f"{valor},{posicion}\n")
+    os.replace(temporal, archivo_indice(nombre_archivo, campo))
+
+
+def _agregar_al_indice(nombre_archivo, campo, indice, nuevas):
+    """
+    Agrega al final del archivo de índice las posiciones nuevas y
+    actualiza la primera línea con el nuevo tamaño del CSV.
+    """
+    with open(archivo_indice(nombre_archivo, campo), "r+", encoding="utf-8") as archivo:
+        archivo.seek(0, os.SEEK_END)
+        for valor, posicion in nuevas:
+            archivo.write(f"{valor},{posicion}\n")
+        archivo.seek(0)
+        archivo.write(_encabezado_indice(indice))
+
+
+def _leer_indice_guardado(nombre_archivo, campo):
+    """
+    Lee el archivo de índice. Devuelve None si no existe o está dañado.
+    """
+    try:
+        with open(archivo_indice(nombre_archivo, campo), "r", encoding="utf-8") as archivo:
+            tamano, inodo, modificado, generacion = map(int, archivo.readline().strip().split(","))
+            indice = {"tamano": tamano, "inodo": inodo, "modificado": modificado,
+                      "generacion": generacion, "posiciones": {}, "construido": None}
+            for linea in archivo:
+                linea = linea.rstrip("\r\n")
+                if linea:
+                    valor, posicion = linea.rsplit(",", 1)
+                    _agregar_posicion(indice, campo, valor, int(posicion))
+        return indice
+    except (FileNotFoundError, ValueError):
+        return None
+
+
+def _termina_linea_en(nombre_archivo, tamano):
+    """
+    Indica si el byte anterior a tamano es un salto de línea, es decir,
+    si los primeros tamano bytes del CSV terminan en una línea completa.
+    """
+    if tamano == 0:
+        return True
+    with open(nombre_archivo, "rb") as archivo:
+        archivo.seek(tamano - 1)
+        return archivo.read(1) == b"\n"
+
+
+def _construir_indice(nombre_archivo, campo, estado, generacion):
+    """
+    Construye el índice completo recorriendo todo el CSV y lo guarda en disco.
+    """
+    indice = _nuevo_indice(estado, generacion)
+    indice["construido"] = _firma(estado)
+    for valor, posicion in _indexar_desde(nombre_archivo, 0, estado.st_size, _columna(nombre_archivo, campo)):
+        _agregar_posicion(indice, campo, valor, posicion)
+    _guardar_indice(nombre_archivo, campo, indice)
+    return indice
+
+
+def obtener_indice(nombre_archivo, campo=None):
+    """
+    Devuelve el índice vigente de una tabla:
+    - primario (campo None): clave -> posición en bytes
+    - secundario: valor del campo -> lista de posiciones
+    Si el CSV no cambió, usa el que está en memoria o en disco.
+    Si solo se agregaron filas al final, indexa únicamente esas filas.
+    En cualquier otro caso (CSV reescrito) lo vuelve a construir.
+    """
+    almacenamiento.asegurar_recuperacion()
+    # La generación se lee antes que el CSV: si lo reemplazan en el medio,
+    # la próxima consulta ve otra generación y reconstruye
+    generacion = transacciones.generacion(nombre_archivo)
+    estado = os.stat(nombre_archivo)
+
+    indice = _indices.get((nombre_archivo, campo))
+    if indice is None:
+        indice = _leer_indice_guardado(nombre_archivo, campo)
+
+    vigente = (indice is not None and
+               indice["inodo"] == estado.st_ino and
+               indice["generacion"] == generacion and
+               ((indice["tamano"] == estado.st_size and indice["modificado"] == estado.st_mtime_ns) or
+                (indice["tamano"] < estado.st_size and
+                 _termina_linea_en(nombre_archivo, indice["tamano"]))))
+
+    if not vigente:
+        indice = _construir_indice(nombre_archivo, campo, estado, generacion)
+    elif indice["tamano"] < estado.st_size:
+        # Solo se agregaron filas al final: indexar la parte nueva
+        nuevas = _indexar_desde(nombre_archivo, indice["tamano"], estado.st_size, _columna(nombre_archivo, campo))
+        for valor, posicion in nuevas:
+            _agregar_posicion(indice, campo, valor, posicion)
+        if indice["construido"] == (indice["modificado"], indice["tamano"], indice["inodo"]):
+            indice["construido"] = _firma(estado)  # sigue siendo el que se armó completo acá
+        indice["tamano"] = estado.st_size
+        indice["modificado"] = estado.st_mtime_ns
+        if os.path.exists(archivo_indice(nombre_archivo, campo)):
+            _agregar_al_indice(nombre_archivo, campo, indice, nuevas)
+        else:
+            _guardar_indice(nombre_archivo, campo, indice)
+
+    _indices[(nombre_archivo, campo)] = indice
+    return indice["posiciones"]
+
+
+def _recien_construido(nombre_archivo, campo):
+    """
+    Indica si el índice en memoria se construyó completo sobre el CSV tal
+    como está ahora (una clave que no aparece en él de verdad no existe).
+    """
+    indice = _indices.get((nombre_archivo, campo))
+    return indice is not None and indice["construido"] == _firma(os.stat(nombre_archivo))
+
+
+def _descartar_indice(nombre_archivo, campo):
+    """
+    Borra un índice de memoria y de disco (la próxima consulta lo reconstruye).
+    """
+    _indices.pop((nombre_archivo, campo), None)
+    if os.path.exists(archivo_indice(nombre_archivo, campo)):
+        os.remove(archivo_indice(nombre_archivo, campo))
+
+
+def _leer_filas_en(nombre_archivo, posiciones, columna, valor):
+    """
+    Lee las filas que empiezan en las posiciones dadas y las convierte en
+    diccionarios. Devuelve None si alguna línea no tiene el valor esperado
+    en la columna (el índice quedó viejo).
+    """
+    encabezados = _leer_encabezados(nombre_archivo)
+    filas = []
+    with open(nombre_archivo, "rb") as archivo:
+        for posicion in posiciones:
+            archivo.seek(posicion)
+            linea = archivo.readline().decode("utf-8")
+            valores = formato_csv.dividir(linea.strip())
+            if len(valores) <= columna or valores[columna] != valor:
+                return None
+            filas.append(almacenamiento.parsear_linea(encabezados, linea, nombre_archivo))
+    return filas
+
+
+def buscar_fila(nombre_archivo, clave):
+    """
+    Devuelve la fila (diccionario) cuya primera columna vale clave,
+    con sus cambios pendientes aplicados, o None si no existe.
+    Si la tabla ya está en memoria se usa esa copia; si no, se lee
+    solo la línea de esa fila usando el índice primario.
+    """
+    motor = almacenamiento.motor_sqlite()
+    if motor is not None:
+        return motor.buscar_fila(nombre_archivo, clave)
+
+    en_cache, fila = almacenamiento.buscar_en_cache(nombre_archivo, clave)
+    if en_cache:
+        return fila
+
+    try:
+        for intento in range(2):
+            posicion = obtener_indice(nombre_archivo).get(clave)
+            if posicion is None:
+                if _recien_construido(nombre_archivo, None):
+                    return None
+                # No se confía en un índice que no se armó sobre este CSV: se reconstruye
+                _descartar_indice(nombre_archivo, None)
+                continue
+
+            filas = _leer_filas_en(nombre_archivo, [posicion], 0, clave)
+            if filas is not None:
+                cambios = almacenamiento.cambios_por_clave(nombre_archivo).get(clave)
+                return almacenamiento.con_cambios(filas[0], cambios) if cambios else filas[0]
+
+            # La línea no corresponde a la clave: el índice quedó viejo
+            _descartar_indice(nombre_archivo, None)
+
+    except FileNotFoundError:
+        print(f"Error: No se encontró el archivo {nombre_archivo}")
+    except Exception as e:
+        print(f"Error al leer {nombre_archivo}: {e}")
+
+    return None
+
+
+def buscar_filas(nombre_archivo, campo, valor):
+    """
+    Devuelve todas las filas cuyo campo vale valor, en el orden del CSV,
+    con sus cambios pendientes aplicados.
+    Usa el índice secundario del campo: solo lee las filas que coinciden,
+    así el costo depende de la cantidad de resultados y no del tamaño del CSV.
+    """
+    motor = almacenamiento.motor_sqlite()
+    if motor is not None:
+        return motor.buscar_filas(nombre_archivo, campo, valor)
+
+    reemplazo, agregadas = almacenamiento.filas_en_transaccion(nombre_archivo)
+    if reemplazo is not None:
+        # La transacción abierta reescribió la tabla: el índice no sirve
+        return [fila for fila in reemplazo if fila.get(campo) == valor]
+
+    try:
+        columna = _columna(nombre_archivo, campo)
+        filas = None
+        for intento in range(2):
+            posiciones = sorted(obtener_indice(nombre_archivo, campo).get(valor, []))
+            if not posiciones and not _recien_construido(nombre_archivo, campo):
+                # Ninguna fila según un índice que no se armó sobre este CSV: se reconstruye
+                _descartar_indice(nombre_archivo, campo)
+                continue
+            filas = _leer_filas_en(nombre_archivo, posiciones, columna, valor)
+            if filas is not None:
+                break
+            # Alguna línea no corresponde: el índice quedó viejo
+            _descartar_indice(nombre_archivo, campo)
+
+        if filas is None:
+            return []
+
+        # Aplicar los cambios pendientes (en general el campo indexado no cambia,
+        # pero si un cambio lo modificó, la fila se agrega o se quita)
+        cambios = almacenamiento.cambios_por_clave(nombre_archivo)
+        resultados = []
+        claves = set()
+        for fila in filas:
+            clave = next(iter(fila.values()))
+            if clave in cambios:
+                fila = almacenamiento.con_cambios(fila, cambios[clave])
+            claves.add(clave)
+            if fila.get(campo) == valor:
+                resultados.append(fila)
+
+        for clave, campos in cambios.items():
+            if campos.get(campo) == valor and clave not in claves:
+                fila = buscar_fila(nombre_archivo, clave)
+                if fila is not None:
+                    resultados.append(fila)
+
+        # Filas agregadas por la transacción abierta (todavía no están en el CSV)
+        resultados.extend(fila for fila in agregadas if fila.get(campo) == valor)
+        return resultados
+
+    except FileNotFoundError:
+        print(f"Error: No se encontró el archivo {nombre_archivo}")
+    except Exception as e:
+        print(f"Error al leer {nombre_archivo}: {e}")
+
+    return []
+
+
+def reconstruir_indice(nombre_archivo, campo=None):
+    """
+    Vuelve a construir un índice de una tabla desde cero.
+    """
+    _indices.pop((nombre_archivo, campo), None)
+    generacion = transacciones.generacion(nombre_archivo)
+    _indices[(nombre_archivo, campo)] = _construir_indice(nombre_archivo, campo, os.stat(nombre_archivo), generacion)
@@ -0,0 +1,630 @@
+"""
+Módulo de instantáneas por columnas de prestamos.csv
+Guarda una copia binaria del historial de préstamos organizada por
+columnas (prestamos.csv.columnas), para no tener que leer y convertir
+todo el CSV cada vez que el programa arranca. El CSV sigue siendo el
+formato de intercambio: la instantánea se puede borrar y volver a generar
+en cualquier momento con:
+    python instantanea.py
+
+Cada columna se guarda como un arreglo de números (módulo array):
+- textos que se repiten (nombre_equipo, usuario_prestatario, tipo_usuario,
+  estado, ...) con un diccionario: la lista de valores distintos y, por
+  cada fila, el número de su valor en esa lista
+- días, mes y año como enteros; fechas como número de día (toordinal)
+- prestamo_id (un valor distinto por fila) como el texto de todas las
+  claves seguido y la posición donde empieza cada una
+Los valores que no se pueden guardar con su tipo (por ejemplo una fecha
+mal escrita) se guardan aparte como texto, así cada fila vuelve a dar
+exactamente los mismos textos del CSV.
+
+El archivo se abre con mmap y los arreglos se usan sin copiarlos
+(memoryview), así cargarla tarda milisegundos aunque tenga millones de
+filas. Las filas (registros Prestamo, igual que en almacenamiento.py)
+se arman recién cuando se piden.
+
+Igual que los índices (ver indices.py), la instantánea guarda el tamaño,
+el inodo, la fecha de modificación y la generación (ver transacciones.py)
+del CSV cuando se generó: si después se agregaron filas al final, se leen
+solo esas filas del CSV; los cambios pendientes (archivo .delta y
+transacción abierta) se aplican al leer. Si el CSV se reescribió (por
+ejemplo al compactarlo o archivar préstamos) la instantánea ya no sirve y
+se lee el CSV hasta que se vuelva a generar.
+"""
+import json
+import mmap
+import os
+import sys
+from array import array
+from collections.abc import Sequence
+from datetime import date
+from itertools import compress
+
+import almacenamiento
+import formato_csv
+import transacciones
+
+# Primera línea del archivo (identifica el formato y su versión)
+MARCA = b"TECHLAB-COLUMNAS 1\n"
+
+# Cómo se guarda cada columna de prestamos.csv:
+# "clave" (texto distinto por fila), "diccionario", "entero" o "fecha"
+TIPOS_PRESTAMOS = {
+    "prestamo_id": "clave",
+    "equipo_id": "diccionario",
+    "nombre_equipo": "diccionario",
+    "usuario_prestatario": "diccionario",
+    "tipo_usuario": "diccionario",
+    "fecha_solicitud": "fecha",
+    "fecha_prestamo": "fecha",
+    "fecha_devolucion": "fecha",
+    "dias_autorizados": "entero",
+    "dias_reales_usados": "entero",
+    "retraso": "diccionario",
+    "estado": "diccionario",
+    "mes": "entero",
+    "anio": "entero",
+}
+
+# Cómo se escribe cada columna entera (el mes siempre con dos dígitos)
+FORMATOS_ENTEROS = {"mes": "02d"}
+
+# Valores especiales de las columnas enteras y de fecha
+VACIO = -2 ** 31          # el texto del CSV estaba vacío
+OTRO = -2 ** 31 + 1       # el texto se guardó aparte (ver "excepciones")
+
+# Instantáneas abiertas: nombre_archivo -> (firma del archivo de la instantánea, _Columnas)
+_abiertas = {}
+
+
+def archivo_instantanea(nombre_archivo):
+    """
+    Devuelve el nombre del archivo de la instantánea de una tabla.
+    """
+    return nombre_archivo + ".columnas"
+
+
+def _codigo_para(cantidad):
+    """
+    Tipo de arreglo más chico que alcanza para cantidad valores distintos.
+    """
+    if cantidad <= 2 ** 8:
+        return "B"
+    if cantidad <= 2 ** 16:
+        return "H"
+    return "I"
+
+
+# =========================================================
+# Generar la instantánea
+# =========================================================
+
+def _convertir_entero(texto, formato):
+    """
+    Devuelve el número que representa texto, o None si al volver a
+    escribirlo no quedaría igual.
+    """
+    if not texto.lstrip("-").isdigit():
+        return None
+    valor = int(texto)
+    if not OTRO < valor < 2 ** 31 or format(valor, formato) != texto:
+        return None
+    return valor
+
+
+def _convertir_fecha(texto):
+    """
+    Devuelve el número de día de la fecha, o None si no tiene el formato AAAA-MM-DD.
+    """
+    try:
+        fecha = date.fromisoformat(texto)
+    except ValueError:
+        return None
+    return fecha.toordinal() if fecha.isoformat() == texto else None
+
+
+class _Constructor:
+    """
+    Arma una columna de la instantánea agregando los textos de a uno.
+    """
+
+    def __init__(self, campo, tipo):
+        self.campo = campo
+        self.tipo = tipo
+        self.excepciones = {}
+        self.cantidad = 0
+        if tipo == "clave":
+            self.texto = bytearray()
+            self.posiciones = array("q", [0])
+            self.ultima = b""
+            self.ordenadas = True  # las claves llegaron ya ordenadas (P0001, P0002, ...)
+        elif tipo == "diccionario":
+            self.numeros = {}
+            self.codigos = array("I")
+        else:
+            self.formato = FORMATOS_ENTEROS.get(campo, "d")
+            self.convertir = {}
+            self.valores = array("i")
+
+    def agregar(self, texto):
+        if self.tipo == "clave":
+            clave = texto.encode("utf-8")
+            if clave < self.ultima:
+                self.ordenadas = False
+            self.ultima = clave
+            self.texto += clave
+            self.posiciones.append(len(self.texto))
+        elif self.tipo == "diccionario":
+            numero = self.numeros.get(texto)
+            if numero is None:
+                numero = self.numeros[texto] = len(self.numeros)
+            self.codigos.append(numero)
+        else:
+            valor = self.convertir.get(texto)
+            if valor is None:
+                if texto == "":
+                    valor = VACIO
+                elif self.tipo == "fecha":
+                    valor = _convertir_fecha(texto)
+                else:
+                    valor = _convertir_entero(texto, self.formato)
+                if valor is None:
+                    valor = OTRO
+                else:
+                    self.convertir[texto] = valor
+            if valor == OTRO:
+                self.excepciones[self.cantidad] = texto
+            self.valores.append(valor)
+        self.cantidad += 1
+
+    def partes(self):
+        """
+        Devuelve (descripción de la columna, lista de (nombre, arreglo)).
+        """
+        descripcion = {"tipo": self.tipo}
+        if self.tipo == "clave":
+            # Números de fila ordenados por clave, para buscar una clave por bisección
+            if self.ordenadas:
+                orden = array("I", range(self.cantidad))
+            else:
+                orden = array("I", sorted(range(self.cantidad), key=self._clave))
+            return descripcion, [("texto", self.texto), ("posiciones", self.posiciones), ("orden", orden)]
+        if self.tipo == "diccionario":
+            descripcion["valores"] = list(self.numeros)
+            codigos = array(_codigo_para(len(self.numeros)), self.codigos)
+            return descripcion, [("codigos", codigos)]
+        descripcion["formato"] = self.formato
+        descripcion["excepciones"] = {str(fila): texto for fila, texto in self.excepciones.items()}
+        return descripcion, [("valores", self.valores)]
+
+    def _clave(self, fila):
+        return bytes(self.texto[self.posiciones[fila]:self.posiciones[fila + 1]])
+
+
+def generar_instantanea(nombre_archivo="prestamos.csv"):
+    """
+    Genera (o vuelve a generar) la instantánea por columnas del CSV, con
+    las filas tal como están en el CSV base (sin el archivo de cambios).
+    Devuelve la cantidad de filas guardadas, o None si hubo un error.
+    """
+    almacenamiento.asegurar_recuperacion()
+    encabezados = almacenamiento.ENCABEZADOS_PRESTAMOS
+    try:
+        generacion = transacciones.generacion(nombre_archivo)
+        with open(nombre_archivo, "rb") as archivo:
+            estado = os.fstat(archivo.fileno())
+            primera = archivo.readline()
+            if formato_csv.dividir(primera.decode("utf-8").strip()) != encabezados:
+                print(f"Error: {nombre_archivo} no tiene las columnas esperadas")
+                return None
+            tamano = len(primera)
+
+            constructores = [_Constructor(campo, TIPOS_PRESTAMOS[campo]) for campo in encabezados]
+            agregadores = [constructor.agregar for constructor in constructores]
+            for numero, linea in enumerate(archivo, start=2):
+                # Solo las líneas completas que ya estaban cuando se empezó
+                # (lo que se agregue después se lee del CSV al cargarla)
+                if not linea.endswith(b"\n") or tamano + len(linea) > estado.st_size:
+                    break
+                tamano += len(linea)
+                linea = linea.strip()
+                if not linea:
+                    continue
+                textos = formato_csv.dividir(linea.decode("utf-8"))
+                if len(textos) < len(encabezados):
+                    print(f"Error: la línea {numero} de {nombre_archivo} tiene menos columnas que los encabezados")
+                    return None
+                for agregar, texto in zip(agregadores, textos):
+                    agregar(texto)
+
+        cabecera = {
+            "archivo": nombre_archivo,
+            "tamano": tamano,
+            "inodo": estado.st_ino,
+            "modificado": estado.st_mtime_ns,
+            "generacion": generacion,
+            "orden_bytes": sys.byteorder,
+            "filas": constructores[0].cantidad,
+            "columnas": {},
+        }
+        bloques = []
+        posicion = 0
+        for constructor in constructores:
+            descripcion, partes = constructor.partes()
+            for parte, arreglo in partes:
+                contenido = bytes(arreglo) if isinstance(arreglo, bytearray) else arreglo.tobytes()
+                codigo = "B" if isinstance(arreglo, bytearray) else arreglo.typecode
+                descripcion[parte] = {"codigo": codigo, "inicio": posicion, "largo": len(contenido)}
+                relleno = -len(contenido) % 8  # cada arreglo empieza alineado a 8 bytes
+                bloques.append(contenido + b"\0" * relleno)
+                posicion += len(contenido) + relleno
+            cabecera["columnas"][constructor.campo] = descripcion
+
+        texto_cabecera = json.dumps(cabecera, ensure_ascii=False).encode("utf-8") + b"\n"
+        inicio_datos = len(MARCA) + len(texto_cabecera)
+        relleno = -inicio_datos % 8
+
+        temporal = archivo_instantanea(nombre_archivo) + ".tmp"
+        with open(temporal, "wb") as archivo:
+            archivo.write(MARCA + texto_cabecera + b"\0" * relleno)
+            for bloque in bloques:
+                archivo.write(bloque)
+        os.replace(temporal, archivo_instantanea(nombre_archivo))
+        return cabecera["filas"]
+
+    except FileNotFoundError:
+        print(f"Error: No se encontró el archivo {nombre_archivo}")
+    except Exception as e:
+        print(f"Error al generar la instantánea de {nombre_archivo}: {e}")
+    return None
+
+
+# =========================================================
+# Leer la instantánea
+# =========================================================
+
+class _Columnas:
+    """
+    Instantánea abierta: el archivo mapeado en memoria y los arreglos de
+    cada columna (memoryview sobre el mapeo, sin copiar).
+    """
+
+    def __init__(self, nombre_instantanea):
+        with open(nombre_instantanea, "rb") as archivo:
+            self.datos = mmap.mmap(archivo.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            if self.datos[:len(MARCA)] != MARCA:
+                raise ValueError("formato de instantánea desconocido")
+            fin_cabecera = self.datos.find(b"\n", len(MARCA)) + 1
+            cabecera = json.loads(self.datos[len(MARCA):fin_cabecera].decode("utf-8"))
+            if cabecera["orden_bytes"] != sys.byteorder:
+                raise ValueError("la instantánea se generó en otra arquitectura")
+            self.inicio = fin_cabecera + (-fin_cabecera % 8)
+            self.vista = memoryview(self.datos)
+            self.archivo = cabecera["archivo"]
+            self.tamano = cabecera["tamano"]
+            self.inodo = cabecera["inodo"]
+            # Las instantáneas de antes no tienen estos datos: se toman como viejas
+            self.modificado = cabecera.get("modificado")
+            self.generacion = cabecera.get("generacion")
+            self.filas = cabecera["filas"]
+            self.columnas = cabecera["columnas"]
+            for descripcion in self.columnas.values():
+                if "excepciones" in descripcion:
+                    descripcion["excepciones"] = {int(fila): texto for fila, texto in descripcion["excepciones"].items()}
+            self.campos = list(self.columnas)
+            self._fechas = {}
+            self._lectores = [self._lector(campo) for campo in self.campos]
+            self._fabricar = almacenamiento.fabrica_filas(self.archivo, self.campos)
+        except Exception:
+            self.cerrar()
+            raise
+
+    def arreglo(self, campo, parte):
+        """
+        Devuelve una parte de una columna como memoryview con su tipo
+        (por ejemplo los códigos de "estado" o los valores de "anio").
+        """
+        descripcion = self.columnas[campo][parte]
+        inicio = self.inicio + descripcion["inicio"]
+        return self.vista[inicio:inicio + descripcion["largo"]].cast(descripcion["codigo"])
+
+    def _texto_fecha(self, dia):
+        texto = self._fechas.get(dia)
+        if texto is None:
+            texto = self._fechas[dia] = date.fromordinal(dia).isoformat()
+        return texto
+
+    def _lector(self, campo):
+        """
+        Devuelve la función que da el texto del CSV de ese campo para una fila.
+        """
+        descripcion = self.columnas[campo]
+        tipo = descripcion["tipo"]
+        if tipo == "clave":
+            texto = self.arreglo(campo, "texto")
+            posiciones = self.arreglo(campo, "posiciones")
+            return lambda fila: str(texto[posiciones[fila]:posiciones[fila + 1]], "utf-8")
+        if tipo == "diccionario":
+            valores = descripcion["valores"]
+            codigos = self.arreglo(campo, "codigos")
+            return lambda fila: valores[codigos[fila]]
+
+        numeros = self.arreglo(campo, "valores")
+        excepciones = descripcion["excepciones"]
+        formato = descripcion["formato"]
+
+        def leer(fila):
+            valor = numeros[fila]
+            if valor == VACIO:
+                return ""
+            if valor == OTRO:
+                return excepciones[fila]
+            if tipo == "fecha":
+                return self._texto_fecha(valor)
+            return format(valor, formato)
+        return leer
+
+    def fila(self, numero):
+        """
+        Arma la fila número numero (sin cambios pendientes).
+        """
+        return self._fabricar([leer(numero) for leer in self._lectores])
+
+    def buscar_clave(self, clave):
+        """
+        Devuelve el número de la fila con esa clave (primera columna), o None.
+        Usa el orden de las claves guardado en la instantánea (búsqueda binaria).
+        """
+        campo = self.campos[0]
+        texto = self.arreglo(campo, "texto")
+        posiciones = self.arreglo(campo, "posiciones")
+        orden = self.arreglo(campo, "orden")
+
+        def clave_de(fila):
+            return bytes(texto[posiciones[fila]:posiciones[fila + 1]])
+
+        buscada = clave.encode("utf-8")
+        izquierda, derecha = 0, len(orden)
+        while izquierda < derecha:
+            medio = (izquierda + derecha) // 2
+            if clave_de(orden[medio]) < buscada:
+                izquierda = medio + 1
+            else:
+                derecha = medio
+        if izquierda < len(orden) and clave_de(orden[izquierda]) == buscada:
+            return orden[izquierda]
+        return None
+
+    def cerrar(self):
+        if hasattr(self, "vista"):
+            self.vista.release()
+        self.datos.close()
+
+
+class TablaColumnar(Sequence):
+    """
+    Vista de solo lectura de la tabla: las filas de la instantánea más las
+    que se agregaron al CSV después, con los cambios pendientes aplicados.
+    Se usa como una lista de filas.
+    """
+
+    def __init__(self, columnas, cola, cambios):
+        self._columnas = columnas
+        self._cola = cola
+        self._cambios = cambios
+        self.encabezados = columnas.campos
+
+    def _con_cambios(self, fila):
+        cambios = self._cambios.get(next(iter(fila.values())))
+        return almacenamiento.con_cambios(fila, cambios) if cambios else fila
+
+    def __len__(self):
+        return self._columnas.filas + len(self._cola)
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return [self[j] for j in range(*i.indices(len(self)))]
+        if i < 0:
+            i += len(self)
+        if not 0 <= i < len(self):
+            raise IndexError("fila fuera de rango")
+        if i >= self._columnas.filas:
+            return self._cola[i - self._columnas.filas]
+        return self._con_cambios(self._columnas.fila(i))
+
+    def __iter__(self):
+        fila = self._columnas.fila
+        for numero in range(self._columnas.filas):
+            yield self._con_cambios(fila(numero))
+        yield from self._cola
+
+    @property
+    def filas_instantanea(self):
+        """
+        Cantidad de filas que vienen de la instantánea (las primeras de la tabla).
+        """
+        return self._columnas.filas
+
+    @property
+    def cola(self):
+        """
+        Filas que se agregaron al CSV (o en la transacción abierta) después
+        de generar la instantánea, ya con sus cambios.
+        """
+        return self._cola
+
+    def columna(self, campo):
+        """
+        Devuelve (arreglo, descripción) de una columna de la instantánea, sin
+        los cambios pendientes: los códigos si tiene diccionario (los valores
+        están en descripcion["valores"]) o los números si es entera o de fecha
+        (VACIO, u OTRO con el texto en descripcion["excepciones"]).
+        """
+        descripcion = self._columnas.columnas[campo]
+        parte = "codigos" if descripcion["tipo"] == "diccionario" else "valores"
+        return self._columnas.arreglo(campo, parte), descripcion
+
+    def filas_con_cambios(self):
+        """
+        Devuelve una lista de (número de fila, fila con sus cambios) de las
+        filas de la instantánea que tienen cambios pendientes.
+        """
+        resultado = []
+        for clave in self._cambios:
+            numero = self._columnas.buscar_clave(clave)
+            if numero is not None:
+                resultado.append((numero, self._con_cambios(self._columnas.fila(numero))))
+        return resultado
+
+    def filtrar(self, campo, valor):
+        """
+        Devuelve, en el orden del CSV, las filas cuyo campo vale valor.
+        En las columnas con diccionario se comparan los códigos de la
+        columna y solo se arman las filas que coinciden.
+        """
+        columnas = self._columnas
+        descripcion = columnas.columnas.get(campo)
+        if descripcion is None or descripcion["tipo"] != "diccionario":
+            return [fila for fila in self if fila.get(campo) == valor]
+
+        numeros = set()
+        if valor in descripcion["valores"]:
+            codigo = descripcion["valores"].index(valor)
+            codigos = columnas.arreglo(campo, "codigos")
+            buscado = bytes([codigo])
+            contenido = codigos.tobytes() if codigos.format == "B" else b""
+            if contenido and contenido.count(buscado) * 64 < columnas.filas:
+                # Valor poco frecuente (por ejemplo PENDIENTE): se busca el byte directamente
+                numero = contenido.find(buscado)
+                while numero != -1:
+                    numeros.add(numero)
+                    numero = contenido.find(buscado, numero + 1)
+            else:
+                numeros.update(compress(range(columnas.filas), map(codigo.__eq__, codigos)))
+        # Filas a las que un cambio pendiente les pudo poner o quitar el valor
+        for clave, campos in self._cambios.items():
+            if campo in campos:
+                numero = columnas.buscar_clave(clave)
+                if numero is not None:
+                    numeros.add(numero)
+
+        resultados = []
+        for numero in sorted(numeros):
+            fila = self._con_cambios(columnas.fila(numero))
+            if fila.get(campo) == valor:
+                resultados.append(fila)
+        resultados.extend(fila for fila in self._cola if fila.get(campo) == valor)
+        return resultados
+
+
+def _abrir(nombre_archivo):
+    """
+    Devuelve la instantánea abierta de la tabla (la reutiliza mientras su
+    archivo no cambie), o None si no existe o no se puede leer.
+    """
+    nombre_instantanea = archivo_instantanea(nombre_archivo)
+    try:
+        estado = os.stat(nombre_instantanea)
+    except FileNotFoundError:
+        return None
+    firma = (estado.st_mtime_ns, estado.st_size, estado.st_ino)
+
+    abierta = _abiertas.get(nombre_archivo)
+    if abierta is not None and abierta[0] == firma:
+        return abierta[1]
+    try:
+        columnas = _Columnas(nombre_instantanea)
+    except Exception as e:
+        print(f"Error al leer la instantánea {nombre_instantanea}: {e}")
+        return None
+    _abiertas[nombre_archivo] = (firma, columnas)
+    return columnas
+
+
+def _leer_cola(nombre_archivo, columnas, tamano):
+    """
+    Lee las filas que se agregaron al CSV después de generar la instantánea.
+    """
+    with open(nombre_archivo, "rb") as archivo:
+        archivo.seek(columnas.tamano)
+        datos = archivo.read(tamano - columnas.tamano)
+    # Una última línea sin salto de línea todavía se está escribiendo: no se lee
+    datos = datos[:datos.rfind(b"\n") + 1]
+    fabricar = almacenamiento.fabrica_filas(nombre_archivo, columnas.campos)
+    return list(formato_csv.filas(datos.decode("utf-8").split("\n"), fabricar))
+
+
+def _vigente(nombre_archivo, columnas, estado, generacion):
+    """
+    Indica si la instantánea sigue sirviendo para el CSV (estado es su
+    os.stat y generacion la leída antes): es el mismo archivo, sin
+    reescribir, y a lo sumo con filas agregadas al final.
+    """
+    if estado.st_ino != columnas.inodo or generacion != columnas.generacion:
+        return False
+    if estado.st_size == columnas.tamano:
+        return estado.st_mtime_ns == columnas.modificado
+    if estado.st_size < columnas.tamano:
+        return False
+    if columnas.tamano == 0:
+        return True
+    # Si solo se agregaron filas, lo que cubre la instantánea sigue terminando en un salto de línea
+    with open(nombre_archivo, "rb") as archivo:
+        archivo.seek(columnas.tamano - 1)
+        return archivo.read(1) == b"\n"
+
+
+def cargar(nombre_archivo="prestamos.csv"):
+    """
+    Devuelve la tabla leída desde su instantánea (TablaColumnar), o None si
+    no hay instantánea vigente (no existe, o el CSV se reescribió después
+    de generarla). Incluye lo que agregó o cambió la transacción abierta.
+    """
+    if almacenamiento.motor_sqlite() is not None:
+        return None
+    almacenamiento.asegurar_recuperacion()
+    columnas = _abrir(nombre_archivo)
+    if columnas is None:
+        return None
+
+    reemplazo, agregadas = almacenamiento.filas_en_transaccion(nombre_archivo)
+    if reemplazo is not None:
+        return None
+    try:
+        generacion = transacciones.generacion(nombre_archivo)
+        estado = os.stat(nombre_archivo)
+        if not _vigente(nombre_archivo, columnas, estado, generacion):
+            return None  # el CSV se reescribió: la instantánea quedó vieja
+    except FileNotFoundError:
+        return None
+
+    try:
+        cola = _leer_cola(nombre_archivo, columnas, estado.st_size) if estado.st_size > columnas.tamano else []
+    except Exception as e:
+        print(f"Error al leer {nombre_archivo}: {e}")
+        return None
+
+    cambios = almacenamiento.cambios_por_clave(nombre_archivo)
+    cola = [almacenamiento.con_cambios(fila, cambios[fila.get(columnas.campos[0])])
+            if fila.get(columnas.campos[0]) in cambios else fila
+            for fila in cola + list(agregadas)]
+    return TablaColumnar(columnas, cola, cambios)
+
+
+def leer_tabla(nombre_archivo="prestamos.csv"):
+    """
+    Devuelve las filas de la tabla: desde la instantánea si está vigente
+    (sin leer todo el CSV) o, si no, con almacenamiento.leer_tabla.
+    El resultado se usa como una lista de solo lectura.
+    """
+    tabla = cargar(nombre_archivo)
+    if tabla is not None:
+        return tabla
+    return almacenamiento.leer_tabla(nombre_archivo)
+
+
+if __name__ == "__main__":
+    cantidad = generar_instantanea("prestamos.csv")
+    if cantidad is not None:
+        print(f"\n✓ Instantánea generada: {archivo_instantanea('prestamos.csv')} ({cantidad} filas)")
@@ -0,0 +1,193 @@
+"""
+Módulo de lectura perezosa de tablas CSV con mmap
+Mapea el archivo en memoria en lugar de leerlo y convertir todas sus
+filas: una fila se arma (registro o diccionario, igual que en
+almacenamiento.py) recién cuando se pide.
+
+- TablaMapeada(nombre_archivo)[i] devuelve la fila i; la tabla de
+  posiciones de las filas se arma la primera vez que se accede por número.
+- filtrar(campo, valor) busca el valor directamente en los bytes del
+  archivo y solo arma las filas que coinciden, así listar los pocos
+  préstamos pendientes de un historial grande no recorre todas las filas
+  en Python.
+
+Los cambios pendientes (archivo .delta y transacción abierta) se aplican
+igual que en almacenamiento.leer_tabla.
+"""
+import mmap
+import os
+from array import array
+from collections.abc import Sequence
+
+import almacenamiento
+import formato_csv
+import indices
+import instantanea
+
+
+class TablaMapeada(Sequence):
+    """
+    Vista de solo lectura de una tabla CSV mapeada en memoria.
+    Se usa como una lista de filas; conviene cerrarla al terminar
+    (o usarla con with).
+    """
+
+    def __init__(self, nombre_archivo):
+        almacenamiento.asegurar_recuperacion()
+        self.nombre_archivo = nombre_archivo
+        self._posiciones = None
+        self._archivo = open(nombre_archivo, "rb")
+        try:
+            if os.fstat(self._archivo.fileno()).st_size == 0:
+                self._datos = b""  # mmap no acepta archivos vacíos
+            else:
+                self._datos = mmap.mmap(self._archivo.fileno(), 0, access=mmap.ACCESS_READ)
+        except Exception:
+            self._archivo.close()
+            raise
+
+        fin = self._fin_de_linea(0)
+        self.encabezados = formato_csv.dividir(self._datos[:fin].decode("utf-8").strip())
+        self._inicio_filas = fin + 1
+        self._fabricar = almacenamiento.fabrica_filas(nombre_archivo, self.encabezados)
+        self._cambios = almacenamiento.cambios_por_clave(nombre_archivo)
+
+    def _fin_de_linea(self, inicio):
+        """
+        Posición del salto de línea que termina la línea que empieza en
+        inicio (o el final del archivo si es la última).
+        """
+        fin = self._datos.find(b"\n", inicio)
+        return len(self._datos) if fin == -1 else fin
+
+    def _armar_fila(self, inicio, fin):
+        """
+        Convierte la línea entre inicio y fin en una fila con sus cambios pendientes.
+        """
+        fila = self._fabricar(formato_csv.dividir(self._datos[inicio:fin].decode("utf-8").strip()))
+        cambios = self._cambios.get(next(iter(fila.values())))
+        return almacenamiento.con_cambios(fila, cambios) if cambios else fila
+
+    def posiciones(self):
+        """
+        Devuelve la tabla (array de enteros) con la posición en bytes donde
+        empieza cada fila no vacía. Se arma una sola vez.
+        """
+        if self._posiciones is None:
+            posiciones = array("q")
+            inicio = self._inicio_filas
+            total = len(self._datos)
+            while inicio < total:
+                fin = self._fin_de_linea(inicio)
+                if self._datos[inicio:fin].strip():
+                    posiciones.append(inicio)
+                inicio = fin + 1
+            self._posiciones = posiciones
+        return self._posiciones
+
+    def __len__(self):
+        return len(self.posiciones())
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return [self[j] for j in range(*i.indices(len(self)))]
+        inicio = self.posiciones()[i]
+        return self._armar_fila(inicio, self._fin_de_linea(inicio))
+
+    def filtrar(self, campo, valor):
+        """
+        Devuelve, en el orden del archivo, las filas cuyo campo vale valor.
+        Busca los bytes del valor en el archivo y solo arma las filas donde
+        aparece en la columna del campo. Las filas con cambios pendientes
+        se comparan ya con los cambios aplicados.
+        """
+        columna = self.encabezados.index(campo)
+        buscado = valor.encode("utf-8")
+        resultados = []
+        claves = set()
+
+        if not buscado or b"," in buscado or b'"' in buscado:
+            # Un valor vacío, o uno que en el archivo va entre comillas, no se
+            # puede buscar en los bytes: se revisan todas las filas
+            candidatas = iter(self)
+        else:
+            candidatas = self._filas_con_valor(columna, buscado)
+
+        for fila in candidatas:
+            claves.add(next(iter(fila.values())))
+            if fila.get(campo) == valor:
+                resultados.append(fila)
+
+        # Filas que no tenían el valor en el archivo pero sí después de un cambio
+        for clave, campos in self._cambios.items():
+            if campos.get(campo) == valor and clave not in claves:
+                fila = indices.buscar_fila(self.nombre_archivo, clave)
+                if fila is not None and fila.get(campo) == valor:
+                    resultados.append(fila)
+        return resultados
+
+    def _filas_con_valor(self, columna, buscado):
+        """
+        Recorre las apariciones de buscado en el archivo y devuelve las filas
+        (con sus cambios aplicados) donde está en la columna pedida.
+        """
+        datos = self._datos
+        ultima_linea = -1
+        posicion = datos.find(buscado, self._inicio_filas)
+        while posicion != -1:
+            inicio = datos.rfind(b"\n", 0, posicion) + 1
+            fin = self._fin_de_linea(posicion)
+            if inicio != ultima_linea:
+                ultima_linea = inicio
+                valores = formato_csv.dividir_bytes(datos[inicio:fin].strip())
+                if len(valores) > columna and valores[columna] == buscado:
+                    yield self._armar_fila(inicio, fin)
+            posicion = datos.find(buscado, fin + 1)
+
+    def cerrar(self):
+        """
+        Libera el mapeo y cierra el archivo.
+        """
+        if isinstance(self._datos, mmap.mmap):
+            self._datos.close()
+        self._archivo.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *excepcion):
+        self.cerrar()
+
+
+def filtrar(nombre_archivo, campo, valor):
+    """
+    Devuelve las filas de la tabla cuyo campo vale valor, sin leer ni
+    convertir el resto de las filas. Incluye lo que agregó o cambió la
+    transacción abierta. Con el motor SQLite usa sus índices, y si hay
+    una instantánea por columnas vigente (ver instantanea.py) la usa en
+    lugar de mapear el CSV.
+    """
+    motor = almacenamiento.motor_sqlite()
+    if motor is not None:
+        return motor.buscar_filas(nombre_archivo, campo, valor)
+
+    reemplazo, agregadas = almacenamiento.filas_en_transaccion(nombre_archivo)
+    if reemplazo is not None:
+        return [fila for fila in reemplazo if fila.get(campo) == valor]
+
+    tabla = instantanea.cargar(nombre_archivo) if nombre_archivo == "prestamos.csv" else None
+    if tabla is not None:
+        return tabla.filtrar(campo, valor)  # ya incluye las filas agregadas
+
+    try:
+        with TablaMapeada(nombre_archivo) as tabla:
+            resultados = tabla.filtrar(campo, valor)
+    except FileNotFoundError:
+        print(f"Error: No se encontró el archivo {nombre_archivo}")
+        return []
+    except Exception as e:
+        print(f"Error al leer {nombre_archivo}: {e}")
+        return []
+
+    resultados.extend(fila for fila in agregadas if fila.get(campo) == valor)
+    return resultados
@@ -2,6 +2,7 @@ import usuarios
 import equipos
 import prestamos
 import reportes
+import vencimientos
 # Estas importaciones permiten usar funciones que están en otros archivos:
 # - usuarios.py
 # - equipos.py
@@ -21,7 +22,9 @@ def mostrar_menu_principal():
     print("2. Gestión de Préstamos")
     print("3. Consultar Historial")
     print("4. Exportar Reporte CSV")
-    print("5. Salir")
+    print("5. Exportar Reportes de Varios Meses")
+    print("6. Ver Estadísticas de Préstamos")
+    print("7. Salir")
     print("\n" + "-"*60)
     # Esta función solo muestra las opciones principales al usuario.
 
@@ -66,9 +69,12 @@ def menu_prestamos():
         print("\n1. Registrar solicitud de préstamo")
         print("2. Aprobar/Rechazar préstamo")
         print("3. Registrar devolución de equipo")
-        print("4. Volver al menú principal")
+        print("4. Aprobar/Rechazar préstamos en lote")
+        print("5. Registrar devoluciones en lote (manifiesto)")
+        print("6. Ver préstamos vencidos")
+        print("7. Volver al menú principal")
         
-        opcion = input("\nSeleccione una opción (1-4): ").strip()
+        opcion = input("\nSeleccione una opción (1-7): ").strip()
 
         if opcion == "1":
             prestamos.registrar_solicitud_prestamo()
@@ -80,6 +86,15 @@ def menu_prestamos():
             prestamos.registrar_devolucion()
             # Para registrar cuándo devuelven un equipo.
         elif opcion == "4":
+            prestamos.aprobar_rechazar_en_lote()
+            # Para procesar muchas solicitudes juntas (por ejemplo al inicio del semestre).
+        elif opcion == "5":
+            prestamos.registrar_devoluciones_en_lote()
+            # Para cuando un grupo completo devuelve sus equipos a la vez.
+        elif opcion == "6":
+            prestamos.listar_prestamos_vencidos()
+            # Muestra los préstamos que ya deberían haberse devuelto.
+        elif opcion == "7":
             break
             # Regresa al menú principal
         else:
@@ -95,10 +110,23 @@ def main():
         return  
         # Si iniciar_sesion() devuelve False, el programa se termina.
 
-    # Si el login fue correcto, se entra al menú principal
+    # Si el login fue correcto, se arranca el aviso de préstamos vencidos
+    # (ver vencimientos.py) y se entra al menú principal
+    vencimientos.iniciar()
+    try:
+        menu_principal()
+    finally:
+        vencimientos.detener()
+
+def menu_principal():
+    """
+    Repite el menú principal hasta que el usuario elige Salir
+    """
     while True:
+        vencimientos.sincronizar()
+        # Toma los préstamos aprobados o devueltos desde otra terminal
         mostrar_menu_principal()  
-        opcion = input("Seleccione una opción (1-5): ").strip()
+        opcion = input("Seleccione una opción (1-7): ").strip()
 
         if opcion == "1":
             menu_equipos()  # Va al submenú de equipos
@@ -111,6 +139,12 @@ def main():
             reportes.exportar_reporte_csv()
             # Crea un archivo CSV con la información del sistema
         elif opcion == "5":
+            reportes.exportar_reportes_varios_meses()
+            # Crea un archivo CSV por cada mes de un año o de un rango
+        elif opcion == "6":
+            reportes.mostrar_estadisticas()
+            # Muestra el tablero con las estadísticas de todo el historial
+        elif opcion == "7":
             # Mensaje de salida
             print("\n" + "="*60)
             print("Gracias por usar el Sistema de Gestión TechLab")
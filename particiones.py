@@ -0,0 +1,209 @@
+"""
+Módulo de particiones mensuales de préstamos devueltos
+Guarda los préstamos DEVUELTOS separados por año y mes, en la carpeta
+particiones/ (un archivo devueltos_AAAA_MM.csv por mes, con las mismas
+columnas que prestamos.csv). Así el reporte de un mes lee solo las
+filas de ese mes y no todo el historial.
+
+- registrar_devolucion (y las devoluciones en lote) agregan la fila del
+  préstamo devuelto a la partición de su mes, dentro de la misma
+  transacción que la devolución.
+- La primera vez que se pide una partición se generan todas recorriendo
+  el historial completo (prestamos.csv y los préstamos archivados, ver
+  archivado.py). Para regenerarlas desde cero:
+      python particiones.py
+
+huella_particion(anio, mes) resume el contenido de una partición (cantidad
+de filas y hash); reportes.py la usa para no regenerar reportes de meses
+que no cambiaron.
+
+Con el motor SQLite no se usan archivos: la consulta usa el índice
+(anio, mes) de la base de datos.
+"""
+import hashlib
+import os
+
+import almacenamiento
+import archivado
+import concurrencia
+
+CARPETA_PARTICIONES = "particiones"
+
+# Se crea al terminar de generar todas las particiones (si falta, se regeneran)
+ARCHIVO_MARCA = os.path.join(CARPETA_PARTICIONES, "generadas")
+
+
+def archivo_particion(anio, mes):
+    """
+    Devuelve el nombre del archivo de la partición de un año y mes
+    (mes con dos dígitos, como en prestamos.csv).
+    """
+    return os.path.join(CARPETA_PARTICIONES, f"devueltos_{anio}_{mes}.csv")
+
+
+def _periodo_valido(anio, mes):
+    """
+    Indica si anio y mes se pueden usar en el nombre de un archivo de partición.
+    """
+    return anio.isdigit() and mes.isdigit()
+
+
+def particiones_generadas():
+    """
+    Indica si las particiones ya se generaron.
+    """
+    return os.path.exists(ARCHIVO_MARCA)
+
+
+def reconstruir_particiones():
+    """
+    Vuelve a generar todas las particiones recorriendo el historial
+    completo (prestamos.csv y los préstamos archivados). Las particiones
+    de meses que ya no tienen devoluciones quedan vacías.
+    Se hace con el bloqueo entre procesos tomado (ver concurrencia.py),
+    así ninguna devolución de otra terminal queda afuera, y las particiones
+    se guardan en una transacción: si el registro tiene transacciones
+    anteriores sobre ellas, al repetirlas se repite también esta después.
+    Devuelve la cantidad de particiones generadas, o None si hubo un error.
+    """
+    if almacenamiento.motor_sqlite() is not None:
+        return 0  # en SQLite se usa el índice (anio, mes)
+
+    if not concurrencia.bloquear():
+        return None
+    try:
+        almacenamiento.iniciar_transaccion()
+        por_mes = {}
+        for prestamo in archivado.recorrer_historial():
+            anio, mes = prestamo.get("anio", ""), prestamo.get("mes", "")
+            if prestamo.get("estado") == "DEVUELTO" and _periodo_valido(anio, mes):
+                por_mes.setdefault((anio, mes), []).append(prestamo)
+
+        os.makedirs(CARPETA_PARTICIONES, exist_ok=True)
+        if os.path.exists(ARCHIVO_MARCA):
+            os.remove(ARCHIVO_MARCA)
+
+        encabezados = almacenamiento.ENCABEZADOS_PRESTAMOS
+        nuevos = set()
+        for (anio, mes), filas in por_mes.items():
+            nombre_archivo = archivo_particion(anio, mes)
+            nuevos.add(os.path.basename(nombre_archivo))
+            almacenamiento.guardar_tabla(nombre_archivo, encabezados, filas)
+
+        for nombre in os.listdir(CARPETA_PARTICIONES):
+            if nombre.startswith("devueltos_") and nombre.endswith(".csv") and nombre not in nuevos:
+                almacenamiento.guardar_tabla(os.path.join(CARPETA_PARTICIONES, nombre), encabezados, [])
+
+        if not almacenamiento.confirmar_transaccion():
+            return None
+        # La marca se crea antes de soltar el bloqueo: desde ahí las
+        # devoluciones nuevas se agregan a su partición (agregar_devolucion)
+        with open(ARCHIVO_MARCA, "w", encoding="utf-8") as archivo:
+            archivo.write(f"{len(por_mes)}\n")
+        return len(por_mes)
+
+    except Exception as e:
+        if almacenamiento.en_transaccion():
+            almacenamiento.cancelar_transaccion()
+        print(f"Error al generar las particiones: {e}")
+        return None
+
+    finally:
+        concurrencia.desbloquear()
+
+
+def agregar_devolucion(prestamo):
+    """
+    Agrega un préstamo recién devuelto (ya con estado DEVUELTO) a la
+    partición de su mes. Se llama dentro de la transacción de la devolución.
+    Si las particiones todavía no se generaron no hace nada: cuando se
+    generen ya van a incluir esta devolución.
+    Devuelve True si se guardó bien, False si hubo un error.
+    """
+    if almacenamiento.motor_sqlite() is not None or not particiones_generadas():
+        return True
+    anio, mes = prestamo.get("anio", ""), prestamo.get("mes", "")
+    if not _periodo_valido(anio, mes):
+        return True
+    return almacenamiento.agregar_fila(archivo_particion(anio, mes), almacenamiento.ENCABEZADOS_PRESTAMOS, prestamo)
+
+
+def recorrer_particion(anio, mes):
+    """
+    Devuelve los préstamos DEVUELTOS de un año y mes (mes con dos dígitos)
+    de a uno (generador), leyendo solo la partición de ese mes, en el orden
+    en que están guardados: por ID los que se generaron juntos y después
+    las devoluciones en el orden en que se registraron.
+    """
+    motor = almacenamiento.motor_sqlite()
+    if motor is not None:
+        yield from motor.buscar_devueltos_del_mes(anio, mes)
+        return
+
+    if not _periodo_valido(anio, mes):
+        return
+    if not particiones_generadas() and reconstruir_particiones() is None:
+        return
+
+    nombre_archivo = archivo_particion(anio, mes)
+    if not almacenamiento.existe_tabla(nombre_archivo):
+        return
+    for fila in almacenamiento.recorrer_tabla(nombre_archivo):
+        if fila.get("estado") == "DEVUELTO":
+            yield fila
+
+
+def leer_particion(anio, mes):
+    """
+    Devuelve la lista de préstamos DEVUELTOS de un año y mes (mes con dos
+    dígitos), en el mismo orden que recorrer_particion.
+    """
+    return list(recorrer_particion(anio, mes))
+
+
+def huella_particion(anio, mes):
+    """
+    Devuelve un texto "cantidad:hash" que cambia cada vez que se agrega o
+    modifica una devolución del año y mes (mes con dos dígitos).
+    En los CSV se calcula sobre los bytes de la partición y de su archivo
+    de cambios, sin convertir las filas. Devuelve None si hubo un error.
+    """
+    motor = almacenamiento.motor_sqlite()
+    if motor is not None:
+        filas = motor.buscar_devueltos_del_mes(anio, mes)
+        resumen = hashlib.sha256()
+        for fila in filas:
+            resumen.update((",".join(str(valor) for valor in fila.values()) + "\n").encode("utf-8"))
+        return f"{len(filas)}:{resumen.hexdigest()}"
+
+    if not _periodo_valido(anio, mes):
+        return None
+    if not particiones_generadas() and reconstruir_particiones() is None:
+        return None
+
+    almacenamiento.asegurar_recuperacion()
+    nombre_archivo = archivo_particion(anio, mes)
+    resumen = hashlib.sha256()
+    cantidad = 0
+    try:
+        with open(nombre_archivo, "rb") as archivo:
+            archivo.readline()  # encabezados
+            for linea in archivo:
+                if linea.strip():
+                    cantidad += 1
+                resumen.update(linea)
+        resumen.update(b"\0")
+        with open(almacenamiento.archivo_cambios(nombre_archivo), "rb") as archivo:
+            resumen.update(archivo.read())
+    except FileNotFoundError:
+        pass  # mes sin devoluciones, o partición sin cambios pendientes
+    except Exception as e:
+        print(f"Error al leer {nombre_archivo}: {e}")
+        return None
+    return f"{cantidad}:{resumen.hexdigest()}"
+
+
+if __name__ == "__main__":
+    cantidad = reconstruir_particiones()
+    if cantidad is not None:
+        print(f"\n✓ Particiones generadas: {cantidad}")
@@ -2,8 +2,18 @@
 Módulo para gestión de préstamos de equipos
 Maneja solicitudes, aprobaciones, rechazos y devoluciones
 """
-rom datetime import datetime, timedelta
+from datetime import date, datetime, timedelta
 import equipos
+import almacenamiento
+import analitica
+import archivado
+import concurrencia
+import fechas
+import indices
+import instantanea
+import lector_mapeado
+import particiones
+import vencimientos
 
 # =========================================================
 # prestamos_comentado.py
@@ -15,72 +25,157 @@ def leer_prestamos():
     """
     Lee prestamos.csv y devuelve una lista de diccionarios.
     Cada diccionario representa un préstamo.
+    Si hay una instantánea por columnas vigente (ver instantanea.py) se usa
+    esa, sin leer todo el CSV; si el archivo no cambió desde la última
+    lectura, se usa la copia en memoria.
     """
-    prestamos = []  # lista donde guardamos los préstamos
-    try:
-        with open("prestamos.csv", "r", encoding="utf-8") as archivo:
-            # La primera línea se asume que son los encabezados
-            encabezados = archivo.readline().strip().split(",")
-
-            # Recorrer cada línea del archivo (cada préstamo)
-            for linea in archivo:
-                linea = linea.strip()
-                if linea:  # si la línea no está vacía
-                    valores = linea.split(",")  # separar por comas
-                    prestamo = {}
-                    # Construir el diccionario: encabezado -> valor correspondiente
-                    for i, encabezado in enumerate(encabezados):
-                        prestamo[encabezado] = valores[i]
-                    prestamos.append(prestamo)  # añadir a la lista
-    except FileNotFoundError:
-        # Si no existe el archivo, avisamos y devolvemos lista vacía
-        print("Error: No se encontró el archivo prestamos.csv")
-    except Exception as e:
-        # Cualquier otro error lo mostramos (útil para depurar)
-        print(f"Error al leer préstamos: {e}")
-
-    return prestamos
+    return instantanea.leer_tabla("prestamos.csv")
 
 def guardar_prestamos(prestamos):
     """
     Guarda la lista completa de préstamos en prestamos.csv.
     Sobrescribe el archivo con los datos actuales.
     """
-    try:
-        with open("prestamos.csv", "w", encoding="utf-8") as archivo:
-            # Definimos los encabezados que queremos en el CSV
-            encabezados = [
-                "prestamo_id", "equipo_id", "nombre_equipo", "usuario_prestatario",
-                "tipo_usuario", "fecha_solicitud", "fecha_prestamo", "fecha_devolucion",
-                "dias_autorizados", "dias_reales_usados", "retraso", "estado", "mes", "anio"
-            ]
-            archivo.write(",".join(encabezados) + "\n")  # escribir primera línea
-
-            # Escribir cada préstamo en una línea del CSV
-            for prestamo in prestamos:
-                valores = [
-                    prestamo.get("prestamo_id", ""),
-                    prestamo.get("equipo_id", ""),
-                    prestamo.get("nombre_equipo", ""),
-                    prestamo.get("usuario_prestatario", ""),
-                    prestamo.get("tipo_usuario", ""),
-                    prestamo.get("fecha_solicitud", ""),
-                    prestamo.get("fecha_prestamo", ""),
-                    prestamo.get("fecha_devolucion", ""),
-                    prestamo.get("dias_autorizados", ""),
-                    prestamo.get("dias_reales_usados", ""),
-                    prestamo.get("retraso", ""),
-                    prestamo.get("estado", ""),
-                    prestamo.get("mes", ""),
-                    prestamo.get("anio", "")
-                ]
-                archivo.write(",".join(valores) + "\n")
-
-        return True
-    except Exception as e:
-        # Si ocurre un error al escribir, mostrar y devolver False
-        print(f"Error al guardar préstamos: {e}")
-        return False
+    return almacenamiento.guardar_tabla("prestamos.csv", almacenamiento.ENCABEZADOS_PRESTAMOS, prestamos)
+
+def agregar_prestamo(prestamo):
+    """
+    Agrega un préstamo nuevo al final de prestamos.csv.
+    No lee ni reescribe los préstamos anteriores.
+    """
+    return almacenamiento.agregar_fila("prestamos.csv", almacenamiento.ENCABEZADOS_PRESTAMOS, prestamo)
+
+def actualizar_prestamo(prestamo_id, cambios, version=None):
+    """
+    Cambia algunos campos de un préstamo existente.
+    El cambio se agrega a prestamos.csv.delta; el CSV se compacta más adelante.
+    Si se pasa version (la del préstamo que se leyó, ver concurrencia.py)
+    y otra terminal cambió el préstamo mientras tanto, no se guarda.
+    """
+    return almacenamiento.actualizar_fila("prestamos.csv", almacenamiento.ENCABEZADOS_PRESTAMOS,
+                                          prestamo_id, cambios, version)
+
+def registrar_prestamo_devuelto(prestamo, cambios):
+    """
+    Guarda los cambios de una devolución (estado DEVUELTO, fecha, días y
+    retraso) y agrega el préstamo a la partición de su mes (ver particiones.py).
+    Si otra terminal cambió el préstamo desde que se leyó, no se guarda.
+    Devuelve True si se guardó bien, False si hubo un error.
+    """
+    return (actualizar_prestamo(prestamo.get("prestamo_id"), cambios, concurrencia.version_fila(prestamo)) and
+            particiones.agregar_devolucion(almacenamiento.con_cambios(prestamo, cambios)))
+
+def obtener_prestamo_por_id(prestamo_id):
+    """
+    Devuelve el préstamo con ese ID o None si no existe.
+    Usa el índice prestamos.csv.idx para leer solo esa fila; si no está
+    en prestamos.csv lo busca entre los préstamos archivados.
+    """
+    prestamo = indices.buscar_fila("prestamos.csv", prestamo_id)
+    if prestamo is None:
+        prestamo = archivado.buscar_prestamo(prestamo_id)
+    return prestamo
+
+# =========================================================
+# Préstamos abiertos y secuencia de IDs
+# prestamos_abiertos.csv guarda solo los préstamos PENDIENTES o APROBADOS
+# (como mucho uno por equipo) y secuencias.csv el último número de préstamo
+# usado. Así registrar una solicitud no necesita leer el historial completo.
+# =========================================================
+
+ARCHIVO_ABIERTOS = "prestamos_abiertos.csv"
+ARCHIVO_SECUENCIAS = "secuencias.csv"
+
+def reconstruir_prestamos_abiertos():
+    """
+    Vuelve a generar prestamos_abiertos.csv y secuencias.csv
+    recorriendo prestamos.csv completo (los préstamos archivados están
+    cerrados, solo cuentan para el último ID usado).
+    Lee y guarda dentro de una transacción, así ninguna otra terminal
+    agrega un préstamo entre la lectura y la escritura.
+    """
+    almacenamiento.iniciar_transaccion()
+    prestamos = leer_prestamos()
+
+    abiertos = []
+    ultimo_id = max(len(prestamos), archivado.ultimo_numero())
+    for prestamo in prestamos:
+        if prestamo.get("estado") in ["PENDIENTE", "APROBADO"]:
+            abiertos.append({
+                "equipo_id": prestamo.get("equipo_id"),
+                "prestamo_id": prestamo.get("prestamo_id"),
+                "estado": prestamo.get("estado")
+            })
+        # El ID tiene formato P0001: tomamos el número más alto usado
+        try:
+            ultimo_id = max(ultimo_id, int(prestamo.get("prestamo_id", "")[1:]))
+        except ValueError:
+            pass
+
+    secuencias = [{"tabla": "prestamos", "ultimo_id": str(ultimo_id)}]
+    if (almacenamiento.guardar_tabla(ARCHIVO_ABIERTOS, almacenamiento.ENCABEZADOS_ABIERTOS, abiertos) and
+            almacenamiento.guardar_tabla(ARCHIVO_SECUENCIAS, almacenamiento.ENCABEZADOS_SECUENCIAS, secuencias)):
+        return almacenamiento.confirmar_transaccion()
+    almacenamiento.cancelar_transaccion()
+    return False
+
+def _asegurar_prestamos_abiertos():
+    """
+    Si todavía no existen prestamos_abiertos.csv o secuencias.csv, los genera.
+    """
+    if not (almacenamiento.existe_tabla(ARCHIVO_ABIERTOS) and almacenamiento.existe_tabla(ARCHIVO_SECUENCIAS)):
+        reconstruir_prestamos_abiertos()
+
+def obtener_prestamo_abierto(equipo_id):
+    """
+    Devuelve el préstamo PENDIENTE o APROBADO del equipo
+    (diccionario con equipo_id, prestamo_id y estado) o None si no tiene.
+    """
+    _asegurar_prestamos_abiertos()
+    return almacenamiento.buscar_por_clave(ARCHIVO_ABIERTOS, equipo_id)
+
+def guardar_prestamo_abierto(equipo_id, prestamo_id, estado):
+    """
+    Agrega o actualiza el préstamo abierto de un equipo.
+    """
+    _asegurar_prestamos_abiertos()
+    if obtener_prestamo_abierto(equipo_id) is not None:
+        return almacenamiento.actualizar_fila(ARCHIVO_ABIERTOS, almacenamiento.ENCABEZADOS_ABIERTOS, equipo_id,
+                                              {"prestamo_id": prestamo_id, "estado": estado})
+    return almacenamiento.agregar_fila(ARCHIVO_ABIERTOS, almacenamiento.ENCABEZADOS_ABIERTOS,
+                                       {"equipo_id": equipo_id, "prestamo_id": prestamo_id, "estado": estado})
+
+def cerrar_prestamo_abierto(equipo_id):
+    """
+    Quita el préstamo abierto de un equipo (cuando se rechaza o se devuelve).
+    """
+    return cerrar_prestamos_abiertos([equipo_id])
+
+def cerrar_prestamos_abiertos(equipo_ids):
+    """
+    Quita de una sola vez los préstamos abiertos de varios equipos.
+    """
+    _asegurar_prestamos_abiertos()
+    return almacenamiento.borrar_filas(ARCHIVO_ABIERTOS, almacenamiento.ENCABEZADOS_ABIERTOS, equipo_ids)
+
+def siguiente_id_prestamo():
+    """
+    Reserva y devuelve el siguiente ID de préstamo (P0001, P0002, ...).
+    Devuelve None si no se pudo guardar la secuencia.
+    """
+    _asegurar_prestamos_abiertos()
+    secuencia = almacenamiento.buscar_por_clave(ARCHIVO_SECUENCIAS, "prestamos")
+    nuevo_id = int(secuencia.get("ultimo_id", "0")) + 1 if secuencia else 1
+
+    if secuencia:
+        guardado = almacenamiento.actualizar_fila(ARCHIVO_SECUENCIAS, almacenamiento.ENCABEZADOS_SECUENCIAS,
+                                                  "prestamos", {"ultimo_id": str(nuevo_id)})
+    else:
+        guardado = almacenamiento.agregar_fila(ARCHIVO_SECUENCIAS, almacenamiento.ENCABEZADOS_SECUENCIAS,
+                                               {"tabla": "prestamos", "ultimo_id": str(nuevo_id)})
+    if not guardado:
+        return None
+    return f"P{nuevo_id:04d}"  # formato P0001, P0002, ...
 
 def obtener_dias_maximos(tipo_usuario):
     """
@@ -103,12 +198,9 @@ def validar_fecha(fecha_str):
     """
     Verifica que la cadena fecha_str tenga formato 'YYYY-MM-DD'.
     Devuelve True si es válida, False si no.
+    (Ver fechas.py: usa date.fromisoformat y recuerda las últimas fechas.)
     """
-    try:
-        datetime.strptime(fecha_str, "%Y-%m-%d")
-        return True
-    except ValueError:
-        return False
+    return fechas.es_valida(fecha_str)
 
 
 def calcular_dias_diferencia(fecha_inicio, fecha_fin):
@@ -117,13 +209,95 @@ def calcular_dias_diferencia(fecha_inicio, fecha_fin):
     Ambas en formato 'YYYY-MM-DD'. Devuelve un entero (días).
     Si las fechas no son válidas devuelve 0.
     """
-    try:
-        fecha1 = datetime.strptime(fecha_inicio, "%Y-%m-%d")
-        fecha2 = datetime.strptime(fecha_fin, "%Y-%m-%d")
-        diferencia = fecha2 - fecha1
-        return diferencia.days
-    except ValueError:
-        return 0
+    diferencia = fechas.diferencia_dias(fecha_inicio, fecha_fin)
+    return 0 if diferencia is None else diferencia
+
+def validar_solicitud(equipo, tipo_usuario, fecha_prestamo, dias_solicitados):
+    """
+    Revisa una solicitud con las mismas reglas que registrar_solicitud_prestamo
+    (equipo disponible y sin préstamos abiertos, tipo de usuario, fecha y días).
+    Devuelve el motivo por el que no se puede registrar, o None si es válida.
+    """
+    if equipo is None:
+        return "no existe el equipo"
+    if equipo.get("estado_actual") != "DISPONIBLE":
+        return f"el equipo no está disponible (estado actual: {equipo.get('estado_actual')})"
+    abierto = obtener_prestamo_abierto(equipo.get("equipo_id"))
+    if abierto:
+        return f"el equipo tiene un préstamo {abierto.get('estado').lower()} sin resolver"
+    dias_maximos = obtener_dias_maximos(tipo_usuario)
+    if dias_maximos == 0:
+        return "tipo de usuario inválido (ESTUDIANTE, INSTRUCTOR o ADMINISTRATIVO)"
+    if not validar_fecha(fecha_prestamo):
+        return "fecha de préstamo inválida (use YYYY-MM-DD)"
+    if dias_solicitados <= 0:
+        return "los días solicitados deben ser mayor a 0"
+    if dias_solicitados > dias_maximos:
+        return f"los {tipo_usuario.lower()}s solo pueden solicitar máximo {dias_maximos} días"
+    return None
+
+
+def guardar_solicitud(equipo, usuario_prestatario, tipo_usuario, fecha_prestamo, dias_solicitados):
+    """
+    Guarda una solicitud de préstamo PENDIENTE de un equipo, con los datos
+    ya validados (fecha válida, días permitidos para el tipo de usuario).
+    equipo es la fila que se leyó al validar: si otra terminal la cambió
+    o registró un préstamo para ese equipo mientras tanto, no se guarda.
+    Devuelve (ID del préstamo nuevo, mensaje), con el ID None y el motivo
+    en el mensaje si no se pudo guardar.
+    """
+    equipo_id = equipo.get("equipo_id")
+
+    # El ID, el préstamo y el préstamo abierto se guardan juntos, en una sola transacción
+    almacenamiento.iniciar_transaccion()
+
+    # Con la transacción abierta ninguna otra terminal escribe: se vuelve a
+    # comprobar que el equipo siga libre (pudo cambiar mientras se pedían los datos)
+    if obtener_prestamo_abierto(equipo_id):
+        almacenamiento.cancelar_transaccion()
+        return None, "otro usuario registró un préstamo para este equipo mientras tanto"
+    if not almacenamiento.verificar_version("equipos.csv", equipo_id, concurrencia.version_fila(equipo)):
+        almacenamiento.cancelar_transaccion()
+        return None, "otro usuario modificó el equipo mientras tanto"
+
+    prestamo_id = siguiente_id_prestamo()  # número siguiente, sin leer el historial
+    if prestamo_id is None:
+        almacenamiento.cancelar_transaccion()
+        return None, "error al guardar los cambios"
+
+    fecha_solicitud = datetime.now().strftime("%Y-%m-%d")  # fecha de hoy
+
+    # Extraer mes y año de la fecha de préstamo (útil para reportes)
+    fecha_obj = fechas.fecha(fecha_prestamo)
+    mes = str(fecha_obj.month).zfill(2)
+    anio = str(fecha_obj.year)
+
+    # Crear diccionario con toda la info del préstamo
+    nuevo_prestamo = {
+        "prestamo_id": prestamo_id,
+        "equipo_id": equipo_id,
+        "nombre_equipo": equipo.get("nombre_equipo"),
+        "usuario_prestatario": usuario_prestatario,
+        "tipo_usuario": tipo_usuario,
+        "fecha_solicitud": fecha_solicitud,
+        "fecha_prestamo": fecha_prestamo,
+        "fecha_devolucion": "",
+        "dias_autorizados": str(dias_solicitados),
+        "dias_reales_usados": "",
+        "retraso": "",
+        "estado": "PENDIENTE",  # inicialmente pendiente de aprobación
+        "mes": mes,
+        "anio": anio
+    }
+
+    # Añadir al final del archivo
+    if (agregar_prestamo(nuevo_prestamo) and
+            guardar_prestamo_abierto(equipo_id, prestamo_id, "PENDIENTE") and
+            almacenamiento.confirmar_transaccion()):
+        return prestamo_id, "registrado"
+    almacenamiento.cancelar_transaccion()
+    return None, "error al guardar los cambios"
+
 
 def registrar_solicitud_prestamo():
     """
@@ -173,13 +347,11 @@ def registrar_solicitud_prestamo():
     # -----------------------------
     # Verificar que no tenga préstamos pendientes
     # -----------------------------
-    prestamos = leer_prestamos()
-    for prestamo in prestamos:
-        if (prestamo.get("equipo_id") == equipo_id and 
-            prestamo.get("estado") in ["PENDIENTE", "APROBADO"]):
-            # Si hay un préstamo pendiente o aprobado, no se puede solicitar otro
-            print(f"\n✗ Error: El equipo tiene un préstamo {prestamo.get('estado').lower()} sin resolver.")
-            return False
+    abierto = obtener_prestamo_abierto(equipo_id)
+    if abierto:
+        # Si hay un préstamo pendiente o aprobado, no se puede solicitar otro
+        print(f"\n✗ Error: El equipo tiene un préstamo {abierto.get('estado').lower()} sin resolver.")
+        return False
 
     # -----------------------------
     # Datos del prestatario
@@ -236,55 +408,25 @@ def registrar_solicitud_prestamo():
         return False
 
     # -----------------------------
-    # Generar ID de préstamo y otros campos
+    # Guardar la solicitud (ID, préstamo y préstamo abierto)
     # -----------------------------
-    prestamos = leer_prestamos()
-    nuevo_id = len(prestamos) + 1  # simple: número siguiente
-    prestamo_id = f"P{nuevo_id:04d}"  # formato P0001, P0002, ...
-
-    fecha_solicitud = datetime.now().strftime("%Y-%m-%d")  # fecha de hoy
-
-    # Extraer mes y año de la fecha de préstamo (útil para reportes)
-    fecha_obj = datetime.strptime(fecha_prestamo, "%Y-%m-%d")
-    mes = str(fecha_obj.month).zfill(2)
-    anio = str(fecha_obj.year)
-
-    # Crear diccionario con toda la info del préstamo
-    nuevo_prestamo = {
-        "prestamo_id": prestamo_id,
-        "equipo_id": equipo_id,
-        "nombre_equipo": equipo.get("nombre_equipo"),
-        "usuario_prestatario": usuario_prestatario,
-        "tipo_usuario": tipo_usuario,
-        "fecha_solicitud": fecha_solicitud,
-        "fecha_prestamo": fecha_prestamo,
-        "fecha_devolucion": "",
-        "dias_autorizados": str(dias_solicitados),
-        "dias_reales_usados": "",
-        "retraso": "",
-        "estado": "PENDIENTE",  # inicialmente pendiente de aprobación
-        "mes": mes,
-        "anio": anio
-    }
-
-    # Añadir y guardar
-    prestamos.append(nuevo_prestamo)
-
-    if guardar_prestamos(prestamos):
-        print(f"\n✓ Solicitud de préstamo '{prestamo_id}' registrada exitosamente!")
-        print(f"Estado: PENDIENTE - Esperando aprobación")
-        return True
-    else:
-        print("\n✗ Error al registrar la solicitud")
+    prestamo_id, mensaje = guardar_solicitud(equipo, usuario_prestatario, tipo_usuario, fecha_prestamo,
+                                             dias_solicitados)
+    if prestamo_id is None:
+        print(f"\n✗ Error al registrar la solicitud: {mensaje}")
         return False
 
+    print(f"\n✓ Solicitud de préstamo '{prestamo_id}' registrada exitosamente!")
+    print(f"Estado: PENDIENTE - Esperando aprobación")
+    return True
+
 
 def listar_prestamos_pendientes():
     """
     Devuelve y muestra los préstamos con estado PENDIENTE.
     """
-    prestamos = leer_prestamos()
-    pendientes = [p for p in prestamos if p.get("estado") == "PENDIENTE"]
+    # Solo se arman las filas PENDIENTE; el resto del archivo no se convierte
+    pendientes = lector_mapeado.filtrar("prestamos.csv", "estado", "PENDIENTE")
 
     if not pendientes:
         print("\nNo hay préstamos pendientes.")
@@ -325,20 +467,11 @@ def aprobar_rechazar_prestamo():
 
     prestamo_id = input("\nIngrese el ID del préstamo a procesar: ").strip()
 
-    prestamos = leer_prestamos()
-    prestamo_encontrado = None
-    indice = -1
-
     # Buscar el préstamo por ID y comprobar que esté PENDIENTE
-    for i, prestamo in enumerate(prestamos):
-        if prestamo.get("prestamo_id") == prestamo_id:
-            if prestamo.get("estado") == "PENDIENTE":
-                prestamo_encontrado = prestamo
-                indice = i
-                break
-            else:
-                print(f"\n✗ El préstamo '{prestamo_id}' no está pendiente.")
-                return False
+    prestamo_encontrado = obtener_prestamo_por_id(prestamo_id)
+    if prestamo_encontrado and prestamo_encontrado.get("estado") != "PENDIENTE":
+        print(f"\n✗ El préstamo '{prestamo_id}' no está pendiente.")
+        return False
 
     if not prestamo_encontrado:
         print(f"\n✗ No se encontró un préstamo pendiente con ID '{prestamo_id}'")
@@ -363,31 +496,49 @@ def aprobar_rechazar_prestamo():
     opcion = input("\nSeleccione una opción (1-2): ").strip()
 
     if opcion == "1":
-        # Si aprueba, actualizar el estado del préstamo
-        prestamos[indice]["estado"] = "APROBADO"
-
-        # Actualizar el estado del equipo a PRESTADO (usa equipos.actualizar_estado_equipo)
+        # Si aprueba, actualizar el estado del equipo a PRESTADO (usa equipos.actualizar_estado_equipo)
+        # y después el estado del préstamo. Todo se guarda junto, en una sola transacción:
+        # o quedan los dos archivos actualizados o ninguno.
         equipo_id = prestamo_encontrado.get("equipo_id")
+        almacenamiento.iniciar_transaccion()
+
+        # Con la transacción abierta ninguna otra terminal escribe: si mientras
+        # se decidía otra aprobó un préstamo del mismo equipo, ya no está disponible
+        equipo = equipos.obtener_equipo_por_id(equipo_id)
+        if equipo is not None and equipo.get("estado_actual") != "DISPONIBLE":
+            almacenamiento.cancelar_transaccion()
+            print(f"\n✗ El equipo ya no está disponible (estado actual: {equipo.get('estado_actual')}).")
+            return False
+
         if equipos.actualizar_estado_equipo(equipo_id, "PRESTADO"):
-            if guardar_prestamos(prestamos):
+            if (actualizar_prestamo(prestamo_id, {"estado": "APROBADO"},
+                                    concurrencia.version_fila(prestamo_encontrado)) and
+                    guardar_prestamo_abierto(equipo_id, prestamo_id, "APROBADO") and
+                    almacenamiento.confirmar_transaccion()):
+                vencimientos.prestamo_aprobado(prestamo_encontrado)
                 print(f"\n✓ Préstamo '{prestamo_id}' aprobado exitosamente!")
                 print(f"Estado del equipo actualizado a PRESTADO")
                 return True
             else:
+                almacenamiento.cancelar_transaccion()
                 print("\n✗ Error al guardar los cambios")
                 return False
         else:
+            almacenamiento.cancelar_transaccion()
             print("\n✗ Error al actualizar el estado del equipo")
             return False
 
     elif opcion == "2":
         # Si rechaza, solo actualizamos el estado a RECHAZADO
-        prestamos[indice]["estado"] = "RECHAZADO"
-
-        if guardar_prestamos(prestamos):
+        almacenamiento.iniciar_transaccion()
+        if (actualizar_prestamo(prestamo_id, {"estado": "RECHAZADO"},
+                                concurrencia.version_fila(prestamo_encontrado)) and
+                cerrar_prestamo_abierto(prestamo_encontrado.get("equipo_id")) and
+                almacenamiento.confirmar_transaccion()):
             print(f"\n✓ Préstamo '{prestamo_id}' rechazado.")
             return True
         else:
+            almacenamiento.cancelar_transaccion()
             print("\n✗ Error al guardar los cambios")
             return False
 
@@ -395,12 +546,180 @@ def aprobar_rechazar_prestamo():
         print("\n✗ Opción inválida")
         return False
 
+def buscar_en_estado(prestamo_ids, estado):
+    """
+    Busca por ID los préstamos que están en ese estado (con la caché o el
+    índice: no se recorre prestamos.csv). Los IDs vacíos se ignoran.
+    Devuelve un diccionario prestamo_id -> préstamo.
+    """
+    encontrados = {}
+    for prestamo_id in prestamo_ids:
+        prestamo = indices.buscar_fila("prestamos.csv", prestamo_id) if prestamo_id else None
+        if prestamo is not None and prestamo.get("estado") == estado:
+            encontrados[prestamo_id] = prestamo
+    return encontrados
+
+
+def procesar_prestamos_en_lote(decision, prestamo_ids=None, filtro=None):
+    """
+    Aprueba o rechaza varios préstamos PENDIENTES de una sola vez.
+    - decision: "APROBADO" o "RECHAZADO"
+    - prestamo_ids: lista de IDs a procesar (None = todos los pendientes)
+    - filtro: función opcional filtro(prestamo, equipo) que devuelve True
+      para los préstamos que se quieren procesar, por ejemplo:
+          lambda p, e: p.get("tipo_usuario") == "ESTUDIANTE" and e.get("categoria") == "drones"
+    Primero valida todos los préstamos (con IDs dados se buscan solo esos
+    préstamos y sus equipos; si no, una sola lectura de pendientes y de
+    equipos) y después guarda todos los cambios en una sola transacción:
+    cada archivo se escribe una vez y, si algo falla, no se guarda nada.
+    Si otra terminal cambió alguno de esos préstamos o equipos después de
+    validarlos, tampoco se guarda nada (ver concurrencia.py).
+    Devuelve una lista de (prestamo_id, procesado, mensaje) en el orden pedido.
+    """
+    if decision not in ["APROBADO", "RECHAZADO"]:
+        print(f"\n✗ Decisión inválida: {decision}")
+        return []
+
+    if prestamo_ids is None:
+        pendientes = {p.get("prestamo_id"): p for p in lector_mapeado.filtrar("prestamos.csv", "estado", "PENDIENTE")}
+        equipos_por_id = {e.get("equipo_id"): e for e in equipos.leer_equipos()}
+    else:
+        pendientes = buscar_en_estado([prestamo_id.strip() for prestamo_id in prestamo_ids], "PENDIENTE")
+        equipos_por_id = {p.get("equipo_id"): equipos.obtener_equipo_por_id(p.get("equipo_id"))
+                          for p in pendientes.values()}
+
+    # Validación: cada ID queda con su mensaje de error o en la lista de elegidos
+    resumen = []
+    elegidos = []
+    vistos = set()
+    for prestamo_id in (list(pendientes) if prestamo_ids is None else prestamo_ids):
+        prestamo_id = prestamo_id.strip()
+        prestamo = pendientes.get(prestamo_id)
+        equipo = equipos_por_id.get(prestamo.get("equipo_id")) if prestamo else None
+
+        if prestamo_id in vistos:
+            error = "ID repetido en el lote"
+        elif prestamo is None:
+            error = "no está pendiente" if obtener_prestamo_por_id(prestamo_id) else "no existe"
+        elif equipo is None:
+            error = "el equipo del préstamo no existe"
+        elif filtro is not None and not filtro(prestamo, equipo):
+            if prestamo_ids is None:
+                continue  # no es parte del lote
+            error = "no cumple el filtro"
+        elif decision == "APROBADO" and equipo.get("estado_actual") != "DISPONIBLE":
+            error = "el equipo no está disponible"
+        else:
+            error = None
+
+        vistos.add(prestamo_id)
+        resumen.append([prestamo_id, error is None, error])
+        if error is None:
+            elegidos.append(prestamo)
+
+    if not elegidos:
+        return [tuple(linea) for linea in resumen]
+
+    # Todos los cambios juntos: equipos, préstamos y préstamos abiertos
+    almacenamiento.iniciar_transaccion()
+    guardado = True
+    for prestamo in elegidos:
+        prestamo_id = prestamo.get("prestamo_id")
+        equipo_id = prestamo.get("equipo_id")
+        version = concurrencia.version_fila(prestamo)
+        if decision == "APROBADO":
+            guardado = (equipos.actualizar_estado_equipo(equipo_id, "PRESTADO",
+                                                         concurrencia.version_fila(equipos_por_id[equipo_id])) and
+                        actualizar_prestamo(prestamo_id, {"estado": "APROBADO"}, version) and
+                        guardar_prestamo_abierto(equipo_id, prestamo_id, "APROBADO"))
+        else:
+            guardado = actualizar_prestamo(prestamo_id, {"estado": "RECHAZADO"}, version)
+        if not guardado:
+            break
+
+    if guardado and decision == "RECHAZADO":
+        guardado = cerrar_prestamos_abiertos([p.get("equipo_id") for p in elegidos])
+
+    if guardado:
+        guardado = almacenamiento.confirmar_transaccion()
+    else:
+        almacenamiento.cancelar_transaccion()
+
+    if guardado and decision == "APROBADO":
+        for prestamo in elegidos:
+            vencimientos.prestamo_aprobado(prestamo)
+
+    for linea in resumen:
+        if linea[1]:
+            if guardado:
+                linea[2] = "aprobado" if decision == "APROBADO" else "rechazado"
+            else:
+                linea[1], linea[2] = False, "error al guardar los cambios"
+    return [tuple(linea) for linea in resumen]
+
+def aprobar_rechazar_en_lote():
+    """
+    Permite al encargado aprobar o rechazar varios préstamos PENDIENTES juntos,
+    eligiéndolos por una lista de IDs o por tipo de usuario y categoría del equipo.
+    """
+    print("\n" + "="*50)
+    print("APROBAR/RECHAZAR PRÉSTAMOS EN LOTE")
+    print("="*50)
+
+    pendientes = listar_prestamos_pendientes()
+    if not pendientes:
+        return False
+
+    print("\n¿Cómo desea elegir los préstamos?")
+    print("1. Ingresar los IDs")
+    print("2. Por tipo de usuario y/o categoría del equipo")
+    opcion = input("\nSeleccione una opción (1-2): ").strip()
+
+    prestamo_ids = None
+    filtro = None
+    if opcion == "1":
+        texto = input("IDs separados por comas (ej: P0001,P0002): ").strip()
+        prestamo_ids = [prestamo_id for prestamo_id in texto.split(",") if prestamo_id.strip()]
+        if not prestamo_ids:
+            print("\n✗ Error: Debe ingresar al menos un ID")
+            return False
+    elif opcion == "2":
+        tipo_usuario = input("Tipo de usuario (ESTUDIANTE/INSTRUCTOR/ADMINISTRATIVO, Enter = todos): ").strip().upper()
+        categoria = input("Categoría del equipo (Enter = todas): ").strip().lower()
+
+        def filtro(prestamo, equipo):
+            return ((not tipo_usuario or prestamo.get("tipo_usuario") == tipo_usuario) and
+                    (not categoria or equipo.get("categoria", "").lower() == categoria))
+    else:
+        print("\n✗ Opción inválida")
+        return False
+
+    print("\n¿Qué desea hacer con los préstamos elegidos?")
+    print("1. Aprobar")
+    print("2. Rechazar")
+    decision = input("\nSeleccione una opción (1-2): ").strip()
+    if decision not in ["1", "2"]:
+        print("\n✗ Opción inválida")
+        return False
+
+    resumen = procesar_prestamos_en_lote("APROBADO" if decision == "1" else "RECHAZADO", prestamo_ids, filtro)
+    if not resumen:
+        print("\nNingún préstamo pendiente cumple el filtro.")
+        return False
+
+    print("\n" + "-"*50)
+    for prestamo_id, procesado, mensaje in resumen:
+        print(f"{'✓' if procesado else '✗'} {prestamo_id}: {mensaje}")
+    procesados = sum(1 for _, procesado, _ in resumen if procesado)
+    print(f"\nProcesados: {procesados} de {len(resumen)}")
+    return procesados > 0
+
 def listar_prestamos_aprobados():
     """
     Muestra préstamos aprobados y que aún no han sido devueltos (estado APROBADO).
     """
-    prestamos = leer_prestamos()
-    aprobados = [p for p in prestamos if p.get("estado") == "APROBADO"]
+    # Solo se arman las filas APROBADO; el resto del archivo no se convierte
+    aprobados = lector_mapeado.filtrar("prestamos.csv", "estado", "APROBADO")
 
     if not aprobados:
         print("\nNo hay préstamos aprobados sin devolver.")
@@ -422,6 +741,38 @@ def listar_prestamos_aprobados():
 
     return aprobados
 
+def listar_prestamos_vencidos():
+    """
+    Muestra los préstamos aprobados que ya pasaron su plazo de devolución
+    (fecha del préstamo + días autorizados), del más atrasado al menos.
+    """
+    print("\n" + "="*50)
+    print("PRÉSTAMOS VENCIDOS")
+    print("="*50)
+
+    fecha_str = input("\nFecha de referencia (YYYY-MM-DD, Enter para hoy): ").strip()
+    if fecha_str and not validar_fecha(fecha_str):
+        print("\n✗ Error: Formato de fecha inválido. Use YYYY-MM-DD")
+        return []
+    referencia = fechas.fecha(fecha_str) if fecha_str else date.today()
+
+    vencidos = analitica.prestamos_vencidos(referencia)
+    if not vencidos:
+        print(f"\nNo hay préstamos vencidos al {referencia.isoformat()}.")
+        return []
+
+    print(f"\n{'ID':<10} {'Equipo':<25} {'Usuario':<20} {'Fecha Préstamo':<15} {'Días':<6} {'Atraso':<8}")
+    print("-" * 90)
+    for prestamo, dias_atraso in vencidos:
+        print(f"{prestamo.get('prestamo_id'):<10} "
+              f"{prestamo.get('nombre_equipo'):<25} "
+              f"{prestamo.get('usuario_prestatario'):<20} "
+              f"{prestamo.get('fecha_prestamo'):<15} "
+              f"{prestamo.get('dias_autorizados'):<6} "
+              f"{dias_atraso:<8}")
+    print(f"\nTotal de préstamos vencidos: {len(vencidos)}")
+    return vencidos
+
 def registrar_devolucion():
     """
     Registra la devolución de un préstamo aprobado:
@@ -440,20 +791,11 @@ def registrar_devolucion():
 
     prestamo_id = input("\nIngrese el ID del préstamo a devolver: ").strip()
 
-    prestamos = leer_prestamos()
-    prestamo_encontrado = None
-    indice = -1
-
     # Buscar el préstamo y comprobar que está APROBADO
-    for i, prestamo in enumerate(prestamos):
-        if prestamo.get("prestamo_id") == prestamo_id:
-            if prestamo.get("estado") == "APROBADO":
-                prestamo_encontrado = prestamo
-                indice = i
-                break
-            else:
-                print(f"\n✗ El préstamo '{prestamo_id}' no está aprobado o ya fue devuelto.")
-                return False
+    prestamo_encontrado = obtener_prestamo_por_id(prestamo_id)
+    if prestamo_encontrado and prestamo_encontrado.get("estado") != "APROBADO":
+        print(f"\n✗ El préstamo '{prestamo_id}' no está aprobado o ya fue devuelto.")
+        return False
 
     if not prestamo_encontrado:
         print(f"\n✗ No se encontró un préstamo aprobado con ID '{prestamo_id}'")
@@ -475,9 +817,10 @@ def registrar_devolucion():
         print("\n✗ Error: Formato de fecha inválido. Use YYYY-MM-DD")
         return False
 
-    # Calcular días reales usados (puede ser 0 o más)
-    fecha_prestamo = prestamo_encontrado.get("fecha_prestamo")
-    dias_reales = calcular_dias_diferencia(fecha_prestamo, fecha_devolucion)
+    # Calcular días reales usados (puede ser 0 o más).
+    # El registro ya tiene la fecha del préstamo como número de día.
+    dia_prestamo = fechas.dia_de(prestamo_encontrado, "fecha_prestamo")
+    dias_reales = fechas.dia(fecha_devolucion) - dia_prestamo if dia_prestamo is not None else 0
 
     if dias_reales < 0:
         # No se permite devolver antes de la fecha de préstamo
@@ -488,17 +831,24 @@ def registrar_devolucion():
     dias_autorizados = int(prestamo_encontrado.get("dias_autorizados", 0))
     retraso = "SI" if dias_reales > dias_autorizados else "NO"
 
-    # Actualizar campos del préstamo
-    prestamos[indice]["fecha_devolucion"] = fecha_devolucion
-    prestamos[indice]["dias_reales_usados"] = str(dias_reales)
-    prestamos[indice]["retraso"] = retraso
-    prestamos[indice]["estado"] = "DEVUELTO"
+    # Campos del préstamo que cambian con la devolución
+    cambios = {
+        "fecha_devolucion": fecha_devolucion,
+        "dias_reales_usados": str(dias_reales),
+        "retraso": retraso,
+        "estado": "DEVUELTO"
+    }
 
     # Cambiar el estado del equipo a DISPONIBLE
+    # (equipo y préstamo se guardan juntos, en una sola transacción)
     equipo_id = prestamo_encontrado.get("equipo_id")
 
+    almacenamiento.iniciar_transaccion()
     if equipos.actualizar_estado_equipo(equipo_id, "DISPONIBLE"):
-        if guardar_prestamos(prestamos):
+        if (registrar_prestamo_devuelto(prestamo_encontrado, cambios) and
+                cerrar_prestamo_abierto(equipo_id) and
+                almacenamiento.confirmar_transaccion()):
+            vencimientos.prestamo_cerrado(prestamo_id)
             print(f"\n✓ Devolución registrada exitosamente!")
             print(f"Días reales usados: {dias_reales}")
             print(f"Días autorizados: {dias_autorizados}")
@@ -509,12 +859,137 @@ def registrar_devolucion():
             print(f"Estado del equipo actualizado a DISPONIBLE")
             return True
         else:
+            almacenamiento.cancelar_transaccion()
             print("\n✗ Error al guardar los cambios")
             return False
     else:
+        almacenamiento.cancelar_transaccion()
         print("\n✗ Error al actualizar el estado del equipo")
         return False
 
+def procesar_devoluciones_en_lote(lineas):
+    """
+    Registra varias devoluciones juntas a partir de las líneas de un
+    manifiesto con el formato prestamo_id,fecha_devolucion.
+    Las líneas vacías y la línea de encabezados se ignoran.
+    Valida todas las líneas, calcula días reales usados y retraso de todo
+    el lote, y guarda los cambios en una sola transacción (un cambio de
+    estado de equipos y un cambio de préstamos, cada archivo escrito una vez).
+    Si algo falla al guardar, no se guarda nada.
+    Devuelve una lista de (número de línea, prestamo_id, procesado, mensaje).
+    """
+    # Solo se buscan (por ID) los préstamos que nombra el manifiesto
+    aprobados = buscar_en_estado([linea.split(",")[0].strip() for linea in lineas], "APROBADO")
+
+    resumen = []
+    devoluciones = []  # (prestamo, cambios)
+    vistos = set()
+    for numero, linea in enumerate(lineas, start=1):
+        linea = linea.strip()
+        if not linea or linea.replace(" ", "") == "prestamo_id,fecha_devolucion":
+            continue
+
+        partes = [parte.strip() for parte in linea.split(",")]
+        prestamo_id = partes[0]
+        if len(partes) != 2:
+            resumen.append([numero, prestamo_id, False, "línea inválida (use prestamo_id,fecha_devolucion)"])
+            continue
+        fecha_devolucion = partes[1]
+        prestamo = aprobados.get(prestamo_id)
+        dia_devolucion = fechas.dia(fecha_devolucion)
+        dia_prestamo = fechas.dia_de(prestamo, "fecha_prestamo") if prestamo else None
+
+        if prestamo_id in vistos:
+            error = "ID repetido en el manifiesto"
+        elif prestamo is None:
+            error = ("no está aprobado o ya fue devuelto" if obtener_prestamo_por_id(prestamo_id)
+                     else "no existe")
+        elif dia_devolucion is None:
+            error = "fecha de devolución inválida (use YYYY-MM-DD)"
+        elif dia_prestamo is None:
+            error = "el préstamo no tiene una fecha de préstamo válida"
+        elif dia_devolucion < dia_prestamo:
+            error = "la fecha de devolución es anterior a la fecha de préstamo"
+        else:
+            error = None
+        vistos.add(prestamo_id)
+
+        if error is not None:
+            resumen.append([numero, prestamo_id, False, error])
+            continue
+
+        dias_reales = dia_devolucion - dia_prestamo
+        dias_autorizados = int(prestamo.get("dias_autorizados", 0))
+        retraso = "SI" if dias_reales > dias_autorizados else "NO"
+        devoluciones.append((prestamo, {
+            "fecha_devolucion": fecha_devolucion,
+            "dias_reales_usados": str(dias_reales),
+            "retraso": retraso,
+            "estado": "DEVUELTO"
+        }))
+        if retraso == "SI":
+            mensaje = f"devuelto con {dias_reales - dias_autorizados} día(s) de retraso"
+        else:
+            mensaje = f"devuelto a tiempo ({dias_reales} de {dias_autorizados} días)"
+        resumen.append([numero, prestamo_id, True, mensaje])
+
+    if devoluciones:
+        almacenamiento.iniciar_transaccion()
+        guardado = True
+        for prestamo, cambios in devoluciones:
+            guardado = (equipos.actualizar_estado_equipo(prestamo.get("equipo_id"), "DISPONIBLE") and
+                        registrar_prestamo_devuelto(prestamo, cambios))
+            if not guardado:
+                break
+        if guardado:
+            guardado = (cerrar_prestamos_abiertos([p.get("equipo_id") for p, _ in devoluciones]) and
+                        almacenamiento.confirmar_transaccion())
+        else:
+            almacenamiento.cancelar_transaccion()
+
+        if guardado:
+            for prestamo, _ in devoluciones:
+                vencimientos.prestamo_cerrado(prestamo.get("prestamo_id"))
+        else:
+            for linea in resumen:
+                if linea[2]:
+                    linea[2], linea[3] = False, "error al guardar los cambios"
+
+    return [tuple(linea) for linea in resumen]
+
+def registrar_devoluciones_en_lote():
+    """
+    Registra las devoluciones de un manifiesto (archivo de texto con una
+    línea prestamo_id,fecha_devolucion por cada equipo devuelto) y muestra
+    el resultado de cada línea.
+    """
+    print("\n" + "="*50)
+    print("REGISTRAR DEVOLUCIONES EN LOTE")
+    print("="*50)
+
+    nombre_archivo = input("\nArchivo del manifiesto (prestamo_id,fecha_devolucion por línea): ").strip()
+    try:
+        with open(nombre_archivo, "r", encoding="utf-8") as archivo:
+            lineas = archivo.readlines()
+    except FileNotFoundError:
+        print(f"\n✗ Error: No se encontró el archivo {nombre_archivo}")
+        return False
+    except Exception as e:
+        print(f"\n✗ Error al leer {nombre_archivo}: {e}")
+        return False
+
+    resumen = procesar_devoluciones_en_lote(lineas)
+    if not resumen:
+        print("\nEl manifiesto no tiene devoluciones.")
+        return False
+
+    print("\n" + "-"*60)
+    for numero, prestamo_id, procesado, mensaje in resumen:
+        print(f"Línea {numero:<5} {'✓' if procesado else '✗'} {prestamo_id}: {mensaje}")
+    procesados = sum(1 for _, _, procesado, _ in resumen if procesado)
+    print(f"\nDevoluciones registradas: {procesados} de {len(resumen)}")
+    return procesados > 0
+
 def consultar_historial():
     """
     Permite buscar préstamos por equipo (ID) o por usuario.
@@ -530,16 +1005,20 @@ def consultar_historial():
 
     opcion = input("\nSeleccione una opción (1-2): ").strip()
 
-    prestamos = leer_prestamos()
     resultados = []
 
+    # Las búsquedas usan los índices secundarios de prestamos.csv:
+    # solo se leen los préstamos que coinciden, no todo el historial.
+    # Después se agregan los préstamos archivados (ver archivado.py).
     if opcion == "1":
         equipo_id = input("\nIngrese el ID del equipo: ").strip()
-        resultados = [p for p in prestamos if p.get("equipo_id") == equipo_id]
+        resultados = indices.buscar_filas("prestamos.csv", "equipo_id", equipo_id)
+        resultados = archivado.completar_con_archivados(resultados, "equipo_id", equipo_id)
 
     elif opcion == "2":
         usuario = input("\nIngrese el nombre del usuario: ").strip()
-        resultados = [p for p in prestamos if p.get("usuario_prestatario") == usuario]
+        resultados = indices.buscar_filas("prestamos.csv", "usuario_prestatario", usuario)
+        resultados = archivado.completar_con_archivados(resultados, "usuario_prestatario", usuario)
 
     else:
         print("\n✗ Opción inválida")
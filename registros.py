@@ -0,0 +1,255 @@
+"""
+Módulo de registros
+Clases compactas para las filas de equipos.csv y prestamos.csv.
+
+Cada fila es un objeto con __slots__ (sin diccionario propio) y los campos
+guardados con su tipo:
+- números (días, mes, año) como int
+- fechas como número de día (date.toordinal()), o None si están vacías
+- estados y tipo de usuario como enumeraciones (un único objeto compartido
+  por todas las filas)
+- textos que se repiten mucho (equipo, usuario) internados con sys.intern
+
+Los campos tipados se leen como atributos (prestamo.anio -> 2025).
+Además cada registro se puede usar como un diccionario de solo lectura
+con los mismos textos del CSV (prestamo.get("anio") -> "2025"), así el
+código que trabajaba con diccionarios sigue funcionando igual.
+Si un valor del CSV no tiene el formato esperado se guarda como texto,
+para que al volver a escribirlo quede exactamente igual.
+"""
+import sys
+from collections.abc import Mapping
+from datetime import date
+from enum import Enum
+
+
+class EstadoEquipo(str, Enum):
+    DISPONIBLE = "DISPONIBLE"
+    PRESTADO = "PRESTADO"
+
+
+class EstadoPrestamo(str, Enum):
+    PENDIENTE = "PENDIENTE"
+    APROBADO = "APROBADO"
+    RECHAZADO = "RECHAZADO"
+    DEVUELTO = "DEVUELTO"
+
+
+class TipoUsuario(str, Enum):
+    ESTUDIANTE = "ESTUDIANTE"
+    INSTRUCTOR = "INSTRUCTOR"
+    ADMINISTRATIVO = "ADMINISTRATIVO"
+
+
+# =========================================================
+# Conversión de cada tipo de campo: texto del CSV <-> valor
+# =========================================================
+
+# Cantidad máxima de textos distintos que recuerda cada conversión
+LIMITE_MEMORIA = 100_000
+
+
+class _Memoria(dict):
+    """
+    Diccionario texto -> valor convertido. Los textos que se repiten
+    (fechas, años, estados) se convierten una sola vez y todas las filas
+    comparten el mismo objeto. Si falta, se calcula con convertir.
+    """
+    __slots__ = ("convertir",)
+
+    def __init__(self, convertir):
+        super().__init__()
+        self.convertir = convertir
+
+    def __missing__(self, texto):
+        valor = self.convertir(texto)
+        if len(self) < LIMITE_MEMORIA:
+            self[texto] = valor
+        return valor
+
+
+def _convertir_entero(texto):
+    try:
+        valor = int(texto)
+    except ValueError:
+        return None if texto == "" else sys.intern(texto)
+    # Solo si al volver a escribirlo queda igual (por ejemplo "03" queda como texto)
+    return valor if str(valor) == texto else sys.intern(texto)
+
+
+def _convertir_mes(texto):
+    if len(texto) == 2 and texto.isdigit():
+        return int(texto)
+    return None if texto == "" else sys.intern(texto)
+
+
+def _convertir_fecha(texto):
+    try:
+        fecha = date.fromisoformat(texto)
+    except ValueError:
+        return None if texto == "" else sys.intern(texto)
+    return fecha.toordinal() if fecha.isoformat() == texto else sys.intern(texto)
+
+
+def _memoria_enumeracion(clase):
+    """
+    Memoria de un campo cuyo valor es una enumeración: ya tiene cargados
+    todos sus miembros; un valor desconocido queda como texto.
+    """
+    memoria = _Memoria(sys.intern)
+    for miembro in clase:
+        memoria[miembro.value] = miembro
+    return memoria
+
+
+_ENTEROS = _Memoria(_convertir_entero)
+_MESES = _Memoria(_convertir_mes)
+_FECHAS = _Memoria(_convertir_fecha)
+_ESTADOS_EQUIPO = _memoria_enumeracion(EstadoEquipo)
+_ESTADOS_PRESTAMO = _memoria_enumeracion(EstadoPrestamo)
+_TIPOS_USUARIO = _memoria_enumeracion(TipoUsuario)
+_compartido = sys.intern
+
+
+def _texto(valor):
+    return valor
+
+
+def _texto_entero(valor):
+    if valor is None:
+        return ""
+    return str(valor)
+
+
+def _texto_mes(valor):
+    if valor is None:
+        return ""
+    if isinstance(valor, int):
+        return f"{valor:02d}"
+    return valor
+
+
+def _texto_fecha(valor):
+    if valor is None:
+        return ""
+    if isinstance(valor, int):
+        return date.fromordinal(valor).isoformat()
+    return valor
+
+
+def _texto_enumeracion(valor):
+    if isinstance(valor, Enum):
+        return valor.value
+    return valor
+
+
+# =========================================================
+# Registros
+# =========================================================
+
+class Registro(Mapping):
+    """
+    Base de los registros. Cada subclase define __slots__ (los campos en el
+    orden del CSV), FORMATOS (cómo se escribe cada campo como texto, en el
+    mismo orden) y desde_textos (cómo se arma a partir de una línea del CSV).
+    """
+    __slots__ = ()
+    FORMATOS = ()
+
+    def __init_subclass__(cls):
+        super().__init_subclass__()
+        cls.CAMPOS = tuple(cls.__slots__)
+        cls._ESCRITORES = dict(zip(cls.CAMPOS, cls.FORMATOS))
+
+    @classmethod
+    def desde_textos(cls, textos):
+        """
+        Crea el registro a partir de los textos de una línea del CSV,
+        en el orden de CAMPOS.
+        """
+        raise NotImplementedError
+
+    def con_cambios(self, cambios):
+        """
+        Devuelve un registro nuevo igual a este pero con algunos campos
+        cambiados (cambios tiene los textos nuevos, como en el CSV).
+        Si algún campo no es de este registro devuelve un diccionario.
+        """
+        if not all(campo in self._ESCRITORES for campo in cambios):
+            fila = dict(self.items())
+            fila.update(cambios)
+            return fila
+        return type(self).desde_textos([cambios.get(campo, self[campo]) for campo in self.CAMPOS])
+
+    def __getitem__(self, campo):
+        try:
+            escribir = self._ESCRITORES[campo]
+        except KeyError:
+            raise KeyError(campo) from None
+        return escribir(getattr(self, campo))
+
+    def __iter__(self):
+        return iter(self.CAMPOS)
+
+    def __len__(self):
+        return len(self.CAMPOS)
+
+    def __repr__(self):
+        return f"{type(self).__name__}({dict(self.items())!r})"
+
+
+class Equipo(Registro):
+    __slots__ = (
+        "equipo_id", "nombre_equipo", "categoria", "estado_actual", "fecha_registro", "descripcion"
+    )
+    FORMATOS = (_texto, _texto, _texto, _texto_enumeracion, _texto_fecha, _texto)
+
+    @classmethod
+    def desde_textos(cls, textos):
+        equipo = cls.__new__(cls)
+        equipo.equipo_id = textos[0]
+        equipo.nombre_equipo = _compartido(textos[1])
+        equipo.categoria = _compartido(textos[2])
+        equipo.estado_actual = _ESTADOS_EQUIPO[textos[3]]
+        equipo.fecha_registro = _FECHAS[textos[4]]
+        equipo.descripcion = textos[5]
+        return equipo
+
+
+class Prestamo(Registro):
+    __slots__ = (
+        "prestamo_id", "equipo_id", "nombre_equipo", "usuario_prestatario",
+        "tipo_usuario", "fecha_solicitud", "fecha_prestamo", "fecha_devolucion",
+        "dias_autorizados", "dias_reales_usados", "retraso", "estado", "mes", "anio"
+    )
+    FORMATOS = (
+        _texto, _texto, _texto, _texto,
+        _texto_enumeracion, _texto_fecha, _texto_fecha, _texto_fecha,
+        _texto_entero, _texto_entero, _texto, _texto_enumeracion, _texto_mes, _texto_entero
+    )
+
+    @classmethod
+    def desde_textos(cls, textos):
+        prestamo = cls.__new__(cls)
+        prestamo.prestamo_id = textos[0]
+        prestamo.equipo_id = _compartido(textos[1])
+        prestamo.nombre_equipo = _compartido(textos[2])
+        prestamo.usuario_prestatario = _compartido(textos[3])
+        prestamo.tipo_usuario = _TIPOS_USUARIO[textos[4]]
+        prestamo.fecha_solicitud = _FECHAS[textos[5]]
+        prestamo.fecha_prestamo = _FECHAS[textos[6]]
+        prestamo.fecha_devolucion = _FECHAS[textos[7]]
+        prestamo.dias_autorizados = _ENTEROS[textos[8]]
+        prestamo.dias_reales_usados = _ENTEROS[textos[9]]
+        prestamo.retraso = _compartido(textos[10])
+        prestamo.estado = _ESTADOS_PRESTAMO[textos[11]]
+        prestamo.mes = _MESES[textos[12]]
+        prestamo.anio = _ENTEROS[textos[13]]
+        return prestamo
+
+
+# Clase de registro de cada tabla
+REGISTROS = {
+    "equipos.csv": Equipo,
+    "prestamos.csv": Prestamo,
+}
@@ -1,33 +1,42 @@
 """
 Módulo para generar reportes en formato CSV
 Exporta reportes de préstamos por mes y año
+
+También se puede usar desde la línea de comandos para mandar el reporte
+de un mes a la salida estándar (o a un archivo) sin pasar por el menú:
+    python reportes.py 2025 11 | otra_herramienta
+    python reportes.py 2025 11 reporte.csv
 """
+import contextlib
+import os
+import sys
+from concurrent.futures import ThreadPoolExecutor
+from itertools import chain
+
+import analitica
+import formato_csv
+import instantanea
+import particiones
+
+# Columnas de los reportes, en el orden en que se escriben
+ENCABEZADOS_REPORTE = [
+    "prestamo_id", "equipo_id", "nombre_equipo", "usuario_prestatario",
+    "tipo_usuario", "dias_autorizados", "dias_reales_usados", "retraso",
+    "estado", "mes", "anio"
+]
+
+# Cantidad de hilos que escriben reportes a la vez al exportar varios meses
+TRABAJADORES_REPORTES = 4
 
 
 def leer_prestamos():
     """
     Lee el archivo prestamos.csv y retorna una lista de diccionarios
     Función auxiliar para evitar importar prestamos.py (evitar dependencias circulares)
+    Comparte la caché de almacenamiento.py con el resto de los módulos
+    (o usa la instantánea por columnas si está vigente, ver instantanea.py)
     """
-    prestamos = []
-    try:
-        with open("prestamos.csv", "r", encoding="utf-8") as archivo:
-            encabezados = archivo.readline().strip().split(",")
-            
-            for linea in archivo:
-                linea = linea.strip()
-                if linea:
-                    valores = linea.split(",")
-                    prestamo = {}
-                    for i, encabezado in enumerate(encabezados):
-                        prestamo[encabezado] = valores[i]
-                    prestamos.append(prestamo)
-    except FileNotFoundError:
-        print("Error: No se encontró el archivo prestamos.csv")
-    except Exception as e:
-        print(f"Error al leer préstamos: {e}")
-    
-    return prestamos
+    return instantanea.leer_tabla("prestamos.csv")
 
 
 def exportar_reporte_csv():
@@ -57,59 +66,392 @@ def exportar_reporte_csv():
         print("\n✗ Error: Debe ingresar números válidos")
         return False
     
-    # Leer préstamos
-    prestamos = leer_prestamos()
-    
-    # Filtrar préstamos devueltos del mes y año especificados
-    prestamos_filtrados = []
-    for prestamo in prestamos:
-        if (prestamo.get("estado") == "DEVUELTO" and
-            prestamo.get("anio") == anio and
-            prestamo.get("mes") == mes_formateado):
-            prestamos_filtrados.append(prestamo)
-    
-    # Verificar si hay datos
-    if not prestamos_filtrados:
-        print(f"\n✗ No hay préstamos devueltos para el mes {mes_formateado} del año {anio}")
-        return False
-    
-    # Generar nombre del archivo
-    nombre_archivo = f"reporte_prestamos_{anio}_{mes_formateado}.csv"
-    
     try:
-        # Crear y escribir el archivo CSV
-        with open(nombre_archivo, "w", encoding="utf-8") as archivo:
-            # Escribir encabezados
-            encabezados = [
-                "prestamo_id", "equipo_id", "nombre_equipo", "usuario_prestatario",
-                "tipo_usuario", "dias_autorizados", "dias_reales_usados", "retraso",
-                "estado", "mes", "anio"
-            ]
-            archivo.write(",".join(encabezados) + "\n")
-            
-            # Escribir cada préstamo filtrado
-            for prestamo in prestamos_filtrados:
-                valores = [
-                    prestamo.get("prestamo_id", ""),
-                    prestamo.get("equipo_id", ""),
-                    prestamo.get("nombre_equipo", ""),
-                    prestamo.get("usuario_prestatario", ""),
-                    prestamo.get("tipo_usuario", ""),
-                    prestamo.get("dias_autorizados", ""),
-                    prestamo.get("dias_reales_usados", ""),
-                    prestamo.get("retraso", ""),
-                    prestamo.get("estado", ""),
-                    prestamo.get("mes", ""),
-                    prestamo.get("anio", "")
-                ]
-                archivo.write(",".join(valores) + "\n")
+        # Solo se lee la partición del mes, y solo si cambió desde el último reporte
+        nombre_archivo, cantidad, vigente = generar_reporte_mes(anio, mes_formateado)
+        
+        # Verificar si hay datos
+        if cantidad == 0:
+            print(f"\n✗ No hay préstamos devueltos para el mes {mes_formateado} del año {anio}")
+            return False
         
-        print(f"\n✓ Reporte exportado exitosamente!")
-        print(f"Archivo generado: {nombre_archivo}")
-        print(f"Total de préstamos incluidos: {len(prestamos_filtrados)}")
+        if vigente:
+            print(f"\n✓ El reporte ya estaba actualizado (no hubo devoluciones nuevas)")
+            print(f"Archivo: {nombre_archivo}")
+        else:
+            print(f"\n✓ Reporte exportado exitosamente!")
+            print(f"Archivo generado: {nombre_archivo}")
+        print(f"Total de préstamos incluidos: {cantidad}")
         return True
         
     except Exception as e:
         print(f"\n✗ Error al generar el reporte: {e}")
         return False
 
+
+def archivo_reporte(anio, mes):
+    """
+    Devuelve el nombre del archivo del reporte de un año y mes (mes con dos dígitos).
+    """
+    return f"reporte_prestamos_{anio}_{mes}.csv"
+
+
+def archivo_huella(nombre_archivo):
+    """
+    Devuelve el nombre del archivo donde se guarda la huella de un reporte.
+    """
+    return nombre_archivo + ".huella"
+
+
+def _contenido_huella(nombre_archivo, huella):
+    """
+    Texto que se guarda junto al reporte: la huella de la partición con la
+    que se generó, las columnas del reporte y el tamaño del archivo.
+    Si cualquiera de las tres cambia, el reporte se vuelve a generar.
+    """
+    return f"{huella}\n{','.join(ENCABEZADOS_REPORTE)}\n{os.path.getsize(nombre_archivo)}\n"
+
+
+def cantidad_en_huella(huella):
+    """
+    Devuelve la cantidad de préstamos que indica la huella de una partición.
+    """
+    return int(huella.split(":", 1)[0])
+
+
+def reporte_vigente(nombre_archivo, huella):
+    """
+    Indica si el reporte ya existe y se generó con los mismos datos
+    (misma huella de la partición de su mes, ver particiones.huella_particion).
+    """
+    if huella is None or cantidad_en_huella(huella) == 0:
+        return False
+    try:
+        with open(archivo_huella(nombre_archivo), "r", encoding="utf-8") as archivo:
+            return archivo.read() == _contenido_huella(nombre_archivo, huella)
+    except OSError:
+        return False  # falta el reporte o su huella
+
+
+def guardar_huella(nombre_archivo, huella):
+    """
+    Guarda la huella del reporte recién generado.
+    Si no se puede guardar, el reporte se regenera la próxima vez.
+    """
+    if huella is None:
+        return
+    temporal = archivo_huella(nombre_archivo) + ".tmp"
+    try:
+        with open(temporal, "w", encoding="utf-8") as archivo:
+            archivo.write(_contenido_huella(nombre_archivo, huella))
+        os.replace(temporal, archivo_huella(nombre_archivo))
+    except OSError as e:
+        print(f"Aviso: no se pudo guardar la huella de {nombre_archivo}: {e}")
+
+
+def borrar_huella(nombre_archivo):
+    """
+    Borra la huella antes de reescribir el reporte, para que un reporte
+    a medio escribir no se tome como vigente.
+    """
+    if os.path.exists(archivo_huella(nombre_archivo)):
+        os.remove(archivo_huella(nombre_archivo))
+
+
+# Tamaño aproximado (en caracteres) de cada bloque que se escribe de una vez
+TAMANO_BLOQUE = 1024 * 1024
+
+
+def filtrar_devueltos(prestamos, anio, mes):
+    """
+    Deja pasar solo los préstamos DEVUELTOS del año y mes dados
+    (mes con dos dígitos). Recibe y devuelve un iterable de filas.
+    """
+    for prestamo in prestamos:
+        if prestamo.get("estado") == "DEVUELTO" and prestamo.get("mes") == mes and prestamo.get("anio") == anio:
+            yield prestamo
+
+
+def lineas_reporte(prestamos):
+    """
+    Convierte los préstamos en las líneas del reporte: primero los
+    encabezados y después una línea por préstamo (solo las columnas de
+    ENCABEZADOS_REPORTE).
+    """
+    yield ",".join(ENCABEZADOS_REPORTE) + "\n"
+    for prestamo in prestamos:
+        yield formato_csv.unir([prestamo.get(encabezado, "") for encabezado in ENCABEZADOS_REPORTE]) + "\n"
+
+
+def escribir_en_bloques(lineas, archivo, tamano_bloque=TAMANO_BLOQUE):
+    """
+    Escribe las líneas en el archivo juntándolas en bloques de unos
+    tamano_bloque caracteres, en lugar de una escritura por línea.
+    Devuelve la cantidad de líneas escritas.
+    """
+    bloque = []
+    tamano = 0
+    cantidad = 0
+    for linea in lineas:
+        bloque.append(linea)
+        tamano += len(linea)
+        cantidad += 1
+        if tamano >= tamano_bloque:
+            archivo.write("".join(bloque))
+            bloque = []
+            tamano = 0
+    if bloque:
+        archivo.write("".join(bloque))
+    return cantidad
+
+
+def escribir_reporte(destino, prestamos):
+    """
+    Escribe el reporte CSV con los préstamos dados (una lista o cualquier
+    iterable, que se recorre una sola vez). destino es el nombre del
+    archivo o un archivo ya abierto (por ejemplo sys.stdout).
+    Devuelve la cantidad de préstamos escritos.
+    """
+    if isinstance(destino, str):
+        with open(destino, "w", encoding="utf-8") as archivo:
+            return escribir_en_bloques(lineas_reporte(prestamos), archivo) - 1
+    cantidad = escribir_en_bloques(lineas_reporte(prestamos), destino) - 1
+    destino.flush()
+    return cantidad
+
+
+def exportar_reporte_en_flujo(anio, mes, destino):
+    """
+    Exporta el reporte de un año y mes (mes con dos dígitos) leyendo la
+    partición de ese mes de a una fila (ver particiones.recorrer_particion):
+    lector -> filtro -> columnas del reporte -> escritura en bloques.
+    La memoria usada no depende de la cantidad de préstamos del mes.
+    destino es el nombre del archivo o un archivo abierto.
+    Si no hay préstamos devueltos ese mes no escribe nada.
+    Devuelve la cantidad de préstamos escritos.
+    """
+    prestamos = filtrar_devueltos(particiones.recorrer_particion(anio, mes), anio, mes)
+    primero = next(prestamos, None)
+    if primero is None:
+        return 0
+    return escribir_reporte(destino, chain([primero], prestamos))
+
+
+def generar_reporte_mes(anio, mes):
+    """
+    Deja al día el archivo del reporte de un año y mes (mes con dos
+    dígitos). Si la partición del mes no cambió desde el último reporte
+    (misma huella), el archivo no se vuelve a escribir. El reporte nuevo
+    se escribe en un temporal que después reemplaza al anterior, así quien
+    ya lo tenía abierto (por ejemplo el servicio, ver servicio.py) sigue
+    leyendo el archivo completo.
+    Devuelve (nombre del archivo, cantidad de préstamos, True si ya estaba
+    al día); con cantidad 0 (mes sin devoluciones) no se escribe nada.
+    """
+    nombre_archivo = archivo_reporte(anio, mes)
+    huella = particiones.huella_particion(anio, mes)
+    if reporte_vigente(nombre_archivo, huella):
+        return nombre_archivo, cantidad_en_huella(huella), True
+
+    borrar_huella(nombre_archivo)
+    temporal = nombre_archivo + ".tmp"
+    cantidad = exportar_reporte_en_flujo(anio, mes, temporal)
+    if cantidad == 0:
+        return nombre_archivo, 0, False
+    os.replace(temporal, nombre_archivo)
+    guardar_huella(nombre_archivo, huella)
+    return nombre_archivo, cantidad, False
+
+
+def meses_del_rango(anio_inicio, mes_inicio, anio_fin, mes_fin):
+    """
+    Devuelve la lista de (anio, mes) entre los dos meses dados (incluidos),
+    como textos: año tal cual y mes con dos dígitos.
+    """
+    meses = []
+    actual = anio_inicio * 12 + (mes_inicio - 1)
+    fin = anio_fin * 12 + (mes_fin - 1)
+    while actual <= fin:
+        meses.append((str(actual // 12), str(actual % 12 + 1).zfill(2)))
+        actual += 1
+    return meses
+
+
+def exportar_reportes_rango(anio_inicio, mes_inicio, anio_fin, mes_fin, trabajadores=TRABAJADORES_REPORTES):
+    """
+    Exporta un reporte reporte_prestamos_{anio}_{mes}.csv por cada mes del
+    rango (por ejemplo un año completo), iguales a los de exportar_reporte_csv.
+    Los préstamos de cada mes se leen de su partición (ver particiones.py,
+    que se generan con una sola pasada por prestamos.csv) y los archivos se
+    escriben en paralelo con un grupo de hilos.
+    Los meses sin devoluciones no generan archivo, y los reportes de meses
+    que no cambiaron desde la última exportación no se vuelven a escribir.
+    Devuelve una lista de (anio, mes, cantidad de préstamos, error o None).
+    """
+    # Las particiones se leen en este hilo (comparten la caché de almacenamiento.py);
+    # los hilos solo escriben los archivos
+    por_mes = []
+    for anio, mes in meses_del_rango(anio_inicio, mes_inicio, anio_fin, mes_fin):
+        huella = particiones.huella_particion(anio, mes)
+        if reporte_vigente(archivo_reporte(anio, mes), huella):
+            por_mes.append((anio, mes, huella, None))
+        else:
+            por_mes.append((anio, mes, huella, particiones.leer_particion(anio, mes)))
+
+    def exportar_mes(anio, mes, huella, prestamos):
+        if prestamos is None:
+            return (anio, mes, cantidad_en_huella(huella), None)  # sin cambios
+        if not prestamos:
+            return (anio, mes, 0, None)
+        nombre_archivo = archivo_reporte(anio, mes)
+        try:
+            borrar_huella(nombre_archivo)
+            escribir_reporte(nombre_archivo + ".tmp", prestamos)
+            os.replace(nombre_archivo + ".tmp", nombre_archivo)  # como en generar_reporte_mes
+            guardar_huella(nombre_archivo, huella)
+            return (anio, mes, len(prestamos), None)
+        except Exception as e:
+            return (anio, mes, len(prestamos), str(e))
+
+    with ThreadPoolExecutor(max_workers=max(1, trabajadores)) as grupo:
+        tareas = [grupo.submit(exportar_mes, *datos) for datos in por_mes]
+        return [tarea.result() for tarea in tareas]
+
+
+def pedir_mes(texto):
+    """
+    Pide un mes con el formato AAAA-MM y devuelve (anio, mes) como enteros,
+    o None si no es válido.
+    """
+    valor = input(texto).strip()
+    try:
+        anio, mes = valor.split("-")
+        anio, mes = int(anio), int(mes)
+    except ValueError:
+        return None
+    if mes < 1 or mes > 12:
+        return None
+    return anio, mes
+
+
+def exportar_reportes_varios_meses():
+    """
+    Permite exportar los reportes de un año completo o de un rango de meses
+    de una sola vez (un archivo por mes).
+    """
+    print("\n" + "="*50)
+    print("EXPORTAR REPORTES DE VARIOS MESES")
+    print("="*50)
+    print("\n1. Año completo")
+    print("2. Rango de meses")
+    opcion = input("\nSeleccione una opción (1-2): ").strip()
+
+    if opcion == "1":
+        try:
+            anio = int(input("\nIngrese el año (ej: 2025): ").strip())
+        except ValueError:
+            print("\n✗ Error: Debe ingresar un año válido")
+            return False
+        inicio, fin = (anio, 1), (anio, 12)
+    elif opcion == "2":
+        inicio = pedir_mes("\nMes inicial (AAAA-MM): ")
+        fin = pedir_mes("Mes final (AAAA-MM): ")
+        if inicio is None or fin is None:
+            print("\n✗ Error: Use el formato AAAA-MM (mes entre 1 y 12)")
+            return False
+        if fin < inicio:
+            print("\n✗ Error: El mes final no puede ser anterior al inicial")
+            return False
+    else:
+        print("\n✗ Opción inválida")
+        return False
+
+    resultados = exportar_reportes_rango(inicio[0], inicio[1], fin[0], fin[1])
+
+    print("\n" + "-"*50)
+    generados = 0
+    for anio, mes, cantidad, error in resultados:
+        if error:
+            print(f"✗ {anio}-{mes}: error al generar el reporte: {error}")
+        elif cantidad:
+            generados += 1
+            print(f"✓ {anio}-{mes}: reporte_prestamos_{anio}_{mes}.csv ({cantidad} préstamos)")
+        else:
+            print(f"- {anio}-{mes}: sin préstamos devueltos")
+    print(f"\nReportes generados: {generados} de {len(resultados)} meses")
+    return generados > 0
+
+
+def mostrar_estadisticas():
+    """
+    Muestra el tablero de estadísticas de todo el historial de préstamos
+    (ver analitica.py).
+    """
+    print("\n" + "="*60)
+    print("ESTADÍSTICAS DE PRÉSTAMOS")
+    print("="*60)
+
+    columnas = analitica.cargar_columnas()
+    if columnas["filas"] == 0:
+        print("\n✗ No hay préstamos registrados")
+        return False
+
+    print("\nRetrasos por tipo de usuario (préstamos devueltos):")
+    for fila in analitica.tasa_retraso_por_tipo(columnas):
+        print(f"  {fila['tipo_usuario']:<16} {fila['devueltos']:>8} devueltos  "
+              f"{fila['con_retraso']:>8} con retraso  ({fila['tasa_retraso']:.1f}%)")
+
+    print("\nDías usados contra días autorizados por categoría:")
+    for fila in analitica.dias_por_categoria(columnas):
+        print(f"  {fila['categoria']:<16} {fila['devueltos']:>8} devueltos  "
+              f"autorizados {fila['promedio_dias_autorizados']:.1f}  usados {fila['promedio_dias_reales']:.1f}  "
+              f"({fila['proporcion_usada'] * 100:.0f}%)")
+
+    print("\nEquipos más usados en un mes:")
+    for fila in analitica.uso_por_equipo_mes(columnas, limite=10):
+        print(f"  {fila['equipo_id']:<16} {fila['anio']}-{fila['mes']:02d}  {fila['prestamos']:>3} préstamos  "
+              f"{fila['dias_usados']:>3} días  ({fila['utilizacion'] * 100:.0f}% del mes)")
+
+    print("\nUsuarios con más préstamos:")
+    for fila in analitica.principales_usuarios(columnas, limite=10):
+        print(f"  {fila['usuario']:<16} {fila['prestamos']:>5} préstamos  {fila['dias_usados']:>6} días")
+    return True
+
+
+def main(argumentos):
+    """
+    Exporta el reporte de un mes desde la línea de comandos:
+    argumentos = [anio, mes] o [anio, mes, archivo] ("-" es la salida estándar).
+    Devuelve el código de salida del programa.
+    """
+    if len(argumentos) not in (2, 3):
+        print("Uso: python reportes.py AAAA MM [archivo|-]", file=sys.stderr)
+        return 2
+    anio, mes = argumentos[0], argumentos[1]
+    if not mes.isdigit() or not 1 <= int(mes) <= 12:
+        print("✗ Error: El mes debe estar entre 1 y 12", file=sys.stderr)
+        return 2
+    mes = mes.zfill(2)
+    destino = argumentos[2] if len(argumentos) == 3 and argumentos[2] != "-" else sys.stdout
+
+    # Los mensajes del sistema van a stderr para no mezclarse con el reporte
+    with contextlib.redirect_stdout(sys.stderr):
+        try:
+            cantidad = exportar_reporte_en_flujo(anio, mes, destino)
+        except BrokenPipeError:
+            # El programa que recibía el reporte dejó de leer (por ejemplo head)
+            os.dup2(os.open(os.devnull, os.O_WRONLY), destino.fileno())
+            return 1
+        except Exception as e:
+            print(f"✗ Error al generar el reporte: {e}")
+            return 1
+
+        if cantidad == 0:
+            print(f"✗ No hay préstamos devueltos para el mes {mes} del año {anio}")
+            return 1
+        print(f"✓ Préstamos incluidos: {cantidad}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
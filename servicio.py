@@ -0,0 +1,718 @@
+"""
+Servicio HTTP/JSON de TechLab
+Un proceso que queda corriendo con las tablas en memoria (la caché de
+almacenamiento.py y los índices) y atiende a kioscos y scripts sin pasar
+por el menú de main.py:
+
+    python servicio.py              # http://127.0.0.1:8080
+    python servicio.py 9000         # en otro puerto
+
+Rutas (las respuestas son JSON, salvo el reporte, que es CSV):
+    GET  /equipos[?estado=DISPONIBLE]
+    GET  /equipos/{equipo_id}
+    POST /equipos                         {"equipo_id", "nombre_equipo", "categoria", "descripcion"}
+    GET  /prestamos?estado=PENDIENTE
+    GET  /prestamos/{prestamo_id}
+    POST /prestamos                       {"equipo_id", "usuario_prestatario", "tipo_usuario",
+                                           "fecha_prestamo", "dias_solicitados"}
+    POST /prestamos/{prestamo_id}/aprobar
+    POST /prestamos/{prestamo_id}/rechazar
+    POST /prestamos/{prestamo_id}/devolver  {"fecha_devolucion"}
+    GET  /historial?equipo_id=...  o  /historial?usuario=...
+    GET  /reportes/{anio}/{mes}           (el mismo CSV que reportes.py)
+    GET  /estadisticas
+
+Los POST piden un usuario de usuarios.csv (autenticación Basic). Los
+equipos y préstamos se devuelven con su versión en el encabezado ETag
+(ver concurrencia.py); un POST sobre un préstamo con If-Match solo se
+guarda si el préstamo sigue en esa versión (si no, responde 412).
+
+Cómo funciona:
+- asyncio atiende todas las conexiones en un solo hilo (HTTP/1.1 con
+  conexiones persistentes, solo lo necesario para JSON: sin dependencias).
+- Los datos se usan desde un único hilo de almacenamiento (los módulos de
+  datos no están hechos para usarse desde dos hilos a la vez), así leer
+  archivos o esperar el fsync no frena a las demás conexiones.
+- Cada escritura se valida al llegar (si no se puede hacer se responde en
+  el momento) y se pone en una cola. El escritor toma todo lo que se juntó
+  en la cola mientras se guardaba el lote anterior y lo guarda en una sola
+  transacción: un único fsync para todo el lote. Cada cliente recibe la
+  respuesta cuando su cambio ya está guardado, y las lecturas nunca ven
+  un lote a medio guardar. Si una operación del lote falla, se descarta
+  el lote y se guarda de a una operación, así solo falla esa.
+- Con el bloqueo entre procesos (ver concurrencia.py) el servicio puede
+  trabajar sobre la misma carpeta que las terminales con main.py.
+"""
+import asyncio
+import base64
+import contextlib
+import io
+import json
+import os
+import re
+import signal
+import sys
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from urllib.parse import parse_qsl, unquote, urlsplit
+
+import almacenamiento
+import archivado
+import concurrencia
+import equipos
+import indices
+import lector_mapeado
+import prestamos
+import reportes
+import usuarios
+
+HOST = "127.0.0.1"
+PUERTO = 8080
+
+# Tamaño máximo del cuerpo de un pedido (los pedidos son JSON chicos)
+TAMANO_MAXIMO_CUERPO = 1024 * 1024
+
+# Tamaño de cada bloque que se envía de un reporte
+TAMANO_BLOQUE_RESPUESTA = 64 * 1024
+
+# Cantidad máxima de escrituras que se guardan juntas en una transacción
+# (mientras se guarda un lote, las demás terminales esperan el bloqueo)
+LOTE_MAXIMO = 256
+
+TEXTOS_ESTADO = {
+    200: "OK", 201: "Created", 400: "Bad Request", 401: "Unauthorized",
+    404: "Not Found", 405: "Method Not Allowed", 409: "Conflict",
+    412: "Precondition Failed", 413: "Payload Too Large", 500: "Internal Server Error",
+}
+
+# El único hilo que usa los módulos de datos
+_hilo_datos = ThreadPoolExecutor(max_workers=1, thread_name_prefix="almacenamiento")
+
+# Cola de escrituras pendientes: (operación, futuro con la respuesta).
+# Se crea al arrancar el servicio, dentro de su bucle de asyncio.
+_cola_escrituras = None
+
+_estadisticas = {"pedidos": 0, "escrituras": 0, "lotes": 0, "lotes_repetidos": 0}
+
+
+class _PedidoInvalido(Exception):
+    """
+    El pedido HTTP no se pudo leer; se responde con estado y se cierra la conexión.
+    """
+    def __init__(self, estado, mensaje):
+        super().__init__(mensaje)
+        self.estado = estado
+
+
+def _error(estado, mensaje):
+    return estado, {"error": mensaje}
+
+
+def _en_datos(funcion, *argumentos):
+    """
+    Ejecuta funcion en el hilo de almacenamiento (se espera con await).
+    """
+    return asyncio.get_running_loop().run_in_executor(_hilo_datos, funcion, *argumentos)
+
+
+def _como_dict(fila):
+    return None if fila is None else dict(fila.items())
+
+
+def _con_version(fila):
+    """
+    Devuelve (fila como diccionario, encabezados con su ETag), o None si no hay fila.
+    """
+    if fila is None:
+        return None
+    return _como_dict(fila), {"ETag": f'"{concurrencia.version_fila(fila)}"'}
+
+
+# =========================================================
+# Lectura de datos (en el hilo de almacenamiento)
+# =========================================================
+
+def precargar():
+    """
+    Carga las tablas y los índices en memoria antes de atender pedidos.
+    """
+    almacenamiento.asegurar_recuperacion()
+    for nombre_archivo in ("equipos.csv", "prestamos.csv", "usuarios.csv"):
+        almacenamiento.leer_tabla(nombre_archivo)
+    if almacenamiento.motor_sqlite() is None and almacenamiento.existe_tabla("prestamos.csv"):
+        for campo in (None, "equipo_id", "usuario_prestatario"):
+            indices.obtener_indice("prestamos.csv", campo)
+
+
+def _listar_equipos(estado):
+    return [_como_dict(e) for e in equipos.leer_equipos() if estado is None or e.get("estado_actual") == estado]
+
+
+def _buscar_historial(campo, valor):
+    resultados = indices.buscar_filas("prestamos.csv", campo, valor)
+    return [_como_dict(p) for p in archivado.completar_con_archivados(resultados, campo, valor)]
+
+
+def _exportar_reporte(anio, mes):
+    """
+    Deja al día el archivo del reporte (ver reportes.generar_reporte_mes) y
+    lo devuelve abierto, para enviarlo de a bloques. None si no hay devoluciones.
+    """
+    nombre_archivo, cantidad, _ = reportes.generar_reporte_mes(anio, mes)
+    if cantidad == 0:
+        return None
+    return open(nombre_archivo, "rb")
+
+
+def _revisar_solicitud(equipo_id, tipo_usuario, fecha_prestamo, dias_solicitados):
+    """
+    Devuelve (equipo, motivo por el que no se puede pedir o None).
+    """
+    equipo = equipos.obtener_equipo_por_id(equipo_id)
+    return equipo, prestamos.validar_solicitud(equipo, tipo_usuario, fecha_prestamo, dias_solicitados)
+
+
+# =========================================================
+# Escrituras: cola y escritor por lotes
+# =========================================================
+
+def _ejecutar(operacion):
+    """
+    Ejecuta una operación de escritura y devuelve (guardado, respuesta).
+    """
+    try:
+        return operacion()
+    except Exception as e:
+        print(f"Error al guardar: {e}")
+        return False, _error(500, f"Error al guardar: {e}")
+
+
+def _cancelar_todo():
+    """
+    Descarta la transacción abierta, aunque una operación que falló la haya dejado anidada.
+    """
+    while almacenamiento.en_transaccion():
+        almacenamiento.cancelar_transaccion()
+
+
+def _guardar_lote(operaciones):
+    """
+    Guarda un lote de operaciones en una sola transacción y devuelve la
+    respuesta de cada una. Si alguna falla, se descarta el lote y se
+    vuelve a guardar de a una operación. Se ejecuta en el hilo de almacenamiento.
+    """
+    _estadisticas["lotes"] += 1
+    _estadisticas["escrituras"] += len(operaciones)
+
+    if len(operaciones) > 1:
+        almacenamiento.iniciar_transaccion()
+        respuestas = []
+        for operacion in operaciones:
+            guardado, respuesta = _ejecutar(operacion)
+            # Una operación que falla marca la transacción como fallida: no se sigue
+            if not guardado or not almacenamiento.en_transaccion():
+                break
+            respuestas.append(respuesta)
+        else:
+            if almacenamiento.confirmar_transaccion():
+                return respuestas
+        _cancelar_todo()
+        _estadisticas["lotes_repetidos"] += 1
+
+    respuestas = []
+    for operacion in operaciones:
+        respuestas.append(_ejecutar(operacion)[1])
+        _cancelar_todo()  # por si la operación terminó con una excepción
+    return respuestas
+
+
+async def _escritor():
+    """
+    Toma de la cola todas las escrituras que se juntaron, las guarda en un
+    lote y responde a cada pedido.
+    """
+    while True:
+        lote = [await _cola_escrituras.get()]
+        while len(lote) < LOTE_MAXIMO and not _cola_escrituras.empty():
+            lote.append(_cola_escrituras.get_nowait())
+        try:
+            respuestas = await _en_datos(_guardar_lote, [operacion for operacion, _ in lote])
+        except Exception as e:
+            respuestas = [_error(500, f"Error al guardar: {e}")] * len(lote)
+        for (_, futuro), respuesta in zip(lote, respuestas):
+            if not futuro.done():
+                futuro.set_result(respuesta)
+
+
+async def _escribir(operacion):
+    """
+    Pone una operación en la cola y espera su respuesta (cuando ya se guardó).
+    La operación se ejecuta en el hilo de almacenamiento y devuelve
+    (guardado, respuesta).
+    """
+    futuro = asyncio.get_running_loop().create_future()
+    await _cola_escrituras.put((operacion, futuro))
+    return await futuro
+
+
+# =========================================================
+# Operaciones de escritura (en el hilo de almacenamiento)
+# =========================================================
+
+def _guardar_equipo(nuevo_equipo):
+    guardado, mensaje = equipos.guardar_equipo_nuevo(nuevo_equipo)
+    if not guardado:
+        return False, _error(409, f"No se pudo registrar el equipo {nuevo_equipo['equipo_id']}: {mensaje}")
+    return True, (201, nuevo_equipo)
+
+
+def _guardar_solicitud(equipo, usuario_prestatario, tipo_usuario, fecha_prestamo, dias_solicitados):
+    prestamo_id, mensaje = prestamos.guardar_solicitud(equipo, usuario_prestatario, tipo_usuario,
+                                                       fecha_prestamo, dias_solicitados)
+    if prestamo_id is None:
+        return False, _error(409, f"No se pudo registrar la solicitud: {mensaje}")
+    return True, (201, *_con_version(prestamos.obtener_prestamo_por_id(prestamo_id)))
+
+
+def _guardar_en_prestamo(prestamo_id, version, procesar):
+    """
+    Ejecuta procesar() (que devuelve (procesado, mensaje)) en una transacción,
+    si el préstamo sigue en la versión pedida con If-Match (o si no se pidió).
+    """
+    almacenamiento.iniciar_transaccion()
+    if version is not None and not almacenamiento.verificar_version("prestamos.csv", prestamo_id, version):
+        almacenamiento.cancelar_transaccion()
+        return False, _error(412, f"El préstamo {prestamo_id} cambió desde la versión indicada en If-Match")
+
+    procesado, mensaje = procesar()
+    if not procesado:
+        almacenamiento.cancelar_transaccion()
+        return False, _error(409, f"No se pudo guardar el préstamo {prestamo_id}: {mensaje}")
+    if not almacenamiento.confirmar_transaccion():
+        return False, _error(409, f"No se pudo guardar el préstamo {prestamo_id}: error al guardar los cambios")
+    return True, (200, *_con_version(prestamos.obtener_prestamo_por_id(prestamo_id)))
+
+
+def _decidir(prestamo_id, decision, version):
+    def procesar():
+        _, procesado, mensaje = prestamos.procesar_prestamos_en_lote(decision, [prestamo_id])[0]
+        return procesado, mensaje
+    return _guardar_en_prestamo(prestamo_id, version, procesar)
+
+
+def _devolver(prestamo_id, fecha_devolucion, version):
+    def procesar():
+        _, _, procesado, mensaje = prestamos.procesar_devoluciones_en_lote([f"{prestamo_id},{fecha_devolucion}"])[0]
+        return procesado, mensaje
+    return _guardar_en_prestamo(prestamo_id, version, procesar)
+
+
+# =========================================================
+# Rutas
+# =========================================================
+
+async def _autenticado(pedido):
+    """
+    Indica si el pedido trae un usuario y contraseña válidos (autenticación Basic).
+    """
+    encabezado = pedido["encabezados"].get("authorization", "")
+    if not encabezado.startswith("Basic "):
+        return False
+    try:
+        usuario, _, contrasena = base64.b64decode(encabezado[6:], validate=True).decode("utf-8").partition(":")
+    except (ValueError, UnicodeDecodeError):
+        return False
+    return await _en_datos(usuarios.validar_credenciales, usuario, contrasena)
+
+
+def _no_autenticado():
+    return 401, {"error": "Usuario o contraseña incorrectos"}, {"WWW-Authenticate": 'Basic realm="TechLab"'}
+
+
+def _leer_json(pedido):
+    """
+    Devuelve el cuerpo del pedido como diccionario, o None si no es un objeto JSON.
+    """
+    try:
+        datos = json.loads(pedido["cuerpo"] or b"{}")
+    except (ValueError, UnicodeDecodeError):
+        return None
+    return datos if isinstance(datos, dict) else None
+
+
+def _texto(datos, campo):
+    valor = datos.get(campo)
+    return "" if valor is None else str(valor).strip()
+
+
+def _version_pedida(pedido):
+    """
+    Devuelve la versión del encabezado If-Match, o None si no vino.
+    """
+    valor = pedido["encabezados"].get("if-match", "").strip()
+    if not valor or valor == "*":
+        return None
+    return valor.removeprefix("W/").strip('"')
+
+
+async def listar_equipos(pedido):
+    return 200, await _en_datos(_listar_equipos, pedido["consulta"].get("estado"))
+
+
+async def ver_equipo(pedido, equipo_id):
+    respuesta = _con_version(await _en_datos(equipos.obtener_equipo_por_id, equipo_id))
+    if respuesta is None:
+        return _error(404, f"No existe el equipo '{equipo_id}'")
+    return 200, *respuesta
+
+
+async def registrar_equipo(pedido):
+    if not await _autenticado(pedido):
+        return _no_autenticado()
+    datos = _leer_json(pedido)
+    if datos is None:
+        return _error(400, "El cuerpo debe ser un objeto JSON")
+    faltan = [campo for campo in ("equipo_id", "nombre_equipo", "categoria") if not _texto(datos, campo)]
+    if faltan:
+        return _error(400, f"Faltan datos: {', '.join(faltan)}")
+
+    equipo_id = _texto(datos, "equipo_id")
+    if await _en_datos(equipos.obtener_equipo_por_id, equipo_id) is not None:
+        return _error(409, f"Ya existe un equipo con ID '{equipo_id}'")
+
+    nuevo_equipo = {
+        "equipo_id": equipo_id,
+        "nombre_equipo": _texto(datos, "nombre_equipo"),
+        "categoria": _texto(datos, "categoria"),
+        "estado_actual": "DISPONIBLE",
+        "fecha_registro": datetime.now().strftime("%Y-%m-%d"),
+        "descripcion": _texto(datos, "descripcion"),
+    }
+    return await _escribir(lambda: _guardar_equipo(nuevo_equipo))
+
+
+async def listar_prestamos(pedido):
+    estado = pedido["consulta"].get("estado", "").upper()
+    if not estado:
+        return _error(400, "Indique el estado (?estado=PENDIENTE, APROBADO, ...) o use /historial")
+    filas = await _en_datos(lector_mapeado.filtrar, "prestamos.csv", "estado", estado)
+    return 200, [_como_dict(p) for p in filas]
+
+
+async def ver_prestamo(pedido, prestamo_id):
+    respuesta = _con_version(await _en_datos(prestamos.obtener_prestamo_por_id, prestamo_id))
+    if respuesta is None:
+        return _error(404, f"No existe el préstamo '{prestamo_id}'")
+    return 200, *respuesta
+
+
+async def solicitar_prestamo(pedido):
+    if not await _autenticado(pedido):
+        return _no_autenticado()
+    datos = _leer_json(pedido)
+    if datos is None:
+        return _error(400, "El cuerpo debe ser un objeto JSON")
+    campos = ("equipo_id", "usuario_prestatario", "tipo_usuario", "fecha_prestamo", "dias_solicitados")
+    faltan = [campo for campo in campos if not _texto(datos, campo)]
+    if faltan:
+        return _error(400, f"Faltan datos: {', '.join(faltan)}")
+
+    equipo_id = _texto(datos, "equipo_id")
+    usuario_prestatario = _texto(datos, "usuario_prestatario")
+    tipo_usuario = _texto(datos, "tipo_usuario").upper()
+    fecha_prestamo = _texto(datos, "fecha_prestamo")
+    try:
+        dias_solicitados = int(_texto(datos, "dias_solicitados"))
+    except ValueError:
+        return _error(400, "Los días solicitados deben ser un número entero")
+
+    # Los datos del pedido se revisan acá; lo que depende del equipo, en el hilo de datos
+    dias_maximos = prestamos.obtener_dias_maximos(tipo_usuario)
+    if dias_maximos == 0:
+        return _error(400, "Tipo de usuario inválido (ESTUDIANTE, INSTRUCTOR o ADMINISTRATIVO)")
+    if not prestamos.validar_fecha(fecha_prestamo):
+        return _error(400, "Fecha de préstamo inválida (use YYYY-MM-DD)")
+    if not 0 < dias_solicitados <= dias_maximos:
+        return _error(400, f"Los días solicitados deben estar entre 1 y {dias_maximos}")
+
+    equipo, motivo = await _en_datos(_revisar_solicitud, equipo_id, tipo_usuario, fecha_prestamo, dias_solicitados)
+    if equipo is None:
+        return _error(404, f"No existe el equipo '{equipo_id}'")
+    if motivo is not None:
+        return _error(409, f"No se puede solicitar el equipo '{equipo_id}': {motivo}")
+
+    return await _escribir(lambda: _guardar_solicitud(equipo, usuario_prestatario, tipo_usuario,
+                                                      fecha_prestamo, dias_solicitados))
+
+
+async def _revisar_prestamo(prestamo_id, estado_esperado, version):
+    """
+    Revisa un préstamo antes de poner su cambio en la cola.
+    Devuelve la respuesta de error, o None si se puede seguir.
+    """
+    prestamo = await _en_datos(prestamos.obtener_prestamo_por_id, prestamo_id)
+    if prestamo is None:
+        return _error(404, f"No existe el préstamo '{prestamo_id}'")
+    if version is not None and concurrencia.version_fila(prestamo) != version:
+        return _error(412, f"El préstamo {prestamo_id} cambió desde la versión indicada en If-Match")
+    if prestamo.get("estado") != estado_esperado:
+        return _error(409, f"El préstamo {prestamo_id} está {prestamo.get('estado')}, no {estado_esperado}")
+    return None
+
+
+async def decidir_prestamo(pedido, prestamo_id, accion):
+    if not await _autenticado(pedido):
+        return _no_autenticado()
+    version = _version_pedida(pedido)
+    error = await _revisar_prestamo(prestamo_id, "PENDIENTE", version)
+    if error is not None:
+        return error
+    decision = "APROBADO" if accion == "aprobar" else "RECHAZADO"
+    return await _escribir(lambda: _decidir(prestamo_id, decision, version))
+
+
+async def devolver_prestamo(pedido, prestamo_id):
+    if not await _autenticado(pedido):
+        return _no_autenticado()
+    datos = _leer_json(pedido)
+    if datos is None:
+        return _error(400, "El cuerpo debe ser un objeto JSON")
+    fecha_devolucion = _texto(datos, "fecha_devolucion")
+    if not prestamos.validar_fecha(fecha_devolucion):
+        return _error(400, "Fecha de devolución inválida (use YYYY-MM-DD)")
+    version = _version_pedida(pedido)
+    error = await _revisar_prestamo(prestamo_id, "APROBADO", version)
+    if error is not None:
+        return error
+    return await _escribir(lambda: _devolver(prestamo_id, fecha_devolucion, version))
+
+
+async def consultar_historial(pedido):
+    consulta = pedido["consulta"]
+    for parametro, campo in (("equipo_id", "equipo_id"), ("usuario", "usuario_prestatario")):
+        if consulta.get(parametro):
+            return 200, await _en_datos(_buscar_historial, campo, consulta[parametro])
+    return _error(400, "Indique ?equipo_id=... o ?usuario=...")
+
+
+async def exportar_reporte(pedido, anio, mes):
+    mes = mes.zfill(2)
+    if not 1 <= int(mes) <= 12:
+        return _error(400, "El mes debe estar entre 01 y 12")
+    archivo = await _en_datos(_exportar_reporte, anio, mes)
+    if archivo is None:
+        return _error(404, f"No hay préstamos devueltos en {mes}/{anio}")
+    return 200, archivo, {"Content-Disposition": f'attachment; filename="reporte_prestamos_{anio}_{mes}.csv"'}
+
+
+async def ver_estadisticas(pedido):
+    def leer():
+        return {
+            "servicio": dict(_estadisticas, cola=_cola_escrituras.qsize()),
+            "cache": almacenamiento.estadisticas_cache(),
+            "concurrencia": concurrencia.estadisticas(),
+        }
+    return 200, await _en_datos(leer)
+
+
+# (método, ruta, función); los grupos de la ruta se pasan como argumentos
+RUTAS = [
+    ("GET", r"/equipos", listar_equipos),
+    ("POST", r"/equipos", registrar_equipo),
+    ("GET", r"/equipos/([^/]+)", ver_equipo),
+    ("GET", r"/prestamos", listar_prestamos),
+    ("POST", r"/prestamos", solicitar_prestamo),
+    ("GET", r"/prestamos/([^/]+)", ver_prestamo),
+    ("POST", r"/prestamos/([^/]+)/(aprobar|rechazar)", decidir_prestamo),
+    ("POST", r"/prestamos/([^/]+)/devolver", devolver_prestamo),
+    ("GET", r"/historial", consultar_historial),
+    ("GET", r"/reportes/(\d{4})/(\d{1,2})", exportar_reporte),
+    ("GET", r"/estadisticas", ver_estadisticas),
+]
+_RUTAS = [(metodo, re.compile(patron), funcion) for metodo, patron, funcion in RUTAS]
+
+
+async def responder(pedido):
+    """
+    Busca la ruta del pedido y devuelve (estado, datos, encabezados).
+    """
+    _estadisticas["pedidos"] += 1
+    metodos = []
+    for metodo, patron, funcion in _RUTAS:
+        coincidencia = patron.fullmatch(pedido["ruta"])
+        if coincidencia is None:
+            continue
+        if metodo != pedido["metodo"]:
+            metodos.append(metodo)
+            continue
+        try:
+            estado, datos, *resto = await funcion(pedido, *map(unquote, coincidencia.groups()))
+        except Exception as e:
+            print(f"Error al atender {pedido['metodo']} {pedido['ruta']}: {e}")
+            return 500, {"error": "Error interno del servicio"}, {}
+        return estado, datos, resto[0] if resto else {}
+
+    if metodos:
+        return 405, {"error": "Método no permitido"}, {"Allow": ", ".join(metodos)}
+    return 404, {"error": f"No existe la ruta {pedido['ruta']}"}, {}
+
+
+# =========================================================
+# HTTP
+# =========================================================
+
+async def _leer_pedido(lector):
+    """
+    Lee un pedido HTTP/1.1 de la conexión. Devuelve un diccionario con
+    metodo, ruta, consulta, encabezados, cuerpo y mantener (si la conexión
+    sigue abierta), o None si el cliente cerró la conexión.
+    """
+    try:
+        cabecera = await lector.readuntil(b"\r\n\r\n")
+    except asyncio.IncompleteReadError:
+        return None
+    except asyncio.LimitOverrunError:
+        raise _PedidoInvalido(400, "Encabezados demasiado largos")
+
+    lineas = cabecera.decode("latin-1").split("\r\n")
+    partes = lineas[0].split()
+    if len(partes) != 3 or not partes[2].startswith("HTTP/1."):
+        raise _PedidoInvalido(400, "Línea de pedido inválida")
+    metodo, destino, version = partes
+
+    encabezados = {}
+    for linea in lineas[1:]:
+        if linea:
+            nombre, _, valor = linea.partition(":")
+            encabezados[nombre.strip().lower()] = valor.strip()
+
+    if "transfer-encoding" in encabezados:
+        raise _PedidoInvalido(400, "No se admite Transfer-Encoding, use Content-Length")
+    try:
+        largo = int(encabezados.get("content-length", "0"))
+    except ValueError:
+        raise _PedidoInvalido(400, "Content-Length inválido")
+    if largo > TAMANO_MAXIMO_CUERPO:
+        raise _PedidoInvalido(413, "El cuerpo del pedido es demasiado grande")
+    cuerpo = await lector.readexactly(largo) if largo > 0 else b""
+
+    conexion = encabezados.get("connection", "").lower()
+    mantener = conexion != "close" if version == "HTTP/1.1" else conexion == "keep-alive"
+    url = urlsplit(destino)
+    return {
+        "metodo": metodo,
+        "ruta": url.path.rstrip("/") or "/",
+        "consulta": dict(parse_qsl(url.query)),
+        "encabezados": encabezados,
+        "cuerpo": cuerpo,
+        "mantener": mantener,
+    }
+
+
+def _armar_respuesta(estado, datos, encabezados, mantener):
+    """
+    Arma los bytes de la respuesta: JSON, o CSV si datos es un texto o un
+    archivo abierto. Del archivo solo se arman los encabezados: el cuerpo
+    se envía después con _enviar_archivo.
+    """
+    if isinstance(datos, io.BufferedReader):
+        cuerpo = b""
+        largo = os.fstat(datos.fileno()).st_size
+        tipo = "text/csv; charset=utf-8"
+    elif isinstance(datos, str):
+        cuerpo = datos.encode("utf-8")
+        largo = len(cuerpo)
+        tipo = "text/csv; charset=utf-8"
+    else:
+        cuerpo = json.dumps(datos, ensure_ascii=False).encode("utf-8")
+        largo = len(cuerpo)
+        tipo = "application/json; charset=utf-8"
+    lineas = [
+        f"HTTP/1.1 {estado} {TEXTOS_ESTADO.get(estado, '')}",
+        f"Content-Type: {tipo}",
+        f"Content-Length: {largo}",
+        f"Connection: {'keep-alive' if mantener else 'close'}",
+    ]
+    lineas.extend(f"{nombre}: {valor}" for nombre, valor in encabezados.items())
+    return ("\r\n".join(lineas) + "\r\n\r\n").encode("utf-8") + cuerpo
+
+
+async def _enviar_archivo(archivo, escritor):
+    """
+    Envía el contenido del archivo de a bloques, sin cargarlo entero en memoria.
+    """
+    bucle = asyncio.get_running_loop()
+    while True:
+        bloque = await bucle.run_in_executor(None, archivo.read, TAMANO_BLOQUE_RESPUESTA)
+        if not bloque:
+            return
+        escritor.write(bloque)
+        await escritor.drain()
+
+
+async def atender(lector, escritor):
+    """
+    Atiende una conexión: responde sus pedidos de a uno hasta que se cierra.
+    """
+    try:
+        while True:
+            try:
+                pedido = await _leer_pedido(lector)
+            except _PedidoInvalido as e:
+                escritor.write(_armar_respuesta(e.estado, {"error": str(e)}, {}, False))
+                await escritor.drain()
+                break
+            if pedido is None:
+                break
+            estado, datos, encabezados = await responder(pedido)
+            try:
+                escritor.write(_armar_respuesta(estado, datos, encabezados, pedido["mantener"]))
+                if isinstance(datos, io.BufferedReader):
+                    await _enviar_archivo(datos, escritor)
+                await escritor.drain()
+            finally:
+                if isinstance(datos, io.BufferedReader):
+                    datos.close()
+            if not pedido["mantener"]:
+                break
+    except (ConnectionError, asyncio.IncompleteReadError):
+        pass  # el cliente cortó la conexión
+    finally:
+        escritor.close()
+
+
+async def servir(host=HOST, puerto=PUERTO):
+    """
+    Carga los datos, arranca el escritor por lotes y atiende conexiones hasta que se detenga.
+    """
+    global _cola_escrituras
+    _cola_escrituras = asyncio.Queue()
+    await _en_datos(precargar)
+    escritor = asyncio.create_task(_escritor())
+    servidor = await asyncio.start_server(atender, host, puerto)
+    print(f"Servicio TechLab en http://{host}:{puerto} (Ctrl+C para terminar)", flush=True)
+
+    # Ctrl+C o SIGTERM: se deja de atender y se espera a que termine el lote que se está guardando
+    detener = asyncio.Event()
+    with contextlib.suppress(NotImplementedError):  # Windows no tiene add_signal_handler
+        for senal in (signal.SIGINT, signal.SIGTERM):
+            asyncio.get_running_loop().add_signal_handler(senal, detener.set)
+    try:
+        async with servidor:
+            await detener.wait()
+    finally:
+        escritor.cancel()
+        _hilo_datos.shutdown()
+    print("\nServicio detenido.")
+
+
+def main():
+    puerto = int(sys.argv[1]) if len(sys.argv) > 1 else PUERTO
+    try:
+        asyncio.run(servir(HOST, puerto))
+    except KeyboardInterrupt:
+        print("\nServicio detenido.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,57 @@
+"""
+Configuración de las pruebas
+Los módulos del sistema están en la carpeta de arriba, y cada prueba
+trabaja en una carpeta de datos nueva (los archivos son relativos a la
+carpeta actual), sin nada en memoria de la prueba anterior.
+"""
+import os
+import sys
+
+import pytest
+
+CARPETA_PROYECTO = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if CARPETA_PROYECTO not in sys.path:
+    sys.path.insert(0, CARPETA_PROYECTO)
+
+import almacenamiento
+import archivado
+import indices
+import instantanea
+
+
+def _olvidar_todo():
+    almacenamiento.limpiar_cache()
+    indices._indices.clear()
+    archivado._indices.clear()
+    instantanea._abiertas.clear()
+
+
+@pytest.fixture(autouse=True)
+def carpeta_datos(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    _olvidar_todo()
+    yield tmp_path
+    _olvidar_todo()
+
+
+def prestamo(prestamo_id, estado="PENDIENTE", equipo_id="E1", usuario="ana"):
+    """
+    Fila de préstamo con todos los campos de prestamos.csv.
+    """
+    return {
+        "prestamo_id": prestamo_id, "equipo_id": equipo_id, "nombre_equipo": "Laptop",
+        "usuario_prestatario": usuario, "tipo_usuario": "ESTUDIANTE",
+        "fecha_solicitud": "2025-11-01", "fecha_prestamo": "2025-11-02", "fecha_devolucion": "",
+        "dias_autorizados": "3", "dias_reales_usados": "", "retraso": "", "estado": estado,
+        "mes": "11", "anio": "2025",
+    }
+
+
+def escribir_csv(nombre_archivo, filas, encabezados=almacenamiento.ENCABEZADOS_PRESTAMOS):
+    """
+    Escribe el CSV directamente, sin pasar por almacenamiento.py.
+    """
+    with open(nombre_archivo, "w", encoding="utf-8") as archivo:
+        archivo.write(",".join(encabezados) + "\n")
+        for fila in filas:
+            archivo.write(",".join(fila[encabezado] for encabezado in encabezados) + "\n")
@@ -0,0 +1,83 @@
+"""
+Pruebas de las búsquedas en los préstamos archivados (archivado.py).
+"""
+import gzip
+import os
+
+from conftest import escribir_csv, prestamo
+
+import almacenamiento
+import archivado
+import indices
+
+
+def _archivar(monkeypatch, cantidad=10):
+    """
+    Archiva cantidad préstamos DEVUELTOS (los pares de 2024, los impares
+    de 2025), en bloques de dos filas.
+    """
+    monkeypatch.setattr(archivado, "FILAS_POR_BLOQUE", 2)
+    filas = []
+    for numero in range(1, cantidad + 1):
+        fila = prestamo(f"P{numero:04d}", "DEVUELTO", equipo_id=f"E{numero % 3}", usuario=f"u{numero}")
+        fila["anio"] = "2024" if numero % 2 == 0 else "2025"
+        filas.append(fila)
+    escribir_csv("prestamos.csv", filas + [prestamo("P0099", "PENDIENTE")])
+    assert archivado.archivar_prestamos_cerrados() == {"2024": cantidad // 2, "2025": cantidad - cantidad // 2}
+    archivado._indices.clear()
+
+
+def _contar_bloques(monkeypatch):
+    leidos = []
+    original = archivado._filas_del_bloque
+
+    def contar(nombre_archivo, posicion, encabezados):
+        leidos.append((os.path.basename(nombre_archivo), posicion))
+        return original(nombre_archivo, posicion, encabezados)
+    monkeypatch.setattr(archivado, "_filas_del_bloque", contar)
+    return leidos
+
+
+def test_buscar_prestamo_descomprime_un_solo_bloque(monkeypatch):
+    _archivar(monkeypatch)
+    leidos = _contar_bloques(monkeypatch)
+
+    assert archivado.buscar_prestamo("P0007")["usuario_prestatario"] == "u7"
+    assert [nombre for nombre, _ in leidos] == ["prestamos_2025.csv.gz"]
+    assert archivado.buscar_prestamo("P0042") is None
+    assert len(leidos) == 1
+
+
+def test_historial_archivado_por_equipo_y_usuario(monkeypatch):
+    _archivar(monkeypatch)
+    leidos = _contar_bloques(monkeypatch)
+
+    encontrados = archivado.completar_con_archivados([], "equipo_id", "E1")
+    assert [p["prestamo_id"] for p in encontrados] == ["P0001", "P0004", "P0007", "P0010"]
+    assert [p["prestamo_id"] for p in archivado.buscar_archivados("usuario_prestatario", "u3")] == ["P0003"]
+    assert ("prestamos_2025.csv.gz", 0) not in leidos  # el bloque de los encabezados
+
+
+def test_indice_viejo_o_archivo_sin_bloques_se_reconstruye(monkeypatch):
+    _archivar(monkeypatch)
+    assert archivado.ultimo_numero() == 10
+
+    # Archivo de un año escrito como un único bloque, con un índice que ya no corresponde
+    nombre_archivo = archivado.archivo_anual("2025")
+    with gzip.open(nombre_archivo, "rt", encoding="utf-8") as archivo:
+        contenido = archivo.read()
+    with gzip.open(nombre_archivo, "wt", encoding="utf-8") as archivo:
+        archivo.write(contenido + contenido.splitlines()[-1].replace("P0009", "P0011") + "\n")
+    os.remove(indices.archivo_indice(nombre_archivo, "usuario_prestatario"))
+    archivado._indices.clear()
+
+    assert archivado.buscar_prestamo("P0011")["prestamo_id"] == "P0011"
+    assert [p["prestamo_id"] for p in archivado.buscar_archivados("usuario_prestatario", "u9")] == ["P0009", "P0011"]
+    assert archivado.ultimo_numero() == 11
+
+
+def test_recorrer_historial_junta_todos_los_anios(monkeypatch):
+    _archivar(monkeypatch, cantidad=5)
+    almacenamiento.limpiar_cache()
+    assert [p["prestamo_id"] for p in archivado.recorrer_historial()] == [
+        "P0001", "P0002", "P0003", "P0004", "P0005", "P0099"]
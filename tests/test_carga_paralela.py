@@ -0,0 +1,25 @@
+"""
+Pruebas de la lectura en paralelo de CSV grandes (carga_paralela.py).
+"""
+from conftest import escribir_csv, prestamo
+
+import almacenamiento
+import carga_paralela
+
+
+def test_sin_activarla_se_lee_en_serie(monkeypatch):
+    escribir_csv("prestamos.csv", [prestamo(f"P{numero:04d}") for numero in range(1, 101)])
+    monkeypatch.setattr(carga_paralela, "TAMANO_MINIMO", 1)
+    monkeypatch.delenv("TECHLAB_CARGA_PARALELA", raising=False)
+    monkeypatch.setattr(carga_paralela, "TRABAJADORES", carga_paralela._trabajadores_elegidos())
+    assert not carga_paralela.conviene("prestamos.csv")
+
+    monkeypatch.setattr(carga_paralela, "TRABAJADORES", 2)
+    assert carga_paralela.conviene("prestamos.csv")
+
+
+def test_en_paralelo_da_las_mismas_filas():
+    escribir_csv("prestamos.csv", [prestamo(f"P{numero:04d}", usuario=f"u{numero % 7}") for numero in range(1, 301)])
+    en_serie = almacenamiento._parsear_archivo("prestamos.csv")
+    en_paralelo = carga_paralela.parsear_archivo("prestamos.csv", 2)
+    assert [tuple(fila.items()) for fila in en_paralelo] == [tuple(fila.items()) for fila in en_serie]
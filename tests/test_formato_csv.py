@@ -0,0 +1,49 @@
+"""
+Pruebas del formato CSV compartido (formato_csv.py): lo que se escribe
+con unir se lee igual con dividir, dividir_bytes y filas.
+"""
+import pytest
+
+import almacenamiento
+import equipos
+import formato_csv
+import indices
+
+VALORES = [
+    ["E1", "Laptop", "laptops"],
+    ["E2", "Laptop 14\", gris", "con cargador, mouse"],
+    ["E3", "", ""],
+    ["", "", ""],
+    ["E4", '""', ",", '"'],
+    ["E5", "comillas \"adentro\"", "fin"],
+    [" E6", "espacios", "al final "],
+    ["E7", "tab\tadentro", "ñandú"],
+]
+
+
+@pytest.mark.parametrize("valores", VALORES)
+def test_unir_y_dividir_dan_los_mismos_valores(valores):
+    linea = formato_csv.unir(valores)
+    assert "\n" not in linea
+    assert formato_csv.dividir(linea) == valores
+    assert formato_csv.dividir_bytes(linea.encode("utf-8")) == [valor.encode("utf-8") for valor in valores]
+    assert list(formato_csv.filas([linea + "\n"], list)) == [valores]
+
+
+def test_las_lineas_sin_comas_ni_comillas_no_cambian():
+    assert formato_csv.unir(["P0001", "E1", "", "DEVUELTO"]) == "P0001,E1,,DEVUELTO"
+
+
+def test_los_saltos_de_linea_se_guardan_como_espacios():
+    linea = formato_csv.unir(["E1", "primera\nsegunda\r\ntercera\rcuarta", "x"])
+    assert formato_csv.dividir(linea) == ["E1", "primera segunda tercera cuarta", "x"]
+
+
+def test_equipo_con_comas_y_comillas_se_guarda_y_se_busca():
+    equipo = {"equipo_id": "E9", "nombre_equipo": 'Dron "X", con cámara', "categoria": "drones",
+              "estado_actual": "DISPONIBLE", "fecha_registro": "2025-11-01", "descripcion": "a,b,,c"}
+    assert equipos.guardar_equipo_nuevo(equipo)[0]
+    almacenamiento.limpiar_cache()
+
+    assert dict(almacenamiento.leer_tabla("equipos.csv")[0].items()) == equipo
+    assert dict(indices.buscar_fila("equipos.csv", "E9").items()) == equipo
@@ -0,0 +1,100 @@
+"""
+Pruebas de los índices (indices.py) cuando el CSV se reescribe.
+"""
+import os
+
+from conftest import escribir_csv, prestamo
+
+import almacenamiento
+import concurrencia
+import indices
+
+
+def _reescribir_en_el_lugar(nombre_archivo, filas):
+    """
+    Reescribe el CSV con el mismo inodo y la misma fecha de modificación
+    (como cuando el sistema de archivos reutiliza el inodo y la fecha no
+    llega a cambiar): solo el contenido permite notar el cambio.
+    """
+    estado = os.stat(nombre_archivo)
+    escribir_csv(nombre_archivo + ".nuevo", filas)
+    with open(nombre_archivo + ".nuevo", "rb") as nuevo, open(nombre_archivo, "r+b") as archivo:
+        archivo.write(nuevo.read())
+        archivo.truncate()
+    os.remove(nombre_archivo + ".nuevo")
+    os.utime(nombre_archivo, ns=(estado.st_atime_ns, estado.st_mtime_ns))
+    assert os.stat(nombre_archivo).st_ino == estado.st_ino
+
+
+def test_clave_nueva_despues_de_reescribir_con_el_mismo_tamano():
+    escribir_csv("prestamos.csv", [prestamo(f"P000{numero}") for numero in range(1, 6)])
+    assert indices.buscar_fila("prestamos.csv", "P0005") is not None
+
+    _reescribir_en_el_lugar("prestamos.csv", [prestamo(f"P000{numero}") for numero in (1, 2, 3, 4, 9)])
+    indices._indices.clear()  # como otro proceso: el índice se lee del disco
+
+    assert indices.buscar_fila("prestamos.csv", "P0009")["prestamo_id"] == "P0009"
+    assert indices.buscar_fila("prestamos.csv", "P0005") is None
+
+
+def test_dos_reescrituras_del_mismo_tamano_cambian_la_generacion():
+    escribir_csv("prestamos.csv", [prestamo(f"P000{numero}") for numero in range(1, 6)])
+    indices.obtener_indice("prestamos.csv")
+
+    for estado in ("APROBADO", "RECHAZADO"):
+        filas = [prestamo(f"P000{numero}", estado) for numero in (1, 2, 3, 4, 9)]
+        assert almacenamiento.guardar_tabla("prestamos.csv", almacenamiento.ENCABEZADOS_PRESTAMOS, filas)
+    almacenamiento.limpiar_cache()
+
+    assert "P0009" in indices.obtener_indice("prestamos.csv")
+    assert indices.buscar_fila("prestamos.csv", "P0001")["estado"] == "RECHAZADO"
+
+
+def test_verificar_version_despues_de_reescribir():
+    escribir_csv("prestamos.csv", [prestamo(f"P000{numero}") for numero in range(1, 6)])
+    indices.obtener_indice("prestamos.csv")
+
+    _reescribir_en_el_lugar("prestamos.csv", [prestamo(f"P000{numero}", "APROBADO") for numero in (1, 2, 3, 4, 9)])
+    indices._indices.clear()
+    almacenamiento.limpiar_cache()
+
+    actual = indices.buscar_fila("prestamos.csv", "P0009")
+    assert almacenamiento.verificar_version("prestamos.csv", "P0009", concurrencia.version_fila(actual))
+
+
+def test_filas_agregadas_al_final_se_indexan_sin_reconstruir():
+    escribir_csv("prestamos.csv", [prestamo("P0001")])
+    indices.obtener_indice("prestamos.csv")
+    assert almacenamiento.agregar_fila("prestamos.csv", almacenamiento.ENCABEZADOS_PRESTAMOS, prestamo("P0002"))
+    almacenamiento.limpiar_cache()
+
+    assert indices.buscar_fila("prestamos.csv", "P0002")["prestamo_id"] == "P0002"
+    assert indices._indices[("prestamos.csv", None)]["construido"] is not None
+
+
+def test_busqueda_por_campo_despues_de_reescribir_con_el_mismo_tamano():
+    escribir_csv("prestamos.csv", [prestamo(f"P000{numero}", usuario="ana") for numero in range(1, 6)])
+    assert len(indices.buscar_filas("prestamos.csv", "usuario_prestatario", "ana")) == 5
+
+    # Mismo tamaño: "ana" pasa a "eva" en dos filas y "eva" no estaba en el índice
+    filas = [prestamo(f"P000{numero}", usuario="eva" if numero > 3 else "ana") for numero in range(1, 6)]
+    _reescribir_en_el_lugar("prestamos.csv", filas)
+    indices._indices.clear()
+
+    assert [p["prestamo_id"] for p in indices.buscar_filas("prestamos.csv", "usuario_prestatario", "eva")] == \
+        ["P0004", "P0005"]
+    assert [p["prestamo_id"] for p in indices.buscar_filas("prestamos.csv", "usuario_prestatario", "ana")] == \
+        ["P0001", "P0002", "P0003"]
+
+
+def test_busqueda_por_campo_despues_de_dos_reescrituras():
+    escribir_csv("prestamos.csv", [prestamo(f"P000{numero}", equipo_id="E1") for numero in range(1, 6)])
+    indices.obtener_indice("prestamos.csv", "equipo_id")
+
+    for equipo_id in ("E2", "E3"):
+        filas = [prestamo(f"P000{numero}", equipo_id=equipo_id) for numero in range(1, 6)]
+        assert almacenamiento.guardar_tabla("prestamos.csv", almacenamiento.ENCABEZADOS_PRESTAMOS, filas)
+    almacenamiento.limpiar_cache()
+
+    assert len(indices.buscar_filas("prestamos.csv", "equipo_id", "E3")) == 5
+    assert indices.buscar_filas("prestamos.csv", "equipo_id", "E1") == []
@@ -0,0 +1,63 @@
+"""
+Pruebas de la instantánea por columnas (instantanea.py) cuando el CSV cambia.
+"""
+import os
+
+from conftest import escribir_csv, prestamo
+
+import almacenamiento
+import instantanea
+import lector_mapeado
+import prestamos
+
+
+def _estados():
+    return [p["estado"] for p in prestamos.leer_prestamos()]
+
+
+def test_dos_reescrituras_del_mismo_tamano_dejan_vieja_la_instantanea():
+    escribir_csv("prestamos.csv", [prestamo(f"P000{numero}", "PENDIENTE") for numero in range(1, 6)])
+    assert instantanea.generar_instantanea("prestamos.csv") == 5
+    assert instantanea.cargar("prestamos.csv") is not None
+
+    # PENDIENTE y RECHAZADO miden lo mismo: el CSV conserva su tamaño, y
+    # con dos reemplazos el sistema de archivos puede devolver el mismo inodo
+    for _ in range(2):
+        assert prestamos.guardar_prestamos([prestamo(f"P000{numero}", "RECHAZADO") for numero in range(1, 6)])
+    almacenamiento.limpiar_cache()
+    instantanea._abiertas.clear()
+
+    assert instantanea.cargar("prestamos.csv") is None
+    assert _estados() == ["RECHAZADO"] * 5
+    assert lector_mapeado.filtrar("prestamos.csv", "estado", "PENDIENTE") == []
+
+
+def test_reescritura_en_el_lugar_con_el_mismo_tamano():
+    escribir_csv("prestamos.csv", [prestamo("P0001", "PENDIENTE")])
+    instantanea.generar_instantanea("prestamos.csv")
+    estado = os.stat("prestamos.csv")
+
+    with open("prestamos.csv", "r+b") as archivo:
+        contenido = archivo.read().replace(b"PENDIENTE", b"RECHAZADO")
+        archivo.seek(0)
+        archivo.write(contenido)
+    # La fecha de modificación es distinta aunque el inodo y el tamaño sean los mismos
+    os.utime("prestamos.csv", ns=(estado.st_atime_ns, estado.st_mtime_ns + 1))
+
+    assert instantanea.cargar("prestamos.csv") is None
+    assert _estados() == ["RECHAZADO"]
+
+
+def test_filas_agregadas_y_linea_cortada_al_final():
+    escribir_csv("prestamos.csv", [prestamo("P0001")])
+    instantanea.generar_instantanea("prestamos.csv")
+    assert almacenamiento.agregar_fila("prestamos.csv", almacenamiento.ENCABEZADOS_PRESTAMOS, prestamo("P0002"))
+
+    # Otro proceso está escribiendo la fila siguiente y todavía no terminó la línea
+    with open("prestamos.csv", "ab") as archivo:
+        archivo.write(b"P0003,E1,Lap")
+    almacenamiento.limpiar_cache()
+
+    tabla = instantanea.cargar("prestamos.csv")
+    assert tabla is not None
+    assert [p["prestamo_id"] for p in tabla] == ["P0001", "P0002"]
@@ -0,0 +1,40 @@
+"""
+Pruebas de la generación de las particiones mensuales (particiones.py).
+"""
+from conftest import escribir_csv, prestamo
+
+import almacenamiento
+import particiones
+import transacciones
+
+
+def _ids(anio, mes):
+    almacenamiento.limpiar_cache()
+    return [p["prestamo_id"] for p in particiones.leer_particion(anio, mes)]
+
+
+def test_reconstruir_no_vacia_el_registro_de_transacciones():
+    escribir_csv("prestamos.csv", [prestamo("P0001", "DEVUELTO"), prestamo("P0002", "PENDIENTE")])
+    assert _ids("2025", "11") == ["P0001"]
+
+    # Una devolución nueva deja su "agregar" sobre la partición en el registro
+    assert almacenamiento.actualizar_fila("prestamos.csv", almacenamiento.ENCABEZADOS_PRESTAMOS,
+                                          "P0002", {"estado": "DEVUELTO"})
+    assert particiones.agregar_devolucion(prestamo("P0002", "DEVUELTO"))
+    assert particiones.reconstruir_particiones() == 1
+    assert transacciones._leer_registro()
+
+    # Al repetir el registro, la reconstrucción va después del "agregar"
+    almacenamiento._recuperado = False
+    almacenamiento.asegurar_recuperacion()
+    assert _ids("2025", "11") == ["P0001", "P0002"]
+
+
+def test_meses_sin_devoluciones_quedan_vacios():
+    escribir_csv("prestamos.csv", [prestamo("P0001", "DEVUELTO")])
+    assert _ids("2025", "11") == ["P0001"]
+
+    escribir_csv("prestamos.csv", [prestamo("P0001", "PENDIENTE")])
+    almacenamiento.limpiar_cache()
+    assert particiones.reconstruir_particiones() == 0
+    assert _ids("2025", "11") == []
@@ -0,0 +1,41 @@
+"""
+Pruebas de la exportación de reportes mensuales (reportes.py).
+"""
+from conftest import escribir_csv, prestamo
+
+import almacenamiento
+import particiones
+import reportes
+
+
+def _ids(nombre_archivo):
+    with open(nombre_archivo, encoding="utf-8") as archivo:
+        return [linea.split(",", 1)[0] for linea in archivo.read().splitlines()[1:]]
+
+
+def test_el_reporte_se_lee_de_la_particion_del_mes():
+    escribir_csv("prestamos.csv", [prestamo("P0001", "DEVUELTO"), prestamo("P0002", "PENDIENTE")])
+    assert particiones.reconstruir_particiones() == 1
+
+    # Una fila que no pasó por la partición no entra al reporte
+    escribir_csv("prestamos.csv", [prestamo("P0001", "DEVUELTO"), prestamo("P0002", "DEVUELTO")])
+    almacenamiento.limpiar_cache()
+    nombre_archivo, cantidad, vigente = reportes.generar_reporte_mes("2025", "11")
+    assert (nombre_archivo, cantidad, vigente) == ("reporte_prestamos_2025_11.csv", 1, False)
+    assert _ids(nombre_archivo) == ["P0001"]
+
+
+def test_el_reporte_se_regenera_solo_si_cambia_la_particion():
+    escribir_csv("prestamos.csv", [prestamo("P0001", "DEVUELTO"), prestamo("P0002", "APROBADO")])
+    assert reportes.generar_reporte_mes("2025", "11")[1:] == (1, False)
+    assert reportes.generar_reporte_mes("2025", "11")[1:] == (1, True)
+
+    assert particiones.agregar_devolucion(prestamo("P0002", "DEVUELTO"))
+    assert reportes.generar_reporte_mes("2025", "11")[1:] == (2, False)
+    assert _ids("reporte_prestamos_2025_11.csv") == ["P0001", "P0002"]
+
+
+def test_mes_sin_devoluciones_no_escribe_archivo(tmp_path):
+    escribir_csv("prestamos.csv", [prestamo("P0001", "PENDIENTE")])
+    assert reportes.generar_reporte_mes("2025", "11")[1] == 0
+    assert not list(tmp_path.glob("reporte_*"))
@@ -0,0 +1,20 @@
+"""
+Pruebas de las escrituras por lotes del servicio (servicio.py).
+"""
+import servicio
+
+
+def _equipo(equipo_id):
+    return {"equipo_id": equipo_id, "nombre_equipo": "Laptop", "categoria": "laptops",
+            "estado_actual": "DISPONIBLE", "fecha_registro": "2025-11-01", "descripcion": ""}
+
+
+def test_el_error_de_una_operacion_del_lote_es_su_propio_mensaje():
+    operaciones = [lambda: servicio._guardar_equipo(_equipo("E1")),
+                   lambda: servicio._guardar_equipo(_equipo("E1")),
+                   lambda: servicio._guardar_equipo(_equipo("E2"))]
+    respuestas = servicio._guardar_lote(operaciones)
+
+    assert [respuesta[0] for respuesta in respuestas] == [201, 409, 201]
+    assert respuestas[1][1] == {"error": "No se pudo registrar el equipo E1: "
+                                         "otro usuario registró un equipo con ID 'E1'"}
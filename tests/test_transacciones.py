@@ -0,0 +1,111 @@
+"""
+Pruebas del registro de transacciones (transacciones.py): la recuperación
+cuando el programa se cortó mientras guardaba, las transacciones anidadas,
+el punto de control y la generación de los archivos.
+"""
+import os
+
+from conftest import escribir_csv, prestamo
+
+import almacenamiento
+import formato_csv
+import indices
+import transacciones
+
+
+def _linea(fila):
+    return formato_csv.unir([fila[encabezado] for encabezado in almacenamiento.ENCABEZADOS_PRESTAMOS]) + "\n"
+
+
+def _recuperar(monkeypatch):
+    """
+    Repite el registro como al abrir el programa de nuevo.
+    """
+    monkeypatch.setattr(almacenamiento, "_recuperado", False)
+    almacenamiento.limpiar_cache()
+    almacenamiento.asegurar_recuperacion()
+
+
+def _cortar_antes_de_aplicar(operaciones):
+    """
+    Deja la transacción confirmada en el registro sin aplicarla a los archivos.
+    """
+    transacciones.escribir_registro(operaciones)
+
+
+def test_transaccion_confirmada_sin_aplicar_se_repite(monkeypatch):
+    escribir_csv("prestamos.csv", [prestamo("P0001")])
+    _cortar_antes_de_aplicar([{"tipo": "agregar", "archivo": "prestamos.csv",
+                               "posicion": os.path.getsize("prestamos.csv"), "texto": _linea(prestamo("P0002"))}])
+
+    _recuperar(monkeypatch)
+    assert [p["prestamo_id"] for p in almacenamiento.leer_tabla("prestamos.csv")] == ["P0001", "P0002"]
+    assert os.path.getsize(transacciones.ARCHIVO_REGISTRO) == 0
+
+
+def test_repetir_una_transaccion_ya_aplicada_no_duplica_filas(monkeypatch):
+    escribir_csv("prestamos.csv", [prestamo("P0001")])
+    assert almacenamiento.agregar_fila("prestamos.csv", almacenamiento.ENCABEZADOS_PRESTAMOS, prestamo("P0002"))
+    assert transacciones._leer_registro()
+
+    _recuperar(monkeypatch)
+    assert [p["prestamo_id"] for p in almacenamiento.leer_tabla("prestamos.csv")] == ["P0001", "P0002"]
+
+
+def test_transaccion_sin_terminar_de_escribir_se_ignora(monkeypatch):
+    escribir_csv("prestamos.csv", [prestamo("P0001")])
+    with open(transacciones.ARCHIVO_REGISTRO, "w", encoding="utf-8") as archivo:
+        archivo.write('{"operaciones": [{"tipo": "borrar", "archivo": "prestamos.csv"}')
+
+    _recuperar(monkeypatch)
+    assert [p["prestamo_id"] for p in almacenamiento.leer_tabla("prestamos.csv")] == ["P0001"]
+
+
+def test_el_indice_ve_las_filas_recuperadas(monkeypatch):
+    escribir_csv("prestamos.csv", [prestamo(f"P000{numero}", "RECHAZADO") for numero in range(1, 4)])
+    assert indices.buscar_fila("prestamos.csv", "P0001") is not None
+
+    # Reemplazo con el mismo tamaño que quedó en el registro sin aplicarse
+    filas = [prestamo("P0001", "RECHAZADO"), prestamo("P0002", "RECHAZADO"), prestamo("P0004", "RECHAZADO")]
+    texto = ",".join(almacenamiento.ENCABEZADOS_PRESTAMOS) + "\n" + "".join(_linea(fila) for fila in filas)
+    _cortar_antes_de_aplicar([{"tipo": "reemplazar", "archivo": "prestamos.csv", "texto": texto}])
+
+    _recuperar(monkeypatch)
+    assert indices.buscar_fila("prestamos.csv", "P0003") is None
+    assert indices.buscar_fila("prestamos.csv", "P0004")["prestamo_id"] == "P0004"
+
+
+def test_transacciones_anidadas_se_escriben_en_una_sola_linea():
+    escribir_csv("prestamos.csv", [prestamo("P0001")])
+    almacenamiento.iniciar_transaccion()
+    for numero in (2, 3):
+        assert almacenamiento.agregar_fila("prestamos.csv", almacenamiento.ENCABEZADOS_PRESTAMOS,
+                                           prestamo(f"P000{numero}"))
+    assert almacenamiento.confirmar_transaccion()
+
+    assert len(transacciones._leer_registro()) == 1
+    assert [p["prestamo_id"] for p in almacenamiento.leer_tabla("prestamos.csv")] == ["P0001", "P0002", "P0003"]
+
+
+def test_punto_de_control_vacia_el_registro_al_superar_el_limite(monkeypatch):
+    escribir_csv("prestamos.csv", [prestamo("P0001")])
+    monkeypatch.setattr(transacciones, "LIMITE_REGISTRO_BYTES", 1)
+    assert almacenamiento.agregar_fila("prestamos.csv", almacenamiento.ENCABEZADOS_PRESTAMOS, prestamo("P0002"))
+
+    assert os.path.getsize(transacciones.ARCHIVO_REGISTRO) == 0
+    _recuperar(monkeypatch)
+    assert [p["prestamo_id"] for p in almacenamiento.leer_tabla("prestamos.csv")] == ["P0001", "P0002"]
+
+
+def test_la_generacion_cambia_solo_si_el_archivo_no_crece_al_final():
+    operaciones = [
+        ({"tipo": "agregar", "archivo": "tabla.csv", "posicion": 0, "texto": "a\n"}, 1),  # archivo nuevo
+        ({"tipo": "agregar", "archivo": "tabla.csv", "posicion": 2, "texto": "b\n"}, 1),
+        ({"tipo": "reemplazar", "archivo": "tabla.csv", "texto": "c\n"}, 2),
+        ({"tipo": "reemplazar", "archivo": "tabla.csv", "texto": "c\n"}, 3),  # al repetirse también
+        ({"tipo": "borrar", "archivo": "tabla.csv"}, 4),
+        ({"tipo": "borrar", "archivo": "tabla.csv"}, 4),  # ya no existía
+    ]
+    for operacion, generacion in operaciones:
+        transacciones.aplicar_operacion(operacion)
+        assert transacciones.generacion("tabla.csv") == generacion
@@ -0,0 +1,202 @@
+"""
+Módulo del registro de transacciones (write-ahead log)
+Antes de modificar los archivos de datos, cada transacción se escribe
+completa en transacciones.wal y se sincroniza con el disco una sola vez.
+Si el programa se corta a mitad de camino, al volver a abrirlo se
+repiten las transacciones del registro y los archivos quedan consistentes.
+
+Cada línea de transacciones.wal es una transacción confirmada, en JSON:
+    {"operaciones": [operacion, operacion, ...]}
+Una línea incompleta (sin salto de línea final o con JSON inválido) es una
+transacción que no llegó a confirmarse y se ignora.
+
+Tipos de operación (todas se pueden repetir sin cambiar el resultado):
+- {"tipo": "agregar", "archivo", "posicion", "texto"}: escribe texto a partir
+  del byte posicion y corta el archivo ahí
+- {"tipo": "reemplazar", "archivo", "texto"}: reemplaza el archivo completo
+  (archivo temporal + os.replace)
+- {"tipo": "borrar", "archivo"}: borra el archivo si existe
+
+Generación de un archivo: un número (en <archivo>.gen) que aumenta cada
+vez que el archivo se reemplaza, se borra o se vuelve a crear, es decir,
+cada vez que su contenido cambia de otra forma que agregando al final.
+Los índices y la instantánea la guardan para saber si el CSV que
+indexaron es el mismo: el inodo y el tamaño no alcanzan (el sistema de
+archivos reutiliza los inodos, y dos reescrituras seguidas pueden dejar
+el mismo inodo y el mismo tamaño) y la fecha de modificación cambia
+también al agregar filas.
+"""
+import json
+import os
+
+ARCHIVO_REGISTRO = "transacciones.wal"
+
+# Cuando el registro supera este tamaño se hace un punto de control
+LIMITE_REGISTRO_BYTES = 1024 * 1024
+
+
+def _a_bytes(texto):
+    """
+    Convierte el texto a bytes usando el salto de línea del sistema,
+    igual que cuando se escribe un archivo en modo texto.
+    """
+    return texto.replace("\n", os.linesep).encode("utf-8")
+
+
+def escribir_registro(operaciones):
+    """
+    Agrega una transacción al registro y la sincroniza con el disco.
+    Es el único fsync de la transacción: una vez que esta función
+    termina, la transacción está confirmada.
+    """
+    linea = json.dumps({"operaciones": operaciones}, ensure_ascii=False) + "\n"
+    with open(ARCHIVO_REGISTRO, "ab") as archivo:
+        archivo.write(linea.encode("utf-8"))
+        archivo.flush()
+        os.fsync(archivo.fileno())
+
+
+def archivo_generacion(nombre_archivo):
+    """
+    Devuelve el nombre del archivo con la generación de un archivo de datos.
+    """
+    return nombre_archivo + ".gen"
+
+
+def generacion(nombre_archivo):
+    """
+    Devuelve la generación actual del archivo (0 si nunca se reemplazó).
+    """
+    try:
+        with open(archivo_generacion(nombre_archivo), "rb") as archivo:
+            return int(archivo.read() or 0)
+    except (FileNotFoundError, ValueError):
+        return 0
+
+
+def avanzar_generacion(nombre_archivo):
+    """
+    Aumenta la generación del archivo. Se llama antes de reemplazarlo: si
+    el programa se corta en el medio, a lo sumo se vuelve a construir un
+    índice que seguía sirviendo.
+    """
+    temporal = archivo_generacion(nombre_archivo) + ".tmp"
+    with open(temporal, "wb") as archivo:
+        archivo.write(str(generacion(nombre_archivo) + 1).encode("ascii"))
+    os.replace(temporal, archivo_generacion(nombre_archivo))
+
+
+def aplicar_operacion(operacion):
+    """
+    Aplica una operación del registro sobre los archivos de datos
+    (sin sincronizar con el disco: de eso se encarga el punto de control).
+    """
+    tipo = operacion["tipo"]
+    nombre_archivo = operacion["archivo"]
+
+    if tipo == "agregar":
+        modo = "r+b" if os.path.exists(nombre_archivo) else "wb"
+        if modo == "wb":
+            avanzar_generacion(nombre_archivo)
+        with open(nombre_archivo, modo) as archivo:
+            archivo.seek(operacion["posicion"])
+            archivo.write(_a_bytes(operacion["texto"]))
+            archivo.truncate()
+
+    elif tipo == "reemplazar":
+        temporal = nombre_archivo + ".tmp"
+        with open(temporal, "wb") as archivo:
+            archivo.write(_a_bytes(operacion["texto"]))
+        avanzar_generacion(nombre_archivo)
+        os.replace(temporal, nombre_archivo)
+
+    elif tipo == "borrar":
+        if os.path.exists(nombre_archivo):
+            avanzar_generacion(nombre_archivo)
+            os.remove(nombre_archivo)
+
+
+def tamano_en_disco(texto):
+    """
+    Cantidad de bytes que ocupa el texto al escribirlo con aplicar_operacion.
+    """
+    return len(_a_bytes(texto))
+
+
+def _leer_registro():
+    """
+    Devuelve la lista de transacciones confirmadas del registro
+    (cada una es una lista de operaciones).
+    """
+    transacciones = []
+    try:
+        with open(ARCHIVO_REGISTRO, "rb") as archivo:
+            for linea in archivo:
+                if not linea.endswith(b"\n"):
+                    break  # última transacción cortada: no se confirmó
+                try:
+                    transacciones.append(json.loads(linea.decode("utf-8"))["operaciones"])
+                except (ValueError, KeyError):
+                    break
+    except FileNotFoundError:
+        pass
+    return transacciones
+
+
+def _sincronizar(nombre_archivo):
+    """
+    Pide al sistema operativo que grabe en disco el contenido del archivo.
+    """
+    try:
+        descriptor = os.open(nombre_archivo, os.O_RDONLY)
+    except FileNotFoundError:
+        return
+    try:
+        os.fsync(descriptor)
+    finally:
+        os.close(descriptor)
+
+
+def punto_de_control():
+    """
+    Sincroniza con el disco todos los archivos que aparecen en el registro
+    y después lo vacía: a partir de ahí esas transacciones ya no hace
+    falta repetirlas.
+    """
+    archivos = set()
+    for operaciones in _leer_registro():
+        for operacion in operaciones:
+            archivos.add(operacion["archivo"])
+
+    for nombre_archivo in archivos:
+        _sincronizar(nombre_archivo)
+        _sincronizar(archivo_generacion(nombre_archivo))
+
+    if os.path.exists(ARCHIVO_REGISTRO):
+        with open(ARCHIVO_REGISTRO, "wb") as archivo:
+            archivo.flush()
+            os.fsync(archivo.fileno())
+
+
+def necesita_punto_de_control():
+    """
+    Indica si el registro creció lo suficiente como para vaciarlo.
+    """
+    try:
+        return os.path.getsize(ARCHIVO_REGISTRO) > LIMITE_REGISTRO_BYTES
+    except FileNotFoundError:
+        return False
+
+
+def recuperar():
+    """
+    Repite, en orden, todas las transacciones confirmadas del registro
+    (por si el programa se cortó mientras las aplicaba) y hace un punto
+    de control. Devuelve la cantidad de transacciones repetidas.
+    """
+    transacciones = _leer_registro()
+    for operaciones in transacciones:
+        for operacion in operaciones:
+            aplicar_operacion(operacion)
+    punto_de_control()
+    return len(transacciones)
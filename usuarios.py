@@ -2,36 +2,14 @@
 Módulo para manejo de usuarios y autenticación
 Gestiona el inicio de sesión y validación de credenciales
 """
+import almacenamiento
 
 def leer_usuarios():
     """
     Lee el archivo usuarios.csv y retorna una lista de diccionarios
     Cada diccionario representa un usuario con sus datos
     """
-    usuarios = []
-    try:
-        # Abrir el archivo en modo lectura
-        with open("usuarios.csv", "r", encoding="utf-8") as archivo:
-            # Leer la primera línea (encabezados)
-            encabezados = archivo.readline().strip().split(",")
-            
-            # Leer cada línea restante
-            for linea in archivo:
-                linea = linea.strip()
-                if linea:  # Si la línea no está vacía
-                    # Separar los valores por coma
-                    valores = linea.split(",")
-                    # Crear un diccionario con los datos del usuario
-                    usuario = {}
-                    for i, encabezado in enumerate(encabezados):
-                        usuario[encabezado] = valores[i]
-                    usuarios.append(usuario)
-    except FileNotFoundError:
-        print("Error: No se encontró el archivo usuarios.csv")
-    except Exception as e:
-        print(f"Error al leer usuarios: {e}")
-    
-    return usuarios
+    return almacenamiento.leer_tabla("usuarios.csv")
 
 
 def validar_credenciales(usuario, contrasena):
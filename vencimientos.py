@@ -0,0 +1,389 @@
+"""
+Planificador de vencimientos de préstamos
+Mantiene en memoria una cola de prioridad (montículo, heapq) con los
+préstamos APROBADOS ordenados por el momento en que vencen, y un hilo
+que duerme hasta el próximo vencimiento. Cuando un préstamo pasa a estar
+atrasado se llaman los avisos (por defecto, una línea en vencimientos.log).
+
+- La cola se arma una vez a partir de prestamos.csv (filas APROBADO).
+- Después se actualiza de a un préstamo: aprobar agrega y devolver quita,
+  cada cambio es O(log n) y no hace falta volver a leer el historial.
+- Quitar es "perezoso": la entrada queda en el montículo y se descarta
+  cuando llega arriba, si el préstamo ya no está pendiente de vencer.
+
+Un préstamo de fecha_prestamo F y dias_autorizados D está atrasado si se
+devuelve el día F + D + 1 o después (mismo criterio que registrar_devolucion),
+así que vence a la medianoche (hora local) en que empieza ese día.
+
+El hilo no lee los archivos de datos (la conexión de SQLite es del hilo
+principal): las lecturas se hacen en iniciar() y en sincronizar(), que el
+menú principal llama antes de mostrar las opciones para tomar los cambios
+hechos por otros procesos.
+
+Uso independiente (en primer plano, hasta Ctrl+C):
+    python vencimientos.py
+"""
+import heapq
+import os
+import threading
+import time
+from datetime import date, datetime
+
+import almacenamiento
+import analitica
+import fechas
+import formato_csv
+import lector_mapeado
+
+ARCHIVO_AVISOS = "vencimientos.log"
+ENCABEZADOS_AVISOS = ["fecha_hora", "prestamo_id", "equipo_id", "usuario_prestatario", "fecha_limite"]
+
+# Datos del préstamo que se guardan en la cola (copia, no la fila de la caché)
+CAMPOS_COLA = ["prestamo_id", "equipo_id", "usuario_prestatario", "fecha_prestamo", "dias_autorizados"]
+
+# Cada cuánto revisar si otro proceso cambió los préstamos (modo independiente),
+# y espera máxima del hilo (por si se ajusta el reloj del sistema)
+INTERVALO_SINCRONIZACION = 30
+ESPERA_MAXIMA = 60
+
+# =========================================================
+# Vencimiento de un préstamo
+# =========================================================
+
+def vencimiento(prestamo):
+    """
+    Devuelve (momento en que vence como timestamp, fecha límite) de un
+    préstamo, o None si no tiene fecha de préstamo o días autorizados válidos.
+    La fecha límite es el último día permitido (fecha_prestamo + dias_autorizados).
+    """
+    dia = fechas.dia_de(prestamo, "fecha_prestamo")
+    dias = analitica._entero_de(prestamo, "dias_autorizados")
+    if dia is None or dias == analitica.VACIO:
+        return None
+    try:
+        limite = date.fromordinal(dia + dias)
+        vence = datetime.fromordinal(dia + dias + 1).timestamp()
+    except (ValueError, OverflowError):
+        return None
+    return vence, limite
+
+
+def registrar_aviso(prestamo, fecha_limite):
+    """
+    Aviso por defecto: agrega una línea a vencimientos.log
+    (se crea con encabezados si no existe).
+    """
+    linea = [datetime.now().strftime("%Y-%m-%d %H:%M:%S"), prestamo.get("prestamo_id", ""),
+             prestamo.get("equipo_id", ""), prestamo.get("usuario_prestatario", ""), fecha_limite.isoformat()]
+    try:
+        nuevo = not os.path.exists(ARCHIVO_AVISOS)
+        with open(ARCHIVO_AVISOS, "a", encoding="utf-8") as archivo:
+            if nuevo:
+                archivo.write(",".join(ENCABEZADOS_AVISOS) + "\n")
+            archivo.write(formato_csv.unir(linea) + "\n")
+    except Exception as e:
+        print(f"Error al guardar el aviso de vencimiento: {e}")
+
+
+def prestamos_avisados():
+    """
+    Devuelve el conjunto de IDs de préstamo que ya tienen aviso en
+    vencimientos.log, para no avisar dos veces si se reinicia el programa.
+    """
+    avisados = set()
+    try:
+        with open(ARCHIVO_AVISOS, "r", encoding="utf-8") as archivo:
+            next(archivo, None)  # encabezados
+            for linea in archivo:
+                partes = formato_csv.dividir(linea.strip())
+                if len(partes) > 1:
+                    avisados.add(partes[1])
+    except FileNotFoundError:
+        pass
+    except Exception as e:
+        print(f"Error al leer {ARCHIVO_AVISOS}: {e}")
+    return avisados
+
+
+def _firma_prestamos():
+    """
+    Tupla que cambia cuando otro proceso modifica los préstamos:
+    (fecha de modificación, tamaño, inodo) de los archivos que los guardan.
+    """
+    if almacenamiento.motor_sqlite() is not None:
+        archivos = ["techlab.db", "techlab.db-wal"]
+    else:
+        archivos = ["prestamos.csv", almacenamiento.archivo_cambios("prestamos.csv")]
+    firma = []
+    for nombre in archivos:
+        try:
+            estado = os.stat(nombre)
+            firma.append((estado.st_mtime_ns, estado.st_size, estado.st_ino))
+        except FileNotFoundError:
+            firma.append(None)
+    return tuple(firma)
+
+# =========================================================
+# Cola de vencimientos
+# =========================================================
+
+class Planificador:
+    """
+    Cola de préstamos por vencer y el hilo que avisa cuando vencen.
+    - avisos: lista de funciones aviso(prestamo, fecha_limite); prestamo es
+      un diccionario con CAMPOS_COLA.
+    """
+
+    def __init__(self, avisos=None):
+        self.avisos = list(avisos) if avisos is not None else [registrar_aviso]
+        self._monticulo = []      # (vence, prestamo_id)
+        self._pendientes = {}     # prestamo_id -> (vence, fecha_limite, datos)
+        self._avisados = set()
+        self._condicion = threading.Condition()
+        self._hilo = None
+        self._detenido = False
+
+    def __len__(self):
+        return len(self._pendientes)
+
+    def cargar(self, prestamos, avisados=()):
+        """
+        Reemplaza la cola por los préstamos dados (los APROBADOS) y arma el
+        montículo de una vez (heapify, O(n)). Los IDs en avisados se saltan.
+        """
+        with self._condicion:
+            self._avisados = set(avisados)
+            self._pendientes = {}
+            for prestamo in prestamos:
+                self._guardar(prestamo)
+            self._monticulo = [(vence, prestamo_id) for prestamo_id, (vence, _, _) in self._pendientes.items()]
+            heapq.heapify(self._monticulo)
+            self._condicion.notify()
+
+    def sincronizar(self, prestamos):
+        """
+        Ajusta la cola a la lista actual de préstamos APROBADOS: agrega los
+        nuevos y quita los que ya no están, sin rearmar el montículo.
+        """
+        with self._condicion:
+            vigentes = set()
+            for prestamo in prestamos:
+                prestamo_id = prestamo.get("prestamo_id")
+                vigentes.add(prestamo_id)
+                if prestamo_id not in self._pendientes:
+                    self.agregar(prestamo)
+            for prestamo_id in [p for p in self._pendientes if p not in vigentes]:
+                self.quitar(prestamo_id)
+
+    def _guardar(self, prestamo):
+        """
+        Guarda el préstamo en el diccionario de pendientes y devuelve su
+        vencimiento, o None si no se agregó (sin fechas válidas o ya avisado).
+        """
+        prestamo_id = prestamo.get("prestamo_id")
+        calculado = vencimiento(prestamo)
+        if not prestamo_id or calculado is None or prestamo_id in self._avisados:
+            return None
+        vence, limite = calculado
+        datos = {campo: prestamo.get(campo, "") for campo in CAMPOS_COLA}
+        self._pendientes[prestamo_id] = (vence, limite, datos)
+        return vence
+
+    def agregar(self, prestamo):
+        """
+        Agrega (o actualiza) un préstamo aprobado. O(log n).
+        """
+        with self._condicion:
+            vence = self._guardar(prestamo)
+            if vence is None:
+                return
+            heapq.heappush(self._monticulo, (vence, prestamo.get("prestamo_id")))
+            # Si ahora es el primero en vencer, el hilo tiene que despertarse antes
+            if self._monticulo[0][0] == vence:
+                self._condicion.notify()
+
+    def quitar(self, prestamo_id):
+        """
+        Quita un préstamo (devuelto o rechazado). La entrada del montículo
+        se descarta al llegar arriba; si quedan demasiadas entradas viejas
+        se rearma el montículo.
+        """
+        with self._condicion:
+            if self._pendientes.pop(prestamo_id, None) is None:
+                return
+            if len(self._monticulo) > 2 * len(self._pendientes) + 64:
+                self._monticulo = [(vence, p) for p, (vence, _, _) in self._pendientes.items()]
+                heapq.heapify(self._monticulo)
+
+    def _sacar_vencidos(self, ahora):
+        """
+        Saca del montículo los préstamos vencidos hasta el momento dado y
+        devuelve [(datos, fecha_limite)]. Llamar con la condición tomada.
+        """
+        vencidos = []
+        while self._monticulo and self._monticulo[0][0] <= ahora:
+            vence, prestamo_id = heapq.heappop(self._monticulo)
+            pendiente = self._pendientes.get(prestamo_id)
+            if pendiente is None or pendiente[0] != vence:
+                continue  # quitado o actualizado después de entrar al montículo
+            del self._pendientes[prestamo_id]
+            self._avisados.add(prestamo_id)
+            vencidos.append((pendiente[2], pendiente[1]))
+        return vencidos
+
+    def proximo(self):
+        """
+        Momento (timestamp) del próximo vencimiento, o None si no hay préstamos.
+        """
+        with self._condicion:
+            while self._monticulo and self._pendientes.get(self._monticulo[0][1], (None,))[0] != self._monticulo[0][0]:
+                heapq.heappop(self._monticulo)
+            return self._monticulo[0][0] if self._monticulo else None
+
+    def _avisar(self, vencidos):
+        for datos, limite in vencidos:
+            for aviso in self.avisos:
+                try:
+                    aviso(datos, limite)
+                except Exception as e:
+                    print(f"Error en el aviso de vencimiento de '{datos.get('prestamo_id')}': {e}")
+
+    def _trabajar(self):
+        """
+        Cuerpo del hilo: duerme hasta el próximo vencimiento (o hasta que
+        cambie la cola) y avisa los préstamos que vencieron.
+        """
+        while True:
+            with self._condicion:
+                if self._detenido:
+                    return
+                ahora = time.time()
+                vencidos = self._sacar_vencidos(ahora)
+                if not vencidos:
+                    espera = ESPERA_MAXIMA
+                    if self._monticulo:
+                        espera = min(espera, max(0.0, self._monticulo[0][0] - ahora))
+                    self._condicion.wait(espera)
+                    continue
+            # Los avisos se llaman sin la condición tomada (pueden escribir archivos)
+            self._avisar(vencidos)
+
+    def iniciar(self):
+        """
+        Arranca el hilo de avisos (si no estaba corriendo).
+        """
+        with self._condicion:
+            if self._hilo is not None:
+                return
+            self._detenido = False
+            self._hilo = threading.Thread(target=self._trabajar, name="vencimientos", daemon=True)
+        self._hilo.start()
+
+    def detener(self):
+        """
+        Detiene el hilo de avisos y espera que termine.
+        """
+        with self._condicion:
+            if self._hilo is None:
+                return
+            self._detenido = True
+            self._condicion.notify()
+            hilo, self._hilo = self._hilo, None
+        hilo.join()
+
+# =========================================================
+# Planificador del programa
+# Lo usan main.py (iniciar/detener/sincronizar) y prestamos.py
+# (prestamo_aprobado/prestamo_cerrado). Si no se inició, los avisos
+# de aprobación y devolución no hacen nada.
+# =========================================================
+
+_planificador = None
+_firma = None
+
+
+def _aprobados():
+    return lector_mapeado.filtrar("prestamos.csv", "estado", "APROBADO")
+
+
+def iniciar(avisos=None):
+    """
+    Arma la cola con los préstamos APROBADOS y arranca el hilo de avisos.
+    Devuelve el planificador.
+    """
+    global _planificador, _firma
+    if _planificador is None:
+        _planificador = Planificador(avisos)
+        _firma = _firma_prestamos()
+        _planificador.cargar(_aprobados(), prestamos_avisados())
+        _planificador.iniciar()
+    return _planificador
+
+
+def detener():
+    """
+    Detiene el hilo de avisos y descarta la cola.
+    """
+    global _planificador, _firma
+    if _planificador is not None:
+        _planificador.detener()
+    _planificador, _firma = None, None
+
+
+def sincronizar():
+    """
+    Si otro proceso modificó los préstamos desde la última vez, ajusta la
+    cola a los préstamos APROBADOS actuales. Devuelve True si la ajustó.
+    """
+    global _firma
+    if _planificador is None:
+        return False
+    firma = _firma_prestamos()
+    if firma == _firma:
+        return False
+    _firma = firma
+    _planificador.sincronizar(_aprobados())
+    return True
+
+
+def prestamo_aprobado(prestamo):
+    """
+    Agrega a la cola un préstamo recién aprobado (llamar después de
+    confirmar la transacción).
+    """
+    global _firma
+    if _planificador is not None:
+        _planificador.agregar(prestamo)
+        _firma = _firma_prestamos()  # el cambio ya está en la cola
+
+
+def prestamo_cerrado(prestamo_id):
+    """
+    Quita de la cola un préstamo devuelto (llamar después de confirmar
+    la transacción).
+    """
+    global _firma
+    if _planificador is not None:
+        _planificador.quitar(prestamo_id)
+        _firma = _firma_prestamos()
+
+
+def main():
+    """
+    Corre el planificador en primer plano hasta Ctrl+C, revisando cada
+    INTERVALO_SINCRONIZACION segundos si cambiaron los préstamos.
+    """
+    planificador = iniciar()
+    print(f"Vigilando {len(planificador)} préstamo(s) aprobados. Avisos en {ARCHIVO_AVISOS} (Ctrl+C para salir)")
+    try:
+        while True:
+            time.sleep(INTERVALO_SINCRONIZACION)
+            sincronizar()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        detener()
+
+
+if __name__ == "__main__":
+    main()